@@ -39,17 +39,176 @@
 # ###########################################################################
 
 import os
-from flask import Flask
+import gzip
+import mimetypes
+from datetime import datetime
+from flask import Flask, Response, abort, jsonify, request, url_for
+from werkzeug.http import is_resource_modified
+from werkzeug.security import safe_join
+from werkzeug.wsgi import wrap_file
 
-from src.utils import find_latest_report
+from src.metrics_summary import SUMMARY_PATH, MetricsSummary
+from src.report_index import ReportIndex
+
+REPORT_DIR = "apps/reports/"
+STATIC_DIR = os.path.join(REPORT_DIR, "static")
+
+# shared assets only change with the Evidently version, so browsers may reuse them for a day
+ASSET_MAX_AGE = 24 * 60 * 60
 
 app = Flask(__name__, static_folder="apps/reports", static_url_path="")
+report_index = ReportIndex(report_dir=REPORT_DIR)
+metrics_summary = MetricsSummary(path=SUMMARY_PATH)
+
+
+def send_cached(path, mimetype, gzip_path=None, max_age=None):
+    """
+    Serve a file from disk (or its gzip-compressed copy at gzip_path, if the client
+    accepts it) with validators, so that clients reloading an unchanged file get a
+    304 Not Modified. Cached copies must be revalidated unless max_age is given.
+
+    If path is None only the compressed copy exists, and it is decompressed for
+    clients that do not accept gzip.
+
+    """
+    use_gzip = gzip_path is not None and request.accept_encodings["gzip"] > 0
+    source = gzip_path if use_gzip or path is None else path
+    if use_gzip and path is not None and not os.path.exists(gzip_path):
+        use_gzip, source = False, path
+
+    try:
+        stat = os.stat(source)
+    except FileNotFoundError:
+        abort(404)
+
+    # distinct validators per encoding, since the bytes differ
+    etag = f"{stat.st_mtime_ns:x}-{stat.st_size:x}" + ("-gz" if use_gzip else "")
+    last_modified = datetime.utcfromtimestamp(int(stat.st_mtime))
+
+    if not is_resource_modified(
+        request.environ, etag=etag, last_modified=last_modified
+    ):
+        response = Response(status=304)
+    elif source == gzip_path and not use_gzip:
+        with gzip.open(gzip_path, "rb") as f:
+            response = Response(f.read(), mimetype=mimetype)
+    else:
+        response = Response(
+            wrap_file(request.environ, open(source, "rb")),
+            mimetype=mimetype,
+            direct_passthrough=True,
+        )
+        response.content_length = stat.st_size
+        if use_gzip:
+            response.content_encoding = "gzip"
+
+    response.set_etag(etag)
+    response.last_modified = last_modified
+    response.vary.add("Accept-Encoding")
+    if max_age is None:
+        response.cache_control.no_cache = True
+    else:
+        response.cache_control.public = True
+        response.cache_control.max_age = max_age
+
+    return response
+
+
+def send_report(entry):
+    """Serve a report from the index; reports must be revalidated as new ones arrive."""
+
+    return send_cached(entry.path, "text/html", gzip_path=entry.gzip_path)
+
+
+@app.route("/assets/<path:filename>")
+def asset(filename):
+    """Evidently's JS bundle, icon font and stylesheet, shared by "shared" exports."""
+
+    path = safe_join(STATIC_DIR, filename)
+    if path is None:
+        abort(404)
+    return send_cached(
+        path,
+        mimetypes.guess_type(filename)[0] or "application/octet-stream",
+        gzip_path=path + ".gz",
+        max_age=ASSET_MAX_AGE,
+    )
+
+
+@app.route("/payloads/<filename>")
+def payload(filename):
+    """The compressed JSON data of a report saved with the "shared" export."""
+
+    if not filename.endswith(".dashboard.json.gz"):
+        abort(404)
+    path = safe_join(REPORT_DIR, filename)
+    if path is None:
+        abort(404)
+    return send_cached(None, "application/json", gzip_path=path)
 
 
 @app.route("/")
 def report():
-    latest_report = find_latest_report(report_dir="apps/reports/")
-    return app.send_static_file(latest_report)
+    latest_report = report_index.latest()
+    if latest_report is None:
+        abort(404)
+    return send_report(latest_report)
+
+
+@app.route("/reports")
+def reports():
+    """List every published batch, with a link to its report where it has one."""
+
+    return jsonify(
+        reports=[
+            dict(
+                report,
+                url=(
+                    url_for("dated_report", date=report["date"])
+                    if report_index.get(report["date"]) is not None
+                    else None
+                ),
+            )
+            for report in report_index.list()
+        ]
+    )
+
+
+@app.route("/reports/<date>")
+def dated_report(date):
+    entry = report_index.get(date)
+    if entry is None:
+        abort(404)
+    return send_report(entry)
+
+
+@app.route("/api/metrics")
+def metrics():
+    """
+    Drift scores, regression error and per-feature statistics of every batch as a time
+    series, optionally filtered by ?start=YYYY-MM-DD&end=YYYY-MM-DD&features=a,b (the
+    features filter also applies to each batch's rolling windows). Non-finite statistics
+    are returned as null.
+    """
+
+    start, end = request.args.get("start"), request.args.get("end")
+    for date in (start, end):
+        if date is not None:
+            try:
+                datetime.strptime(date, "%Y-%m-%d")
+            except ValueError:
+                abort(
+                    400,
+                    description=f"Dates must be formatted as YYYY-MM-DD, got {date!r}",
+                )
+
+    features = request.args.get("features")
+    if features is not None:
+        features = [feature for feature in features.split(",") if feature]
+
+    return jsonify(
+        batches=metrics_summary.query(start=start, end=end, features=features)
+    )
 
 
 if __name__ == "__main__":
@@ -0,0 +1,111 @@
+# ###########################################################################
+#
+#  CLOUDERA APPLIED MACHINE LEARNING PROTOTYPE (AMP)
+#  (C) Cloudera, Inc. 2021
+#  All rights reserved.
+#
+#  Applicable Open Source License: Apache 2.0
+#
+#  NOTE: Cloudera open source products are modular software products
+#  made up of hundreds of individual components, each of which was
+#  individually copyrighted.  Each Cloudera open source product is a
+#  collective work under U.S. Copyright Law. Your license to use the
+#  collective work is as provided in your written agreement with
+#  Cloudera.  Used apart from the collective work, this file is
+#  licensed for your use pursuant to the open source license
+#  identified above.
+#
+#  This code is provided to you pursuant a written agreement with
+#  (i) Cloudera, Inc. or (ii) a third-party authorized to distribute
+#  this code. If you do not have a written agreement with Cloudera nor
+#  with an authorized and properly licensed third party, you do not
+#  have any rights to access nor to use this code.
+#
+#  Absent a written agreement with Cloudera, Inc. (“Cloudera”) to the
+#  contrary, A) CLOUDERA PROVIDES THIS CODE TO YOU WITHOUT WARRANTIES OF ANY
+#  KIND; (B) CLOUDERA DISCLAIMS ANY AND ALL EXPRESS AND IMPLIED
+#  WARRANTIES WITH RESPECT TO THIS CODE, INCLUDING BUT NOT LIMITED TO
+#  IMPLIED WARRANTIES OF TITLE, NON-INFRINGEMENT, MERCHANTABILITY AND
+#  FITNESS FOR A PARTICULAR PURPOSE; (C) CLOUDERA IS NOT LIABLE TO YOU,
+#  AND WILL NOT DEFEND, INDEMNIFY, NOR HOLD YOU HARMLESS FOR ANY CLAIMS
+#  ARISING FROM OR RELATED TO THE CODE; AND (D)WITH RESPECT TO YOUR EXERCISE
+#  OF ANY RIGHTS GRANTED TO YOU FOR THE CODE, CLOUDERA IS NOT LIABLE FOR ANY
+#  DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, PUNITIVE OR
+#  CONSEQUENTIAL DAMAGES INCLUDING, BUT NOT LIMITED TO, DAMAGES
+#  RELATED TO LOST REVENUE, LOST PROFITS, LOSS OF INCOME, LOSS OF
+#  BUSINESS ADVANTAGE OR UNAVAILABILITY, OR LOSS OR CORRUPTION OF
+#  DATA.
+#
+# ###########################################################################
+
+# Benchmark the throughput of the threaded (fixed and adaptive concurrency) and
+# asyncio inference engines against a local emulated model endpoint (see
+# src/emulator) serving stub predictions, so no deployed model is required.
+#
+# Usage:
+#   python scripts/benchmark_inference.py --n-records 2000 --latency 0.02
+
+import time
+import argparse
+
+from src.emulator import install
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--n-records", type=int, default=2000)
+parser.add_argument("--latency", type=float, default=0.02)
+parser.add_argument("--n-threads", type=int, default=2)
+parser.add_argument("--concurrency", type=int, default=64)
+parser.add_argument("--batch-size", type=int, default=1)
+args = parser.parse_args()
+
+# src.inference imports cdsw, so the emulator must be installed first; with no model
+# script, its endpoint serves stub predictions
+emulator = install(model_script=None, latency=args.latency)
+
+from src.concurrency import AIMDLimiter
+from src.inference import ThreadedModelRequest, AsyncModelRequest
+
+deployment_details = {"model_access_key": "stub"}
+records = [{"id": i} for i in range(args.n_records)]
+server = emulator.server
+
+try:
+    engines = {
+        "threaded": ThreadedModelRequest(
+            deployment_details,
+            n_threads=args.n_threads,
+            batch_size=args.batch_size,
+            model_service_url=server.url,
+        ),
+        "adaptive": ThreadedModelRequest(
+            deployment_details,
+            batch_size=args.batch_size,
+            model_service_url=server.url,
+            limiter=AIMDLimiter(max_limit=args.concurrency),
+        ),
+        "async": AsyncModelRequest(
+            deployment_details,
+            concurrency=args.concurrency,
+            batch_size=args.batch_size,
+            model_service_url=server.url,
+        ),
+    }
+
+    for name, engine in engines.items():
+        start = time.perf_counter()
+        metadata = engine.threaded_call(records)
+        elapsed = time.perf_counter() - start
+
+        assert len(metadata["id_uuid_mapping"]) == len(records)
+        print(
+            f"{name:>8}: {len(records)} records in {elapsed:.2f}s "
+            f"({len(records) / elapsed:.0f} records/s)"
+        )
+
+        if getattr(engine, "limiter", None) is not None:
+            print(
+                f"{'':>8}  converged on a limit of {engine.limiter.limit} "
+                f"at {engine.limiter.latency_ms:.1f}ms"
+            )
+finally:
+    emulator.stop()
@@ -0,0 +1,410 @@
+# ###########################################################################
+#
+#  CLOUDERA APPLIED MACHINE LEARNING PROTOTYPE (AMP)
+#  (C) Cloudera, Inc. 2021
+#  All rights reserved.
+#
+#  Applicable Open Source License: Apache 2.0
+#
+#  NOTE: Cloudera open source products are modular software products
+#  made up of hundreds of individual components, each of which was
+#  individually copyrighted.  Each Cloudera open source product is a
+#  collective work under U.S. Copyright Law. Your license to use the
+#  collective work is as provided in your written agreement with
+#  Cloudera.  Used apart from the collective work, this file is
+#  licensed for your use pursuant to the open source license
+#  identified above.
+#
+#  This code is provided to you pursuant a written agreement with
+#  (i) Cloudera, Inc. or (ii) a third-party authorized to distribute
+#  this code. If you do not have a written agreement with Cloudera nor
+#  with an authorized and properly licensed third party, you do not
+#  have any rights to access nor to use this code.
+#
+#  Absent a written agreement with Cloudera, Inc. (“Cloudera”) to the
+#  contrary, A) CLOUDERA PROVIDES THIS CODE TO YOU WITHOUT WARRANTIES OF ANY
+#  KIND; (B) CLOUDERA DISCLAIMS ANY AND ALL EXPRESS AND IMPLIED
+#  WARRANTIES WITH RESPECT TO THIS CODE, INCLUDING BUT NOT LIMITED TO
+#  IMPLIED WARRANTIES OF TITLE, NON-INFRINGEMENT, MERCHANTABILITY AND
+#  FITNESS FOR A PARTICULAR PURPOSE; (C) CLOUDERA IS NOT LIABLE TO YOU,
+#  AND WILL NOT DEFEND, INDEMNIFY, NOR HOLD YOU HARMLESS FOR ANY CLAIMS
+#  ARISING FROM OR RELATED TO THE CODE; AND (D)WITH RESPECT TO YOUR EXERCISE
+#  OF ANY RIGHTS GRANTED TO YOU FOR THE CODE, CLOUDERA IS NOT LIABLE FOR ANY
+#  DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, PUNITIVE OR
+#  CONSEQUENTIAL DAMAGES INCLUDING, BUT NOT LIMITED TO, DAMAGES
+#  RELATED TO LOST REVENUE, LOST PROFITS, LOSS OF INCOME, LOSS OF
+#  BUSINESS ADVANTAGE OR UNAVAILABILITY, OR LOSS OR CORRUPTION OF
+#  DATA.
+#
+# ###########################################################################
+
+# Benchmark the monitoring loop end to end against the offline CML emulator
+# (src/emulator): the individual Simulation stages (make_inference,
+# format_metadata_for_delayed_metrics, add_delayed_metrics, query_model_metrics,
+# format_model_metrics_query and build_evidently_report) and the full
+# run_simulation(), at several multiples of the kc_house_data volume.
+#
+# Wall time, peak RSS and throughput of each are recorded in a JSON results file
+# keyed by git commit, so regressions can be compared between commits. Each scale
+# runs its stages and its full simulation in fresh subprocesses, and in a temporary
+# working directory, so peak RSS is not carried over between runs and no reports or
+# working data are written to the project.
+#
+# By default the emulated model endpoint serves a stand-in model (a fixed price per
+# sqft) that tracks the same metrics as scripts/predict.py, so no trained model is
+# required; pass --model-script scripts/predict.py to serve model.pkl instead.
+#
+# Usage:
+#   python scripts/prepare_data.py
+#   python scripts/benchmark_simulation.py --scales 1 10 100
+#   python scripts/benchmark_simulation.py --scales 1 --compare <commit>
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import resource
+import tempfile
+import subprocess
+from datetime import datetime
+
+import pandas as pd
+
+from src.emulator import install, cdsw as emulated_cdsw
+from src.columns import NUM_FEATURES, CAT_FEATURES
+from src.utils import WORKING_DIR, load_split
+
+MODEL_NAME = "Price Regressor"
+PRICE_PER_SQFT = 250
+SUITES = ("stages", "simulation")
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--scales", type=int, nargs="+", default=[1, 10, 100])
+parser.add_argument("--working-dir", default=WORKING_DIR)
+parser.add_argument("--results-path", default="data/benchmarks/results.json")
+parser.add_argument("--compare", help="git commit of a previous run to compare with")
+parser.add_argument("--model-script", help="serve this script's predict() function")
+parser.add_argument("--latency", type=float, default=0.0)
+parser.add_argument("--inference-engine", default="threaded")
+parser.add_argument("--inference-batch-size", type=int, default=1)
+parser.add_argument("--report-engine", default="evidently")
+parser.add_argument("--report-export", default="standalone")
+parser.add_argument("--pipelined", action="store_true")
+parser.add_argument("--suite", choices=SUITES, help=argparse.SUPPRESS)
+parser.add_argument("--suite-output", help=argparse.SUPPRESS)
+
+
+@emulated_cdsw.model_metrics
+def track_stand_in_prediction(record):
+    prediction = float(record["sqft_living"]) * PRICE_PER_SQFT
+    emulated_cdsw.track_metric(
+        "input_features", {k: record[k] for k in NUM_FEATURES + CAT_FEATURES}
+    )
+    emulated_cdsw.track_metric("predicted_result", prediction)
+    return prediction
+
+
+def stand_in_predict(request):
+    """A stand-in for scripts/predict.py's predict() that needs no trained model."""
+
+    if "records" in request:
+        predictions = []
+        for record in request["records"]:
+            tracked = track_stand_in_prediction(record)
+            predictions.append({"id": record["id"], **tracked})
+        return {"predictions": predictions}
+
+    return track_stand_in_prediction(request["record"])
+
+
+def scale_dataframe(df, scale):
+    """Replicate df scale times, offsetting the ids of each copy so all records stay unique."""
+
+    stride = int(df.id.max()) + 1
+    return pd.concat(
+        [df.assign(id=df.id + copy * stride) for copy in range(scale)],
+        ignore_index=True,
+    )
+
+
+def peak_rss_mb(who=resource.RUSAGE_SELF):
+    # ru_maxrss is reported in kilobytes on Linux and in bytes on macOS
+    unit = 1 if sys.platform == "darwin" else 1024
+    return round(resource.getrusage(who).ru_maxrss * unit / 2**20, 1)
+
+
+def timed(results, name, n_records, func, *args, **kwargs):
+    """Call func, recording its wall time, throughput and the peak RSS so far under results[name]."""
+
+    start = time.perf_counter()
+    output = func(*args, **kwargs)
+    wall_s = time.perf_counter() - start
+
+    results[name] = {
+        "wall_s": round(wall_s, 4),
+        "n_records": n_records,
+        "records_per_s": round(n_records / wall_s, 1) if wall_s > 0 else None,
+        "peak_rss_mb": peak_rss_mb(),
+        "peak_child_rss_mb": peak_rss_mb(resource.RUSAGE_CHILDREN),
+    }
+    print(
+        f"{name:>38}: {wall_s:8.2f}s {results[name]['records_per_s'] or 0:>10.0f} records/s "
+        f"{results[name]['peak_rss_mb']:>8.0f} MB"
+    )
+
+    return output
+
+
+def simulation_kwargs(args):
+    return dict(
+        model_name=MODEL_NAME,
+        inference_engine=args.inference_engine,
+        inference_batch_size=args.inference_batch_size,
+        report_engine=args.report_engine,
+        report_export=args.report_export,
+    )
+
+
+def run_stages(train_df, args):
+    """Time each stage of the train data section of run_simulation(), in order."""
+
+    from src.simulation import Simulation
+
+    sim = Simulation(report_workers=0, **simulation_kwargs(args))
+    results = {}
+    n_records = len(train_df)
+
+    # make_inference() casts dates to strings in place, so the report's date range is read first
+    date_range = (train_df.date_sold.min(), train_df.date_sold.max())
+
+    metadata = timed(results, "make_inference", n_records, sim.make_inference, train_df)
+    formatted_metadata = timed(
+        results,
+        "format_metadata_for_delayed_metrics",
+        n_records,
+        sim.format_metadata_for_delayed_metrics,
+        train_df,
+        is_train=True,
+    )
+    timed(
+        results,
+        "add_delayed_metrics",
+        len(formatted_metadata[0]),
+        sim.add_delayed_metrics,
+        *formatted_metadata,
+    )
+
+    query = {
+        "start_timestamp_ms": metadata["start_timestamp_ms"],
+        "end_timestamp_ms": metadata["end_timestamp_ms"],
+    }
+    metrics_df = timed(
+        results, "query_model_metrics", n_records, sim.query_model_metrics, **query
+    )
+    response = emulated_cdsw.read_metrics(
+        model_deployment_crn=sim.latest_deployment_details["latest_deployment_crn"],
+        **query,
+    )
+    timed(
+        results,
+        "format_model_metrics_query",
+        len(response["metrics"]),
+        sim.format_model_metrics_query,
+        response,
+    )
+    timed(
+        results,
+        "build_evidently_report",
+        len(metrics_df),
+        sim.build_evidently_report,
+        reference_df=metrics_df,
+        current_df=metrics_df,
+        current_date_range=date_range,
+        export=args.report_export,
+    )
+
+    return results
+
+
+def run_full_simulation(train_df, prod_df, args):
+    from src.simulation import Simulation
+
+    sim = Simulation(**simulation_kwargs(args))
+    results = {}
+    timed(
+        results,
+        "run_simulation",
+        len(train_df) + len(prod_df),
+        sim.run_simulation,
+        train_df,
+        prod_df,
+        pipelined=args.pipelined,
+    )
+
+    return results
+
+
+def run_suite(args):
+    """Run one suite at one scale (in a subprocess started by main) and write its results as JSON."""
+
+    scale = args.scales[0]
+    train_df = scale_dataframe(load_split("train", args.working_dir), scale)
+    prod_df = scale_dataframe(load_split("prod", args.working_dir), scale)
+    suite_output = os.path.abspath(args.suite_output)
+
+    workdir = tempfile.mkdtemp(prefix="benchmark_simulation_")
+    emulator = install(
+        model_script=args.model_script,
+        predict_fn=None if args.model_script else stand_in_predict,
+        latency=args.latency,
+        metrics_path=os.path.join(workdir, "metrics.db"),
+        model_name=MODEL_NAME,
+    )
+    cwd = os.getcwd()
+    os.chdir(workdir)
+
+    try:
+        print(f"--- {args.suite} at {scale}x ---")
+        if args.suite == "stages":
+            results = run_stages(train_df, args)
+        else:
+            results = run_full_simulation(train_df, prod_df, args)
+    finally:
+        os.chdir(cwd)
+        emulator.stop()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    results = {"n_train": len(train_df), "n_prod": len(prod_df), args.suite: results}
+    with open(suite_output, "w") as f:
+        json.dump(results, f)
+
+
+def suite_command(args, scale, suite, suite_output):
+    command = [
+        sys.executable,
+        os.path.abspath(__file__),
+        "--scales",
+        str(scale),
+        "--suite",
+        suite,
+        "--suite-output",
+        suite_output,
+        "--working-dir",
+        args.working_dir,
+        "--latency",
+        str(args.latency),
+        "--inference-engine",
+        args.inference_engine,
+        "--inference-batch-size",
+        str(args.inference_batch_size),
+        "--report-engine",
+        args.report_engine,
+        "--report-export",
+        args.report_export,
+    ]
+    if args.model_script:
+        command += ["--model-script", args.model_script]
+    if args.pipelined:
+        command.append("--pipelined")
+
+    return command
+
+
+def git_commit():
+    """The current git commit of the project, suffixed with "-dirty" if it has uncommitted changes."""
+
+    def git(*command):
+        return subprocess.check_output(
+            ["git", *command],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            stderr=subprocess.DEVNULL,
+            universal_newlines=True,
+        ).strip()
+
+    try:
+        commit = git("rev-parse", "--short", "HEAD")
+        dirty = git("status", "--porcelain", "--untracked-files=no")
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+    return f"{commit}-dirty" if dirty else commit
+
+
+def read_results(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_results(results, path):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = os.path.join(os.path.dirname(path), f".{os.path.basename(path)}.tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def compare(run, baseline):
+    """Print the change in wall time and peak RSS of each benchmark relative to a baseline run."""
+
+    for scale, scale_results in sorted(run["scales"].items(), key=lambda x: int(x[0])):
+        base_scale = baseline["scales"].get(scale, {})
+        for suite in SUITES:
+            for name, result in scale_results.get(suite, {}).items():
+                base = base_scale.get(suite, {}).get(name)
+                if base is None:
+                    continue
+                print(
+                    f"{scale:>4}x {name:>38}: wall {result['wall_s'] / base['wall_s']:5.2f}x, "
+                    f"peak RSS {result['peak_rss_mb'] / base['peak_rss_mb']:5.2f}x"
+                )
+
+
+def main(args):
+    commit = git_commit()
+    run = {
+        "recorded_at": datetime.utcnow().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "config": {
+            k: v
+            for k, v in vars(args).items()
+            if k not in ("scales", "results_path", "compare", "suite", "suite_output")
+        },
+        "scales": {},
+    }
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for scale in args.scales:
+            scale_results = {}
+            for suite in SUITES:
+                suite_output = os.path.join(tmp_dir, f"{suite}_{scale}.json")
+                subprocess.run(
+                    suite_command(args, scale, suite, suite_output), check=True
+                )
+                with open(suite_output) as f:
+                    scale_results.update(json.load(f))
+            run["scales"][str(scale)] = scale_results
+
+    results = read_results(args.results_path)
+    results[commit] = run
+    save_results(results, args.results_path)
+    print(f"Saved results for {commit} to {args.results_path}")
+
+    if args.compare:
+        if args.compare not in results:
+            sys.exit(f"No results recorded for {args.compare} in {args.results_path}")
+        compare(run, results[args.compare])
+
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+    if args.suite:
+        run_suite(args)
+    else:
+        main(args)
@@ -0,0 +1,84 @@
+# ###########################################################################
+#
+#  CLOUDERA APPLIED MACHINE LEARNING PROTOTYPE (AMP)
+#  (C) Cloudera, Inc. 2021
+#  All rights reserved.
+#
+#  Applicable Open Source License: Apache 2.0
+#
+#  NOTE: Cloudera open source products are modular software products
+#  made up of hundreds of individual components, each of which was
+#  individually copyrighted.  Each Cloudera open source product is a
+#  collective work under U.S. Copyright Law. Your license to use the
+#  collective work is as provided in your written agreement with
+#  Cloudera.  Used apart from the collective work, this file is
+#  licensed for your use pursuant to the open source license
+#  identified above.
+#
+#  This code is provided to you pursuant a written agreement with
+#  (i) Cloudera, Inc. or (ii) a third-party authorized to distribute
+#  this code. If you do not have a written agreement with Cloudera nor
+#  with an authorized and properly licensed third party, you do not
+#  have any rights to access nor to use this code.
+#
+#  Absent a written agreement with Cloudera, Inc. (“Cloudera”) to the
+#  contrary, A) CLOUDERA PROVIDES THIS CODE TO YOU WITHOUT WARRANTIES OF ANY
+#  KIND; (B) CLOUDERA DISCLAIMS ANY AND ALL EXPRESS AND IMPLIED
+#  WARRANTIES WITH RESPECT TO THIS CODE, INCLUDING BUT NOT LIMITED TO
+#  IMPLIED WARRANTIES OF TITLE, NON-INFRINGEMENT, MERCHANTABILITY AND
+#  FITNESS FOR A PARTICULAR PURPOSE; (C) CLOUDERA IS NOT LIABLE TO YOU,
+#  AND WILL NOT DEFEND, INDEMNIFY, NOR HOLD YOU HARMLESS FOR ANY CLAIMS
+#  ARISING FROM OR RELATED TO THE CODE; AND (D)WITH RESPECT TO YOUR EXERCISE
+#  OF ANY RIGHTS GRANTED TO YOU FOR THE CODE, CLOUDERA IS NOT LIABLE FOR ANY
+#  DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, PUNITIVE OR
+#  CONSEQUENTIAL DAMAGES INCLUDING, BUT NOT LIMITED TO, DAMAGES
+#  RELATED TO LOST REVENUE, LOST PROFITS, LOSS OF INCOME, LOSS OF
+#  BUSINESS ADVANTAGE OR UNAVAILABILITY, OR LOSS OR CORRUPTION OF
+#  DATA.
+#
+# ###########################################################################
+
+# Generate kc_house_data-like records at production volume, with optional scheduled
+# drift, streamed to a CSV in the raw data schema (see src/synthetic.py). The output
+# is then prepared exactly like the source data with scripts/prepare_data.py.
+#
+# Usage:
+#   python scripts/generate_data.py --n-rows 20000000 \
+#       --output data/raw/synthetic_house_data.csv.gz \
+#       --drift price_shock:2015-01-01:0.15:60 \
+#       --drift zipcode_mix:2015-03-01:0.3
+#   python scripts/prepare_data.py --input data/raw/synthetic_house_data.csv.gz
+
+import argparse
+import pandas as pd
+from tqdm import tqdm
+
+from src.synthetic import SyntheticHouseData, parse_drift_event
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--source", default="data/raw/kc_house_data.csv")
+parser.add_argument("--output", default="data/raw/synthetic_house_data.csv.gz")
+parser.add_argument("--n-rows", type=int, default=10_000_000)
+parser.add_argument("--chunk-size", type=int, default=1_000_000)
+parser.add_argument(
+    "--drift",
+    type=parse_drift_event,
+    action="append",
+    default=[],
+    help="kind:start:magnitude[:ramp_days], eg price_shock:2015-01-01:0.15:60",
+)
+parser.add_argument("--seed", type=int, default=42)
+args = parser.parse_args()
+
+source = pd.read_csv(args.source).drop_duplicates(subset=["id"], keep="first")
+
+generator = SyntheticHouseData(source, schedule=args.drift, seed=args.seed)
+generator.to_csv(
+    args.output,
+    n_rows=args.n_rows,
+    chunk_size=args.chunk_size,
+    progress=lambda chunks: tqdm(
+        chunks, total=-(-args.n_rows // args.chunk_size), unit="chunk"
+    ),
+)
+print(f"Wrote {args.n_rows} synthetic records to {args.output}")
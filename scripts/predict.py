@@ -41,9 +41,9 @@
 # Read the fitted model (scripts/train.py) from the file model.pkl
 # and define a function that uses the model to make inference
 
-# This version of the predict function is wrapped with the
-# model_metrics decorator, enabling it to call .track_metrics()
-# to store mathematical metrics associated with each prediction
+# The per-record functions are wrapped with the model_metrics
+# decorator, enabling them to call .track_metrics() to store
+# mathematical metrics associated with each prediction
 
 import cdsw
 import pickle
@@ -54,18 +54,47 @@ from src.utils import col_order
 with open("model.pkl", "rb") as f:
     model = pickle.load(f)
 
-# The model_metrics decorator equips the predict function to
-# call .track_metrics(). It also changes the return type. If the
-# raw predict function returns a value "result", the wrapped
-# function will return eg
+# The model_metrics decorator equips the predict_record and
+# track_prediction functions to call .track_metrics(). It also
+# changes the return type. If the raw function returns a value
+# "result", the wrapped function will return eg
 # {
 #   "uuid": "612a0f17-33ad-4c41-8944-df15183ac5bd",
 #   "prediction": "result"
 # }
 
 
-@cdsw.model_metrics
+# Raw input values of features used in inference pipeline
+# active_features = get_active_feature_names(model.named_steps["preprocess"]) # feature not compatible with Python 3.6
+active_features = [
+    "bedrooms",
+    "bathrooms",
+    "sqft_living",
+    "sqft_lot",
+    "sqft_above",
+    "waterfront",
+    "zipcode",
+    "condition",
+    "view",
+]
+
+
 def predict(data_input):
+    """
+    Entry point for the deployed model.
+
+    Accepts either a single record ({"record": {...}}) or a batch of records
+    ({"records": [{...}, ...]}) and dispatches to the matching handler.
+    """
+
+    if "records" in data_input:
+        return predict_batch(data_input)
+
+    return predict_record(data_input)
+
+
+@cdsw.model_metrics
+def predict_record(data_input):
 
     # Convert dict representation back to dataframe for inference
     df = pd.DataFrame.from_records([data_input["record"]])
@@ -73,18 +102,6 @@ def predict(data_input):
     df = df[col_order].drop("price", axis=1)
 
     # Log raw input values of features used in inference pipeline
-    # active_features = get_active_feature_names(model.named_steps["preprocess"]) # feature not compatible with Python 3.6
-    active_features = [
-        "bedrooms",
-        "bathrooms",
-        "sqft_living",
-        "sqft_lot",
-        "sqft_above",
-        "waterfront",
-        "zipcode",
-        "condition",
-        "view",
-    ]
     cdsw.track_metric(
         "input_features", df[active_features].to_dict(orient="records")[0]
     )
@@ -96,3 +113,41 @@ def predict(data_input):
     cdsw.track_metric("predicted_result", result)
 
     return result
+
+
+@cdsw.model_metrics
+def track_prediction(input_features, result):
+    """Log the inputs and prediction of a single record under its own predictionUuid."""
+
+    cdsw.track_metric("input_features", input_features)
+    cdsw.track_metric("predicted_result", result)
+
+    return result
+
+
+def predict_batch(data_input):
+    """
+    Make inference on a batch of records with a single pass through the pipeline.
+
+    Each record is still tracked individually so that it receives its own
+    predictionUuid in the metric store. Returns a list of
+    {"id": ..., "uuid": ..., "prediction": ...} entries in input order.
+    """
+
+    df = pd.DataFrame.from_records(data_input["records"])
+    ids = df["id"].tolist()
+
+    df = df[col_order].drop("price", axis=1)
+
+    # Use pipeline to make inference on the full batch at once
+    results = model.predict(df).tolist()
+    input_features = df[active_features].to_dict(orient="records")
+
+    predictions = []
+    for id_, features, result in zip(ids, input_features, results):
+        tracked = track_prediction(features, result)
+        predictions.append(
+            {"id": id_, "uuid": tracked["uuid"], "prediction": tracked["prediction"]}
+        )
+
+    return {"predictions": predictions}
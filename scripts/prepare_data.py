@@ -38,47 +38,145 @@
 #
 # ###########################################################################
 
+# Prepare the raw data for the simulation: drop duplicate records, add an artificial
+# "listed" date, remove price outliers, and split it into a training set (the first 6
+# months of sales) and a "production" set (the remaining sales).
+#
+# The raw CSV is streamed in chunks, so memory use is bounded by the chunk size rather
+# than the size of the data (only ids, prices and sale dates are held in full). Each
+# chunk is parsed once, deduplicated and given its listed dates, and staged to disk; once
+# the price outlier bounds and the end of the production period are known, the staged
+# chunks are filtered and appended to the train and prod splits as part files
+# (data/working/{train,prod}_df/part-*.pkl), which are loaded with src.utils.load_split.
+#
+# Usage:
+#   python scripts/prepare_data.py
+#   python scripts/prepare_data.py --input data/raw/synthetic_house_data.csv.gz
+
 import os
+import shutil
+import argparse
 import numpy as np
 import pandas as pd
 
-from src.utils import random_day_offset, outlier_removal
+from src.utils import (
+    WORKING_DIR,
+    split_path,
+    outlier_bounds,
+    outlier_removal,
+    random_day_offsets,
+)
+
+TRAIN_END = "2014-10-31"
+OUTLIER_COLS = ["price"]
+
+# The raw data defaults to kc_house_data, but may be any file in its schema, eg the
+# output of scripts/generate_data.py
+parser = argparse.ArgumentParser()
+parser.add_argument("--input", default="data/raw/kc_house_data.csv")
+parser.add_argument("--working-dir", default=WORKING_DIR)
+parser.add_argument("--chunk-size", type=int, default=1_000_000)
+args = parser.parse_args()
+
+
+def parse_dates(dates):
+    return pd.to_datetime(dates, infer_datetime_format=True)
+
+
+def first_occurrences(ids, seen):
+    """
+    Mask of the ids that are neither in the sorted array of ids seen in earlier chunks nor
+    repeated earlier in this chunk, and seen updated with them.
+    """
+
+    keep = ~pd.Series(ids).duplicated().values
+    if len(seen):
+        positions = np.minimum(np.searchsorted(seen, ids), len(seen) - 1)
+        keep &= seen[positions] != ids
+
+    seen = np.sort(np.concatenate([seen, ids[keep]]), kind="mergesort")
+    return keep, seen
 
-# Load raw data
-df = pd.read_csv("data/raw/kc_house_data.csv")
 
-# Drop duplicates
-df = df.drop_duplicates(subset=["id"], keep="first")
+staging_dir = os.path.join(args.working_dir, ".prepare_data_staging")
+shutil.rmtree(staging_dir, ignore_errors=True)
+os.makedirs(staging_dir)
 
-# Create an artificial "listed" date to help mimic production scenario
+# ------------------------- Raw data -------------------------
+
+seen = np.empty(0, dtype=np.int64)
+staged, prices, sold_dates, complete = [], [], [], []
+
+# Create an artificial "listed" date to help mimic production scenario; offsets are drawn
+# chunk by chunk in record order, so they are the same as drawing them one record at a time
 np.random.seed(42)
-df["date_sold"] = pd.to_datetime(df.date, infer_datetime_format=True)
-df["date_listed"] = df.date_sold.apply(lambda x: random_day_offset(x))
-df = df.drop(columns=["date"])
-df.sort_values(by="date_listed", inplace=True)
-df.reset_index(drop=True, inplace=True)
 
-# remove price outliers for simplicity
-df = outlier_removal(X=df, multiple=3, cols=["price"])
+for i, chunk in enumerate(pd.read_csv(args.input, chunksize=args.chunk_size)):
+    # Drop duplicates (keeping the first record of each id)
+    keep, seen = first_occurrences(chunk.id.values.astype(np.int64), seen)
+    df = chunk[keep]
+
+    df = df.assign(date_sold=parse_dates(df.date))
+    df = df.assign(date_listed=random_day_offsets(df.date_sold)).drop(columns=["date"])
+
+    prices.append(df.price.values)
+    sold_dates.append(df.date_sold.values)
+    complete.append(~df.isna().any(axis=1).values)
+    staged.append(os.path.join(staging_dir, f"chunk-{i:05d}.pkl"))
+    df.to_pickle(staged[-1])
+
+del seen
+prices = pd.DataFrame({"price": np.concatenate(prices)})
+sold_dates = np.concatenate(sold_dates)
+complete = np.concatenate(complete)
+
+# remove price outliers for simplicity; the rows kept are those outlier_removal keeps
+# below, which also drops rows with a missing value in any column
+bounds = outlier_bounds(prices, multiple=3, cols=OUTLIER_COLS)
+lower, upper = bounds["price"]
+in_bounds = complete & (prices.price.values >= lower) & (prices.price.values <= upper)
 
 # Split out first 6 months of data for training, remaining for simulating a "production" scenario
-min_sold_date = df.date_sold.min()
 max_sold_date = (
-    df.date_sold.max().to_period("M").to_timestamp()  # drop the partial last month
+    pd.Timestamp(sold_dates[in_bounds].max())
+    .to_period("M")
+    .to_timestamp()  # drop the partial last month
 )
+del prices, sold_dates, complete, in_bounds
+
+# ------------------------- Train/prod splits -------------------------
+
+# Write each split's parts to a temporary directory, moved into place once complete
+tmp_paths = {}
+for name in ("train", "prod"):
+    tmp_paths[name] = os.path.join(
+        args.working_dir, f".{os.path.basename(split_path(name, args.working_dir))}.tmp"
+    )
+    shutil.rmtree(tmp_paths[name], ignore_errors=True)
+    os.makedirs(tmp_paths[name])
+
+for i, staged_path in enumerate(staged):
+    df = outlier_removal(
+        pd.read_pickle(staged_path), multiple=3, cols=OUTLIER_COLS, bounds=bounds
+    )
+    os.remove(staged_path)
+
+    splits = {
+        "train": df[df.date_sold <= TRAIN_END],
+        "prod": df[(df.date_sold > TRAIN_END) & (df.date_sold < max_sold_date)],
+    }
+    for name, split in splits.items():
+        split.sort_values(["date_sold", "id"]).to_pickle(
+            os.path.join(tmp_paths[name], f"part-{i:05d}.pkl")
+        )
+
+shutil.rmtree(staging_dir, ignore_errors=True)
+
+for name, tmp_path in tmp_paths.items():
+    path = split_path(name, args.working_dir)
+    shutil.rmtree(path, ignore_errors=True)
+    os.replace(tmp_path, path)
 
-train_df = df[
-    df.date_sold.between(min_sold_date, "2014-10-31", inclusive="both")
-].sort_values("date_sold")
-
-prod_df = df[
-    df.date_sold.between("2014-10-31", max_sold_date, inclusive=False)
-].sort_values("date_sold")
-
-# Save off these dataframes
-working_dir = "data/working"
-os.makedirs(working_dir, exist_ok=True)
-dfs = [("train", train_df), ("prod", prod_df)]
-for name, dataframe in dfs:
-    path = os.path.join(working_dir, f"{name}_df.pkl")
-    dataframe.to_pickle(path)
+    # remove data prepared as a single pickle, which load_split would otherwise not replace
+    if os.path.exists(f"{path}.pkl"):
+        os.remove(f"{path}.pkl")
@@ -39,17 +39,41 @@
 # ###########################################################################
 
 import os
-import pandas as pd
 
-from src.simulation import Simulation
+# Report workers are spawned processes that import this module, so the simulation
+# only runs when it is executed as a script.
+if __name__ == "__main__":
+    # Run against an offline emulated CML workspace (src/emulator) instead of a live one.
+    # The emulator must be installed before src.simulation imports cdsw and cmlapi.
+    if os.environ.get("EMULATOR", "false").lower() == "true":
+        from src.emulator import install
 
-train_path = "data/working/train_df.pkl"
-prod_path = "data/working/prod_df.pkl"
+        emulator = install(latency=float(os.environ.get("EMULATOR_LATENCY", 0)))
 
-train_df = pd.read_pickle(train_path)
-prod_df = pd.read_pickle(prod_path)
+    from src.simulation import Simulation
+    from src.utils import configure_logging, load_split
 
-sim = Simulation(
-    model_name="Price Regressor", dev_mode=eval(os.environ["DEV_MODE"].capitalize())
-)
-sim.run_simulation(train_df, prod_df)
+    configure_logging()
+
+    train_df = load_split("train")
+    prod_df = load_split("prod")
+
+    sim = Simulation(
+        model_name="Price Regressor",
+        dev_mode=eval(os.environ["DEV_MODE"].capitalize()),
+        inference_engine=os.environ.get("INFERENCE_ENGINE", "threaded"),
+        checkpoint_path=os.environ.get("INFERENCE_CHECKPOINT_PATH"),
+        metrics_mirror_path=os.environ.get("METRICS_MIRROR_PATH"),
+        report_engine=os.environ.get("REPORT_ENGINE", "evidently"),
+        report_export=os.environ.get("REPORT_EXPORT", "standalone"),
+        report_max_points=(
+            int(os.environ["REPORT_MAX_POINTS"])
+            if os.environ.get("REPORT_MAX_POINTS")
+            else None
+        ),
+    )
+    sim.run_simulation(
+        train_df,
+        prod_df,
+        pipelined=os.environ.get("PIPELINED", "false").lower() == "true",
+    )
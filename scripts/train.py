@@ -41,7 +41,6 @@
 import scipy
 import pickle
 import numpy as np
-import pandas as pd
 from sklearn.pipeline import Pipeline
 from sklearn.linear_model import Ridge
 from sklearn.impute import SimpleImputer
@@ -49,8 +48,9 @@ from sklearn.preprocessing import OneHotEncoder, MinMaxScaler, StandardScaler
 from sklearn.compose import ColumnTransformer, TransformedTargetRegressor
 from sklearn.model_selection import GridSearchCV
 
-train_path = "data/working/train_df.pkl"
-train_df = pd.read_pickle(train_path)
+from src.utils import load_split
+
+train_df = load_split("train")
 
 X_train = train_df.drop("price", axis=1)
 y_train = train_df.price
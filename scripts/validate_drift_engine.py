@@ -0,0 +1,101 @@
+# ###########################################################################
+#
+#  CLOUDERA APPLIED MACHINE LEARNING PROTOTYPE (AMP)
+#  (C) Cloudera, Inc. 2021
+#  All rights reserved.
+#
+#  Applicable Open Source License: Apache 2.0
+#
+#  NOTE: Cloudera open source products are modular software products
+#  made up of hundreds of individual components, each of which was
+#  individually copyrighted.  Each Cloudera open source product is a
+#  collective work under U.S. Copyright Law. Your license to use the
+#  collective work is as provided in your written agreement with
+#  Cloudera.  Used apart from the collective work, this file is
+#  licensed for your use pursuant to the open source license
+#  identified above.
+#
+#  This code is provided to you pursuant a written agreement with
+#  (i) Cloudera, Inc. or (ii) a third-party authorized to distribute
+#  this code. If you do not have a written agreement with Cloudera nor
+#  with an authorized and properly licensed third party, you do not
+#  have any rights to access nor to use this code.
+#
+#  Absent a written agreement with Cloudera, Inc. (“Cloudera”) to the
+#  contrary, A) CLOUDERA PROVIDES THIS CODE TO YOU WITHOUT WARRANTIES OF ANY
+#  KIND; (B) CLOUDERA DISCLAIMS ANY AND ALL EXPRESS AND IMPLIED
+#  WARRANTIES WITH RESPECT TO THIS CODE, INCLUDING BUT NOT LIMITED TO
+#  IMPLIED WARRANTIES OF TITLE, NON-INFRINGEMENT, MERCHANTABILITY AND
+#  FITNESS FOR A PARTICULAR PURPOSE; (C) CLOUDERA IS NOT LIABLE TO YOU,
+#  AND WILL NOT DEFEND, INDEMNIFY, NOR HOLD YOU HARMLESS FOR ANY CLAIMS
+#  ARISING FROM OR RELATED TO THE CODE; AND (D)WITH RESPECT TO YOUR EXERCISE
+#  OF ANY RIGHTS GRANTED TO YOU FOR THE CODE, CLOUDERA IS NOT LIABLE FOR ANY
+#  DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, PUNITIVE OR
+#  CONSEQUENTIAL DAMAGES INCLUDING, BUT NOT LIMITED TO, DAMAGES
+#  RELATED TO LOST REVENUE, LOST PROFITS, LOSS OF INCOME, LOSS OF
+#  BUSINESS ADVANTAGE OR UNAVAILABILITY, OR LOSS OR CORRUPTION OF
+#  DATA.
+#
+# ###########################################################################
+
+# Validate the native drift engine (src/drift.py) against Evidently's Data Drift
+# analyzer. The raw features of each month of production data are compared with the
+# training data by both engines, and their p-values and drift decisions reported.
+#
+# Usage:
+#   python scripts/validate_drift_engine.py [--tolerance 0.01]
+
+import sys
+import json
+import argparse
+from evidently.model_profile import Profile
+from evidently.profile_sections import DataDriftProfileSection
+
+from src.drift import calculate_drift
+from src.columns import NUM_FEATURES, CAT_FEATURES
+from src.utils import load_split
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--tolerance", type=float, default=0.01)
+args = parser.parse_args()
+
+train_df = load_split("train")
+prod_df = load_split("prod")
+
+column_map = {
+    "target": None,
+    "prediction": None,
+    "numerical_features": NUM_FEATURES,
+    "categorical_features": CAT_FEATURES,
+    "datetime": None,
+}
+features = NUM_FEATURES + CAT_FEATURES
+
+mismatches = 0
+for month, current_df in prod_df.groupby(prod_df.date_sold.dt.to_period("M")):
+    reference_df = train_df.sample(
+        n=min(len(current_df), len(train_df)), random_state=42
+    )
+    reference_df, current_df = reference_df[features], current_df[features]
+
+    profile = Profile(sections=[DataDriftProfileSection])
+    profile.calculate(reference_df, current_df, column_mapping=column_map)
+    evidently_metrics = json.loads(profile.json())["data_drift"]["data"]["metrics"]
+
+    native = calculate_drift(reference_df, current_df)["features"]
+
+    print(f"--- {month} ({len(current_df)} records)")
+    for feature in features:
+        expected = evidently_metrics[feature]["p_value"]
+        actual = native[feature]["p_value"]
+        agrees = (expected < 0.05) == (actual < 0.05)
+        close = abs(expected - actual) <= args.tolerance
+        mismatches += not agrees
+
+        print(
+            f"{feature:>12}: evidently={expected:.4f} native={actual:.4f} "
+            f"{'ok' if agrees and close else 'DIFF' if agrees else 'MISMATCH'}"
+        )
+
+print(f"{mismatches} drift decisions differ between engines")
+sys.exit(1 if mismatches else 0)
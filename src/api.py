@@ -40,25 +40,79 @@
 
 import os
 import json
+import time
 import string
 import cmlapi
 import random
 import logging
+import threading
+from collections import OrderedDict
 from packaging import version
+from cmlapi.rest import ApiException
 
 logger = logging.getLogger(__name__)
-logger.setLevel(logging.INFO)
 
-formatter = logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
 
-log_file = "logs/simulation.log"
-os.makedirs(os.path.dirname(log_file), exist_ok=True)
-file_handler = logging.FileHandler(log_file)
-file_handler.setLevel(logging.DEBUG)
-file_handler.setFormatter(formatter)
+# HTTP statuses worth retrying: rate limiting and transient server-side errors
+RETRYABLE_STATUSES = (429, 500, 502, 503, 504)
 
-if not logger.handlers:
-    logger.addHandler(file_handler)
+
+class TTLCache:
+    """A small, thread-safe cache whose entries expire after a time-to-live
+
+    Entries are evicted when they expire or, once max_entries is reached, least
+    recently used first. Loaders that raise are not cached, so a failed lookup is
+    retried on the next access.
+
+    Attributes:
+        ttl (float): seconds an entry remains valid
+        max_entries (int)
+
+    """
+
+    def __init__(self, ttl=300, max_entries=128):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return default
+            value, expires_at = entry
+            if time.monotonic() >= expires_at:
+                del self._entries[key]
+                return default
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get_or_load(self, key, loader):
+        """Return the cached value for key, or call loader() and cache its result."""
+
+        missing = object()
+        value = self.get(key, missing)
+        if value is missing:
+            value = loader()
+            self.set(key, value)
+        return value
+
+    def invalidate(self, key=None):
+        """Drop one entry, or every entry if key is None."""
+
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
 
 
 class ApiUtility:
@@ -67,64 +121,119 @@ class ApiUtility:
     This class contains methods that wrap API_v2 to achieve specific
     needs that facilitate the simulation.
 
+    Deployment details and application ids are cached for cache_ttl seconds, list
+    calls are filtered and sorted server-side and paginated, and transient API errors
+    are retried with exponential backoff.
+
     Attributes:
         client (cmlapi.api.cml_service_api.CMLServiceApi)
+        cache (TTLCache): cached deployment details and application ids
+        page_size (int): number of results requested per page of a list call
+        max_retries (int): number of retries for a failed API call
+        backoff_factor (float): base delay in seconds for exponential backoff
 
     """
 
-    def __init__(self):
+    def __init__(self, cache_ttl=300, page_size=100, max_retries=3, backoff_factor=0.5):
         self.client = cmlapi.default_client()
+        self.cache = TTLCache(ttl=cache_ttl)
+        self.page_size = page_size
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+
+    def call(self, method, *args, **kwargs):
+        """
+        Call a client method, retrying rate-limited and transient server errors with
+        exponential backoff and jitter. Requests made with async_req=True are waited on.
+        """
+
+        for attempt in range(self.max_retries + 1):
+            try:
+                result = method(*args, **kwargs)
+                return result.get() if kwargs.get("async_req") else result
+            except ApiException as e:
+                if e.status not in RETRYABLE_STATUSES or attempt == self.max_retries:
+                    raise
+                delay = random.uniform(0, self.backoff_factor * 2**attempt)
+                logger.info(f"Retrying {method.__name__} in {delay:.2f}s ({e.status})")
+                time.sleep(delay)
+
+    def list_all(self, method, key, **kwargs):
+        """
+        Collect every result of a paginated list call (e.g. client.list_applications,
+        whose results are under "applications"), following next_page_token.
+        """
+
+        results, page_token = [], None
+        while True:
+            if page_token:
+                kwargs["page_token"] = page_token
+            page = self.call(method, page_size=self.page_size, **kwargs).to_dict()
+            results.extend(page[key])
+            page_token = page.get("next_page_token")
+            if not page_token:
+                return results
+
+    def latest(self, method, key, **kwargs):
+        """The most recently created result of a list call, sorted server-side."""
+
+        page = self.call(method, sort="-created_at", page_size=1, **kwargs).to_dict()
+        return page[key][0]
 
     def get_latest_deployment_details(self, model_name):
         """
         Given a APIv2 client object and Model Name, use APIv2 to retrieve details about the latest/current deployment.
 
-        This function only works for models deployed within the current project.
+        This function only works for models deployed within the current project. Details are cached; see
+        invalidate() to force a fresh lookup, e.g. after redeploying the model.
         """
 
+        return self.cache.get_or_load(
+            ("deployment", model_name),
+            lambda: self._get_latest_deployment_details(model_name),
+        )
+
+    def _get_latest_deployment_details(self, model_name):
         project_id = os.environ["CDSW_PROJECT_ID"]
 
-        # gather model details
-        models = (
-            self.client.list_models(project_id=project_id, async_req=True)
-            .get()
-            .to_dict()
+        # gather model details; the name filter may match other models containing it
+        models = self.list_all(
+            self.client.list_models,
+            "models",
+            project_id=project_id,
+            search_filter=json.dumps({"name": model_name}),
         )
-        model_info = [
-            model for model in models["models"] if model["name"] == model_name
-        ][0]
+        model_info = [model for model in models if model["name"] == model_name][0]
 
         model_id = model_info["id"]
         model_crn = model_info["crn"]
         model_access_key = model_info["access_key"]
 
         # gather latest build details
-        builds = (
-            self.client.list_model_builds(
-                project_id=project_id, model_id=model_id, async_req=True
-            )
-            .get()
-            .to_dict()
+        build_info = self.latest(
+            self.client.list_model_builds,
+            "model_builds",
+            project_id=project_id,
+            model_id=model_id,
         )
-        build_info = builds["model_builds"][-1]  # most recent build
 
         build_id = build_info["id"]
 
         # gather latest deployment details
-        deployments = (
-            self.client.list_model_deployments(
-                project_id=project_id,
-                model_id=model_id,
-                build_id=build_id,
-                async_req=True,
-            )
-            .get()
-            .to_dict()
+        deployment_info = self.latest(
+            self.client.list_model_deployments,
+            "model_deployments",
+            project_id=project_id,
+            model_id=model_id,
+            build_id=build_id,
         )
-        deployment_info = deployments["model_deployments"][-1]  # most recent deployment
 
         model_deployment_crn = deployment_info["crn"]
 
+        logger.info(
+            f"Resolved latest deployment of {model_name}: {model_deployment_crn}"
+        )
+
         return {
             "model_name": model_name,
             "model_id": model_id,
@@ -134,21 +243,17 @@ class ApiUtility:
             "latest_deployment_crn": model_deployment_crn,
         }
 
-    def get_latest_standard_runtime(self):
+    def get_latest_standard_runtime(self, runtimes=None):
         """
         Use CML APIv2 to identify and return the latest version of a Python 3.6,
         Standard, Workbench Runtime
+
+        A list of matching runtimes may be provided if they have already been fetched.
         """
 
         try:
-            runtime_criteria = {
-                "kernel": "Python 3.6",
-                "edition": "Standard",
-                "editor": "Workbench",
-            }
-            runtimes = self.client.list_runtimes(
-                search_filter=json.dumps(runtime_criteria)
-            ).to_dict()["runtimes"]
+            if runtimes is None:
+                runtimes = self.list_runtimes()
 
             versions = {
                 version.parse(rt["full_version"]): i for i, rt in enumerate(runtimes)
@@ -161,19 +266,56 @@ class ApiUtility:
             logger.info("No matching runtime available.")
             return None
 
+    def list_runtimes(self, async_req=False):
+        """
+        List Python 3.6, Standard, Workbench Runtimes. With async_req=True, the request is
+        started in the background and a callable returning the list is returned instead.
+        """
+
+        runtime_criteria = {
+            "kernel": "Python 3.6",
+            "edition": "Standard",
+            "editor": "Workbench",
+        }
+        kwargs = {"search_filter": json.dumps(runtime_criteria)}
+
+        if not async_req:
+            return self.list_all(self.client.list_runtimes, "runtimes", **kwargs)
+
+        request = self.client.list_runtimes(
+            page_size=self.page_size, async_req=True, **kwargs
+        )
+
+        def result():
+            page = request.get().to_dict()
+            runtimes = page["runtimes"]
+            if page.get("next_page_token"):
+                runtimes += self.list_all(
+                    self.client.list_runtimes,
+                    "runtimes",
+                    page_token=page["next_page_token"],
+                    **kwargs,
+                )
+            return runtimes
+
+        return result
+
     def deploy_monitoring_application(self, application_name):
         """
         Use CML APIv2 to create and deploy an application to serve the Evidently
         monitoring reports via a Flask application.
 
-        Utilize a runtime if available, else use legacy Python3 engine.
+        Utilize a runtime if available, else use legacy Python3 engine. The project and
+        the available runtimes are looked up concurrently.
 
         """
 
+        project_id = os.environ["CDSW_PROJECT_ID"]
+
         ipt = {
             "name": application_name,
             "description": "An Evidently.ai dashboard for monitoring data drift, target drift, and regression performance.",
-            "project_id": os.environ["CDSW_PROJECT_ID"],
+            "project_id": project_id,
             "subdomain": "".join(
                 [random.choice(string.ascii_lowercase) for _ in range(6)]
             ),
@@ -183,36 +325,74 @@ class ApiUtility:
             "memory": 2,
         }
 
+        # both lookups are independent, so start the runtime listing before waiting on the project
+        runtimes = self.list_runtimes(async_req=True)
+        project = self.call(self.client.get_project, project_id, async_req=True)
+
         # configure runtime if available
-        if (
-            self.client.get_project(os.environ["CDSW_PROJECT_ID"]).default_engine_type
-            != "legacy_engine"
-        ):
-            ipt["runtime_identifier"] = self.get_latest_standard_runtime()
+        if project.default_engine_type != "legacy_engine":
+            try:
+                available_runtimes = runtimes()
+            except ApiException:
+                available_runtimes = []
+            ipt["runtime_identifier"] = self.get_latest_standard_runtime(
+                available_runtimes
+            )
             del ipt["kernel"]
 
         application_request = cmlapi.CreateApplicationRequest(**ipt)
 
-        self.client.create_application(
-            project_id=os.environ["CDSW_PROJECT_ID"], body=application_request
+        application = self.call(
+            self.client.create_application,
+            project_id=project_id,
+            body=application_request,
         )
+        self.cache.set(("application", application_name), application.id)
         logger.info(f"Created and deployed new application: {application_name}")
 
+    def get_application_id(self, application_name):
+        """Use CML APIv2 to look up (and cache) the id of an application by name."""
+
+        def load():
+            search_criteria = {"name": application_name}
+            applications = self.list_all(
+                self.client.list_applications,
+                "applications",
+                project_id=os.environ["CDSW_PROJECT_ID"],
+                search_filter=json.dumps(search_criteria),
+            )
+            return [app for app in applications if app["name"] == application_name][0][
+                "id"
+            ]
+
+        return self.cache.get_or_load(("application", application_name), load)
+
     def restart_running_application(self, application_name):
         """
         Use CML APIv2 to restart a running application provided the application name.
 
+        If the cached application id is stale (the application was deleted or recreated),
+        it is looked up again once.
+
         """
 
-        search_criteria = {"name": application_name}
+        for attempt in range(2):
+            application_id = self.get_application_id(application_name)
+            try:
+                self.call(
+                    self.client.restart_application,
+                    project_id=os.environ["CDSW_PROJECT_ID"],
+                    application_id=application_id,
+                )
+                break
+            except ApiException as e:
+                if e.status != 404 or attempt == 1:
+                    raise
+                self.cache.invalidate(("application", application_name))
 
-        app = self.client.list_applications(
-            project_id=os.environ["CDSW_PROJECT_ID"],
-            search_filter=json.dumps(search_criteria),
-        ).to_dict()["applications"][0]
+        logger.info(f"Restarted existing application: {application_name}")
 
-        self.client.restart_application(
-            project_id=os.environ["CDSW_PROJECT_ID"], application_id=app["id"]
-        )
+    def invalidate(self):
+        """Drop all cached deployment details and application ids."""
 
-        logger.info(f"Restarted existing application: {application_name}")
+        self.cache.invalidate()
@@ -0,0 +1,176 @@
+# ###########################################################################
+#
+#  CLOUDERA APPLIED MACHINE LEARNING PROTOTYPE (AMP)
+#  (C) Cloudera, Inc. 2021
+#  All rights reserved.
+#
+#  Applicable Open Source License: Apache 2.0
+#
+#  NOTE: Cloudera open source products are modular software products
+#  made up of hundreds of individual components, each of which was
+#  individually copyrighted.  Each Cloudera open source product is a
+#  collective work under U.S. Copyright Law. Your license to use the
+#  collective work is as provided in your written agreement with
+#  Cloudera.  Used apart from the collective work, this file is
+#  licensed for your use pursuant to the open source license
+#  identified above.
+#
+#  This code is provided to you pursuant a written agreement with
+#  (i) Cloudera, Inc. or (ii) a third-party authorized to distribute
+#  this code. If you do not have a written agreement with Cloudera nor
+#  with an authorized and properly licensed third party, you do not
+#  have any rights to access nor to use this code.
+#
+#  Absent a written agreement with Cloudera, Inc. (“Cloudera”) to the
+#  contrary, A) CLOUDERA PROVIDES THIS CODE TO YOU WITHOUT WARRANTIES OF ANY
+#  KIND; (B) CLOUDERA DISCLAIMS ANY AND ALL EXPRESS AND IMPLIED
+#  WARRANTIES WITH RESPECT TO THIS CODE, INCLUDING BUT NOT LIMITED TO
+#  IMPLIED WARRANTIES OF TITLE, NON-INFRINGEMENT, MERCHANTABILITY AND
+#  FITNESS FOR A PARTICULAR PURPOSE; (C) CLOUDERA IS NOT LIABLE TO YOU,
+#  AND WILL NOT DEFEND, INDEMNIFY, NOR HOLD YOU HARMLESS FOR ANY CLAIMS
+#  ARISING FROM OR RELATED TO THE CODE; AND (D)WITH RESPECT TO YOUR EXERCISE
+#  OF ANY RIGHTS GRANTED TO YOU FOR THE CODE, CLOUDERA IS NOT LIABLE FOR ANY
+#  DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, PUNITIVE OR
+#  CONSEQUENTIAL DAMAGES INCLUDING, BUT NOT LIMITED TO, DAMAGES
+#  RELATED TO LOST REVENUE, LOST PROFITS, LOSS OF INCOME, LOSS OF
+#  BUSINESS ADVANTAGE OR UNAVAILABILITY, OR LOSS OR CORRUPTION OF
+#  DATA.
+#
+# ###########################################################################
+
+import threading
+
+
+class AIMDLimiter:
+    """An adaptive limit on the number of concurrent in-flight requests
+
+    Uses additive-increase/multiplicative-decrease (AIMD) control, as in TCP congestion
+    control. Each completed request reports its latency and whether it failed:
+
+        - If the smoothed error rate exceeds `error_threshold`, or the smoothed latency
+          has risen beyond `latency_tolerance` times the baseline latency, the endpoint
+          is considered overloaded and the limit is multiplied by `backoff_ratio`.
+        - Otherwise, the limit grows by roughly one for every `limit` successful
+          requests, probing for spare capacity.
+
+    As in TCP, the limit is cut at most once per window: after a cut, congestion is
+    ignored until `limit` more requests have completed, since the requests already in
+    flight were sent under the old limit and would otherwise each trigger another cut
+    for the same overload. The baseline is the lowest smoothed latency observed, but it
+    drifts up towards the current latency at rate `baseline_decay`, so that a lasting
+    change in the endpoint's latency (e.g. a slower model version) is eventually
+    accepted as the new normal rather than holding the limit at its minimum.
+
+    This lets the number of in-flight requests track the capacity of the model
+    endpoint as replicas are added or removed, rather than relying on a static value.
+
+    Usage:
+
+        limiter.acquire()
+        try:
+            ...
+        finally:
+            limiter.release(latency_s, error=False)
+
+    Attributes:
+        min_limit (int)
+        max_limit (int)
+        backoff_ratio (float): multiplicative decrease applied on congestion
+        latency_tolerance (float): multiple of the baseline latency considered congested
+        error_threshold (float): smoothed error rate considered congested
+        baseline_decay (float): weight of the current latency in the baseline, per
+            request, while the current latency is above it
+        smoothing (float): weight of the newest sample in the latency/error averages
+        latency_ms (float): smoothed latency of recent requests in milliseconds
+        baseline_latency_ms (float): baseline latency in milliseconds (see above)
+        error_rate (float): smoothed fraction of recent requests that failed
+
+    """
+
+    def __init__(
+        self,
+        initial_limit=2,
+        min_limit=1,
+        max_limit=64,
+        backoff_ratio=0.9,
+        latency_tolerance=2.0,
+        error_threshold=0.2,
+        baseline_decay=0.001,
+        smoothing=0.1,
+    ):
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.backoff_ratio = backoff_ratio
+        self.latency_tolerance = latency_tolerance
+        self.error_threshold = error_threshold
+        self.baseline_decay = baseline_decay
+        self.smoothing = smoothing
+
+        self.latency_ms = None
+        self.baseline_latency_ms = None
+        self.error_rate = 0.0
+
+        self._limit = float(initial_limit)
+        self._in_flight = 0
+        self._since_decrease = 0
+        self._condition = threading.Condition()
+
+    @property
+    def limit(self):
+        """The current concurrency limit."""
+        return int(self._limit)
+
+    def acquire(self):
+        """Block until the number of in-flight requests is below the current limit."""
+
+        with self._condition:
+            while self._in_flight >= self.limit:
+                self._condition.wait()
+            self._in_flight += 1
+
+    def release(self, latency, error=False):
+        """
+        Record the outcome of a request and adjust the limit.
+
+        Args:
+            latency (float): request duration in seconds
+            error (bool): whether the request failed
+
+        """
+
+        with self._condition:
+            self._in_flight -= 1
+            self._update(latency * 1000, error)
+            self._condition.notify_all()
+
+    def _update(self, latency_ms, error):
+        if self.latency_ms is None:
+            self.latency_ms = latency_ms
+        else:
+            self.latency_ms += self.smoothing * (latency_ms - self.latency_ms)
+
+        self.error_rate += self.smoothing * (float(error) - self.error_rate)
+
+        if (
+            self.baseline_latency_ms is None
+            or self.latency_ms < self.baseline_latency_ms
+        ):
+            self.baseline_latency_ms = self.latency_ms
+        else:
+            self.baseline_latency_ms += self.baseline_decay * (
+                self.latency_ms - self.baseline_latency_ms
+            )
+
+        congested = (
+            self.error_rate > self.error_threshold
+            or self.latency_ms > self.latency_tolerance * self.baseline_latency_ms
+        )
+
+        self._since_decrease += 1
+        if congested:
+            # react at most once per window of completions
+            if self._since_decrease >= self._limit:
+                self._limit = max(self.min_limit, self._limit * self.backoff_ratio)
+                self._since_decrease = 0
+        else:
+            self._limit = min(self.max_limit, self._limit + 1 / self._limit)
@@ -0,0 +1,298 @@
+# ###########################################################################
+#
+#  CLOUDERA APPLIED MACHINE LEARNING PROTOTYPE (AMP)
+#  (C) Cloudera, Inc. 2021
+#  All rights reserved.
+#
+#  Applicable Open Source License: Apache 2.0
+#
+#  NOTE: Cloudera open source products are modular software products
+#  made up of hundreds of individual components, each of which was
+#  individually copyrighted.  Each Cloudera open source product is a
+#  collective work under U.S. Copyright Law. Your license to use the
+#  collective work is as provided in your written agreement with
+#  Cloudera.  Used apart from the collective work, this file is
+#  licensed for your use pursuant to the open source license
+#  identified above.
+#
+#  This code is provided to you pursuant a written agreement with
+#  (i) Cloudera, Inc. or (ii) a third-party authorized to distribute
+#  this code. If you do not have a written agreement with Cloudera nor
+#  with an authorized and properly licensed third party, you do not
+#  have any rights to access nor to use this code.
+#
+#  Absent a written agreement with Cloudera, Inc. (“Cloudera”) to the
+#  contrary, A) CLOUDERA PROVIDES THIS CODE TO YOU WITHOUT WARRANTIES OF ANY
+#  KIND; (B) CLOUDERA DISCLAIMS ANY AND ALL EXPRESS AND IMPLIED
+#  WARRANTIES WITH RESPECT TO THIS CODE, INCLUDING BUT NOT LIMITED TO
+#  IMPLIED WARRANTIES OF TITLE, NON-INFRINGEMENT, MERCHANTABILITY AND
+#  FITNESS FOR A PARTICULAR PURPOSE; (C) CLOUDERA IS NOT LIABLE TO YOU,
+#  AND WILL NOT DEFEND, INDEMNIFY, NOR HOLD YOU HARMLESS FOR ANY CLAIMS
+#  ARISING FROM OR RELATED TO THE CODE; AND (D)WITH RESPECT TO YOUR EXERCISE
+#  OF ANY RIGHTS GRANTED TO YOU FOR THE CODE, CLOUDERA IS NOT LIABLE FOR ANY
+#  DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, PUNITIVE OR
+#  CONSEQUENTIAL DAMAGES INCLUDING, BUT NOT LIMITED TO, DAMAGES
+#  RELATED TO LOST REVENUE, LOST PROFITS, LOSS OF INCOME, LOSS OF
+#  BUSINESS ADVANTAGE OR UNAVAILABILITY, OR LOSS OR CORRUPTION OF
+#  DATA.
+#
+# ###########################################################################
+
+import os
+import json
+import numpy as np
+from scipy.stats import chi2, kstwo
+
+from src.columns import TARGET, PREDICTION, NUM_FEATURES, CAT_FEATURES
+from src.metrics_summary import finite_or_none
+
+# proportions are floored at this value when computing PSI / Jensen-Shannon so that
+# empty bins do not produce infinite values
+EPSILON = 1e-4
+
+
+def ks_2samp_columns(reference, current):
+    """
+    Two-sample Kolmogorov-Smirnov test for every column of two 2D arrays at once.
+
+    The reference and current samples are stacked and sorted column-wise in one pass;
+    the running difference between the two empirical CDFs is then read off the sorted
+    order, evaluated only at the last of each run of tied values. P-values use the
+    same asymptotic distribution as scipy.stats.ks_2samp(mode="asymp").
+
+    The test is undefined if either sample is empty, in which case every statistic and
+    p-value is NaN.
+
+    Args:
+        reference (np.ndarray): (n, k) array
+        current (np.ndarray): (m, k) array
+
+    Returns:
+        tuple: (statistics, p_values), each an array of length k
+
+    """
+
+    n, m = len(reference), len(current)
+    if not n or not m:
+        undefined = np.full(np.shape(reference)[1], np.nan)
+        return undefined, undefined.copy()
+
+    combined = np.concatenate([reference, current]).astype(float)
+
+    order = np.argsort(combined, axis=0, kind="mergesort")
+    values = np.take_along_axis(combined, order, axis=0)
+    from_reference = order < n
+
+    cdf_diff = np.abs(
+        np.cumsum(from_reference, axis=0) / n - np.cumsum(~from_reference, axis=0) / m
+    )
+    last_of_run = np.ones_like(from_reference)
+    last_of_run[:-1] = values[1:] != values[:-1]
+
+    statistics = np.where(last_of_run, cdf_diff, 0).max(axis=0)
+    p_values = kstwo.sf(statistics, np.round(n * m / (n + m)))
+
+    return statistics, np.clip(p_values, 0, 1)
+
+
+def chi_square_test(reference_counts, current_counts):
+    """
+    Chi-square test of a categorical feature's counts, following the convention used
+    by Evidently's data drift analyzer so results are directly comparable: reference
+    counts are rescaled to the size of the current sample and compared against the
+    current counts as the expected frequencies.
+
+    A category present in the reference but missing from the current sample has an
+    expected frequency of zero, which makes the statistic infinite. In that case half a
+    count is added to every category of both samples (additive smoothing), so the
+    statistic stays finite while the missing category still drives it up.
+
+    Returns:
+        tuple: (statistic, p_value)
+
+    """
+
+    reference_counts = np.asarray(reference_counts, dtype=float)
+    current_counts = np.asarray(current_counts, dtype=float)
+    if (current_counts == 0).any():
+        reference_counts = reference_counts + 0.5
+        current_counts = current_counts + 0.5
+
+    f_obs = reference_counts * current_counts.sum() / reference_counts.sum()
+    f_exp = current_counts
+
+    terms = np.where(f_obs == f_exp, 0.0, (f_obs - f_exp) ** 2 / f_exp)
+
+    statistic = terms.sum()
+    p_value = chi2.sf(statistic, max(len(f_obs) - 1, 1))
+
+    return float(statistic), float(p_value)
+
+
+def population_stability_index(reference_counts, current_counts):
+    """Population Stability Index between two histograms (arrays of counts)."""
+
+    p, q = _proportions(reference_counts), _proportions(current_counts)
+    return float(np.sum((q - p) * np.log(q / p)))
+
+
+def jensen_shannon_distance(reference_counts, current_counts):
+    """Jensen-Shannon distance (base 2, bounded by [0, 1]) between two histograms."""
+
+    p, q = _proportions(reference_counts), _proportions(current_counts)
+    mid = (p + q) / 2
+    divergence = 0.5 * np.sum(p * np.log2(p / mid)) + 0.5 * np.sum(q * np.log2(q / mid))
+    return float(np.sqrt(max(divergence, 0.0)))
+
+
+def quantile_bin_edges(reference, bins=10):
+    """Column-wise bin edges at reference quantiles; returns a list of k edge arrays."""
+
+    edges = np.quantile(reference, np.linspace(0, 1, bins + 1), axis=0)
+    return [np.unique(edges[:, j]) for j in range(edges.shape[1])]
+
+
+def bin_counts(values, edges):
+    """Histogram of a 1D array over the interior edges, with open-ended outer bins."""
+
+    positions = np.searchsorted(edges[1:-1], values, side="right")
+    return np.bincount(positions, minlength=max(len(edges) - 1, 1))
+
+
+def category_counts(reference, current):
+    """Counts of each category seen in either sample, aligned between the two."""
+
+    categories, codes = np.unique(
+        np.concatenate([reference, current]).astype(str), return_inverse=True
+    )
+    codes = codes.ravel()
+    reference_counts = np.bincount(codes[: len(reference)], minlength=len(categories))
+    current_counts = np.bincount(codes[len(reference) :], minlength=len(categories))
+
+    return categories, reference_counts, current_counts
+
+
+def calculate_drift(
+    reference_df,
+    current_df,
+    num_features=NUM_FEATURES,
+    cat_features=CAT_FEATURES,
+    threshold=0.05,
+    drift_share=0.5,
+    bins=10,
+):
+    """
+    Calculate drift statistics for all features with NumPy, as a fast alternative to
+    Evidently's Data Drift and Numerical Target Drift tabs.
+
+    Numerical features (and the target/prediction columns, if present) are tested with
+    a two-sample KS test computed for all columns in one vectorized pass; categorical
+    features with a chi-square test. Every feature also gets PSI and Jensen-Shannon
+    distance, over reference-quantile bins for numerical features and over categories
+    for categorical ones. A feature drifts if its p-value is below threshold, and the
+    dataset drifts if at least drift_share of the features do (as in Evidently).
+
+    Args:
+        reference_df (pd.DataFrame)
+        current_df (pd.DataFrame)
+        num_features (list)
+        cat_features (list)
+        threshold (float): p-value below which a feature is considered drifted
+        drift_share (float): share of drifted features at which the dataset drifts
+        bins (int): number of reference-quantile bins for numerical PSI/JS
+
+    Returns:
+        dict: JSON-serializable drift results, or None if either dataframe is empty, as
+            none of the tests are defined for an empty sample
+
+    """
+
+    if not len(reference_df) or not len(current_df):
+        return None
+
+    def num_results(columns):
+        if not columns:
+            return {}
+
+        reference = reference_df[columns].to_numpy(dtype=float)
+        current = current_df[columns].to_numpy(dtype=float)
+        statistics, p_values = ks_2samp_columns(reference, current)
+        edges = quantile_bin_edges(reference, bins)
+
+        results = {}
+        for j, column in enumerate(columns):
+            ref_counts = bin_counts(reference[:, j], edges[j])
+            cur_counts = bin_counts(current[:, j], edges[j])
+            results[column] = {
+                "feature_type": "num",
+                "stattest": "ks",
+                "statistic": float(statistics[j]),
+                "p_value": float(p_values[j]),
+                "psi": population_stability_index(ref_counts, cur_counts),
+                "jensen_shannon": jensen_shannon_distance(ref_counts, cur_counts),
+                "drift_detected": bool(p_values[j] < threshold),
+            }
+        return results
+
+    features = num_results(list(num_features))
+
+    for column in cat_features:
+        _, ref_counts, cur_counts = category_counts(
+            reference_df[column].to_numpy(), current_df[column].to_numpy()
+        )
+        statistic, p_value = chi_square_test(ref_counts, cur_counts)
+        features[column] = {
+            "feature_type": "cat",
+            "stattest": "chisquare",
+            "statistic": statistic,
+            "p_value": p_value,
+            "psi": population_stability_index(ref_counts, cur_counts),
+            "jensen_shannon": jensen_shannon_distance(ref_counts, cur_counts),
+            "drift_detected": bool(p_value < threshold),
+        }
+
+    n_drifted = sum(result["drift_detected"] for result in features.values())
+
+    results = {
+        "n_features": len(features),
+        "n_drifted_features": n_drifted,
+        "share_drifted_features": n_drifted / len(features) if features else 0.0,
+        "dataset_drift": bool(features) and n_drifted / len(features) >= drift_share,
+        "features": features,
+        "target_drift": num_results(
+            [
+                column
+                for column in (TARGET, PREDICTION)
+                if column in reference_df and column in current_df
+            ]
+        ),
+    }
+
+    if TARGET in current_df and PREDICTION in current_df:
+        errors = (current_df[PREDICTION] - current_df[TARGET]).to_numpy(dtype=float)
+        results["regression_performance"] = {
+            "mean_error": float(errors.mean()),
+            "mean_abs_error": float(np.abs(errors).mean()),
+            "rmse": float(np.sqrt((errors**2).mean())),
+        }
+
+    return results
+
+
+def save_drift_results(results, path):
+    """
+    Write drift results as compact JSON, atomically. Non-finite values (e.g. the NaN
+    statistics of a test on an empty column) are not valid JSON, so they are written as
+    null (see src.metrics_summary.finite_or_none()) rather than as Infinity/NaN.
+    """
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = os.path.join(os.path.dirname(path), f".{os.path.basename(path)}.tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(finite_or_none(results), f, separators=(",", ":"), allow_nan=False)
+    os.replace(tmp_path, path)
+
+
+def _proportions(counts):
+    counts = np.asarray(counts, dtype=float)
+    return np.clip(counts / max(counts.sum(), 1), EPSILON, None)
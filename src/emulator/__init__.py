@@ -0,0 +1,188 @@
+# ###########################################################################
+#
+#  CLOUDERA APPLIED MACHINE LEARNING PROTOTYPE (AMP)
+#  (C) Cloudera, Inc. 2021
+#  All rights reserved.
+#
+#  Applicable Open Source License: Apache 2.0
+#
+#  NOTE: Cloudera open source products are modular software products
+#  made up of hundreds of individual components, each of which was
+#  individually copyrighted.  Each Cloudera open source product is a
+#  collective work under U.S. Copyright Law. Your license to use the
+#  collective work is as provided in your written agreement with
+#  Cloudera.  Used apart from the collective work, this file is
+#  licensed for your use pursuant to the open source license
+#  identified above.
+#
+#  This code is provided to you pursuant a written agreement with
+#  (i) Cloudera, Inc. or (ii) a third-party authorized to distribute
+#  this code. If you do not have a written agreement with Cloudera nor
+#  with an authorized and properly licensed third party, you do not
+#  have any rights to access nor to use this code.
+#
+#  Absent a written agreement with Cloudera, Inc. (“Cloudera”) to the
+#  contrary, A) CLOUDERA PROVIDES THIS CODE TO YOU WITHOUT WARRANTIES OF ANY
+#  KIND; (B) CLOUDERA DISCLAIMS ANY AND ALL EXPRESS AND IMPLIED
+#  WARRANTIES WITH RESPECT TO THIS CODE, INCLUDING BUT NOT LIMITED TO
+#  IMPLIED WARRANTIES OF TITLE, NON-INFRINGEMENT, MERCHANTABILITY AND
+#  FITNESS FOR A PARTICULAR PURPOSE; (C) CLOUDERA IS NOT LIABLE TO YOU,
+#  AND WILL NOT DEFEND, INDEMNIFY, NOR HOLD YOU HARMLESS FOR ANY CLAIMS
+#  ARISING FROM OR RELATED TO THE CODE; AND (D)WITH RESPECT TO YOUR EXERCISE
+#  OF ANY RIGHTS GRANTED TO YOU FOR THE CODE, CLOUDERA IS NOT LIABLE FOR ANY
+#  DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, PUNITIVE OR
+#  CONSEQUENTIAL DAMAGES INCLUDING, BUT NOT LIMITED TO, DAMAGES
+#  RELATED TO LOST REVENUE, LOST PROFITS, LOSS OF INCOME, LOSS OF
+#  BUSINESS ADVANTAGE OR UNAVAILABILITY, OR LOSS OR CORRUPTION OF
+#  DATA.
+#
+# ###########################################################################
+
+"""An offline, in-process stand-in for a CML workspace
+
+Installs emulated cdsw and cmlapi modules into sys.modules, backed by a SQLite metric
+store (MetricStore) and a local HTTP model endpoint (ModelServer) serving the predict()
+function of scripts/predict.py, so that Simulation, ThreadedModelRequest and ApiUtility
+run unchanged without a CML cluster. Useful for profiling and benchmarking locally or
+in CI.
+
+The emulator must be installed before importing modules that import cdsw or cmlapi:
+
+    from src.emulator import install
+
+    emulator = install(latency=0.01)
+
+    from src.simulation import Simulation
+
+    sim = Simulation(model_name="Price Regressor")
+
+"""
+
+import os
+import sys
+import importlib.util
+
+from src.emulator import cdsw, cmlapi
+from src.emulator.metric_store import MetricStore
+from src.emulator.model_server import ModelServer, stub_predict
+
+EMULATED_MODULES = ("cdsw", "cmlapi", "cmlapi.rest")
+
+
+def load_predict_fn(model_script):
+    """Import a model script (e.g. scripts/predict.py) and return its predict() function."""
+
+    spec = importlib.util.spec_from_file_location("emulated_model", model_script)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module.predict
+
+
+class Emulator:
+    """An emulated CML project with a single deployed model
+
+    Attributes:
+        model_script (str): script whose predict() function serves the model; if None,
+            the model endpoint responds with stub predictions and tracks no metrics
+        predict_fn (callable): serves the model in place of model_script, if provided
+        latency (float): seconds of latency injected into each model request
+        metrics_path (str): SQLite database of the metric store, or ":memory:"
+        project_id (str)
+        model_name (str)
+        store (MetricStore)
+        server (ModelServer)
+        client (src.emulator.cmlapi.EmulatedClient): the client returned by
+            cmlapi.default_client()
+
+    """
+
+    def __init__(
+        self,
+        model_script="scripts/predict.py",
+        predict_fn=None,
+        latency=0.0,
+        metrics_path=":memory:",
+        project_id="emulator-project",
+        model_name="Price Regressor",
+        host="127.0.0.1",
+        port=0,
+    ):
+        self.model_script = model_script
+        self.predict_fn = predict_fn
+        self.latency = latency
+        self.metrics_path = metrics_path
+        self.project_id = os.environ.get("CDSW_PROJECT_ID", project_id)
+        self.model_name = model_name
+        self.host = host
+        self.port = port
+        self.store = None
+        self.server = None
+        self.client = None
+        self._saved_modules = {}
+        self._saved_project_id = None
+
+    def start(self):
+        deployment_crn = f"crn:emulator:ml:{self.project_id}:deployment/1"
+
+        self.store = MetricStore(self.metrics_path)
+        self.client = cmlapi.EmulatedClient(
+            self.project_id,
+            model={
+                "id": "model-1",
+                "name": self.model_name,
+                "crn": f"crn:emulator:ml:{self.project_id}:model/1",
+                "access_key": "emulator-access-key",
+            },
+            build={"id": "build-1", "created_at": "2021-12-01T00:00:00Z"},
+            deployment={"crn": deployment_crn, "created_at": "2021-12-01T00:00:00Z"},
+        )
+        cmlapi.configure(self.client)
+        cdsw.configure(self.store, None, deployment_crn)
+
+        self._saved_modules = {name: sys.modules.get(name) for name in EMULATED_MODULES}
+        sys.modules.update({"cdsw": cdsw, "cmlapi": cmlapi, "cmlapi.rest": cmlapi.rest})
+        self._saved_project_id = os.environ.get("CDSW_PROJECT_ID")
+        os.environ["CDSW_PROJECT_ID"] = self.project_id
+
+        predict_fn = self.predict_fn
+        if predict_fn is None:
+            predict_fn = (
+                load_predict_fn(self.model_script)
+                if self.model_script
+                else stub_predict
+            )
+        self.server = ModelServer(
+            predict_fn, host=self.host, port=self.port, latency=self.latency
+        ).start()
+        cdsw.configure(self.store, self.server.url, deployment_crn)
+
+        return self
+
+    def stop(self):
+        if self.server is not None:
+            self.server.stop()
+            self.server = None
+
+        for name, module in self._saved_modules.items():
+            if module is None:
+                sys.modules.pop(name, None)
+            else:
+                sys.modules[name] = module
+        self._saved_modules = {}
+
+        if self._saved_project_id is None:
+            os.environ.pop("CDSW_PROJECT_ID", None)
+        else:
+            os.environ["CDSW_PROJECT_ID"] = self._saved_project_id
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def install(**kwargs):
+    """Start an Emulator (see Emulator for arguments) and return it."""
+
+    return Emulator(**kwargs).start()
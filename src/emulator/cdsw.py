@@ -0,0 +1,124 @@
+# ###########################################################################
+#
+#  CLOUDERA APPLIED MACHINE LEARNING PROTOTYPE (AMP)
+#  (C) Cloudera, Inc. 2021
+#  All rights reserved.
+#
+#  Applicable Open Source License: Apache 2.0
+#
+#  NOTE: Cloudera open source products are modular software products
+#  made up of hundreds of individual components, each of which was
+#  individually copyrighted.  Each Cloudera open source product is a
+#  collective work under U.S. Copyright Law. Your license to use the
+#  collective work is as provided in your written agreement with
+#  Cloudera.  Used apart from the collective work, this file is
+#  licensed for your use pursuant to the open source license
+#  identified above.
+#
+#  This code is provided to you pursuant a written agreement with
+#  (i) Cloudera, Inc. or (ii) a third-party authorized to distribute
+#  this code. If you do not have a written agreement with Cloudera nor
+#  with an authorized and properly licensed third party, you do not
+#  have any rights to access nor to use this code.
+#
+#  Absent a written agreement with Cloudera, Inc. (“Cloudera”) to the
+#  contrary, A) CLOUDERA PROVIDES THIS CODE TO YOU WITHOUT WARRANTIES OF ANY
+#  KIND; (B) CLOUDERA DISCLAIMS ANY AND ALL EXPRESS AND IMPLIED
+#  WARRANTIES WITH RESPECT TO THIS CODE, INCLUDING BUT NOT LIMITED TO
+#  IMPLIED WARRANTIES OF TITLE, NON-INFRINGEMENT, MERCHANTABILITY AND
+#  FITNESS FOR A PARTICULAR PURPOSE; (C) CLOUDERA IS NOT LIABLE TO YOU,
+#  AND WILL NOT DEFEND, INDEMNIFY, NOR HOLD YOU HARMLESS FOR ANY CLAIMS
+#  ARISING FROM OR RELATED TO THE CODE; AND (D)WITH RESPECT TO YOUR EXERCISE
+#  OF ANY RIGHTS GRANTED TO YOU FOR THE CODE, CLOUDERA IS NOT LIABLE FOR ANY
+#  DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, PUNITIVE OR
+#  CONSEQUENTIAL DAMAGES INCLUDING, BUT NOT LIMITED TO, DAMAGES
+#  RELATED TO LOST REVENUE, LOST PROFITS, LOSS OF INCOME, LOSS OF
+#  BUSINESS ADVANTAGE OR UNAVAILABILITY, OR LOSS OR CORRUPTION OF
+#  DATA.
+#
+# ###########################################################################
+
+# An in-process stand-in for the cdsw module, installed as sys.modules["cdsw"] by
+# src.emulator.install(). Metrics are kept in an src.emulator.MetricStore and model
+# calls go to an src.emulator.ModelServer, both configured by configure().
+
+import time
+import uuid
+import threading
+import functools
+import requests
+
+_state = {"store": None, "model_service_url": None, "model_deployment_crn": None}
+_context = threading.local()
+
+
+def configure(store, model_service_url, model_deployment_crn):
+    _state.update(
+        store=store,
+        model_service_url=model_service_url,
+        model_deployment_crn=model_deployment_crn,
+    )
+
+
+def _now_ms():
+    return int(round(time.time() * 1000))
+
+
+def model_metrics(func):
+    """
+    Track the metrics of each call of func under a new prediction uuid, and return
+    {"uuid": ..., "prediction": <func's result>} instead of func's result.
+    """
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        prediction_uuid = str(uuid.uuid4())
+        start_ms = _now_ms()
+
+        _context.metrics = {}
+        try:
+            result = func(*args, **kwargs)
+            metrics = _context.metrics
+        finally:
+            del _context.metrics
+
+        _state["store"].track(
+            prediction_uuid,
+            _state["model_deployment_crn"],
+            start_ms,
+            _now_ms(),
+            metrics,
+        )
+
+        return {"uuid": prediction_uuid, "prediction": result}
+
+    return wrapper
+
+
+def track_metric(key, value):
+    if not hasattr(_context, "metrics"):
+        raise RuntimeError(
+            "track_metric must be called within a model_metrics function"
+        )
+    _context.metrics[key] = value
+
+
+def track_delayed_metrics(metrics, prediction_uuid):
+    _state["store"].track_delayed(prediction_uuid, metrics)
+
+
+def read_metrics(model_deployment_crn, start_timestamp_ms=None, end_timestamp_ms=None):
+    return _state["store"].read(
+        model_deployment_crn, start_timestamp_ms, end_timestamp_ms
+    )
+
+
+def call_model(model_access_key, ipt):
+    return requests.post(
+        _state["model_service_url"],
+        json={"accessKey": model_access_key, "request": ipt},
+    ).json()
+
+
+def _get_model_call_endpoint():
+    return _state["model_service_url"]
@@ -0,0 +1,212 @@
+# ###########################################################################
+#
+#  CLOUDERA APPLIED MACHINE LEARNING PROTOTYPE (AMP)
+#  (C) Cloudera, Inc. 2021
+#  All rights reserved.
+#
+#  Applicable Open Source License: Apache 2.0
+#
+#  NOTE: Cloudera open source products are modular software products
+#  made up of hundreds of individual components, each of which was
+#  individually copyrighted.  Each Cloudera open source product is a
+#  collective work under U.S. Copyright Law. Your license to use the
+#  collective work is as provided in your written agreement with
+#  Cloudera.  Used apart from the collective work, this file is
+#  licensed for your use pursuant to the open source license
+#  identified above.
+#
+#  This code is provided to you pursuant a written agreement with
+#  (i) Cloudera, Inc. or (ii) a third-party authorized to distribute
+#  this code. If you do not have a written agreement with Cloudera nor
+#  with an authorized and properly licensed third party, you do not
+#  have any rights to access nor to use this code.
+#
+#  Absent a written agreement with Cloudera, Inc. (“Cloudera”) to the
+#  contrary, A) CLOUDERA PROVIDES THIS CODE TO YOU WITHOUT WARRANTIES OF ANY
+#  KIND; (B) CLOUDERA DISCLAIMS ANY AND ALL EXPRESS AND IMPLIED
+#  WARRANTIES WITH RESPECT TO THIS CODE, INCLUDING BUT NOT LIMITED TO
+#  IMPLIED WARRANTIES OF TITLE, NON-INFRINGEMENT, MERCHANTABILITY AND
+#  FITNESS FOR A PARTICULAR PURPOSE; (C) CLOUDERA IS NOT LIABLE TO YOU,
+#  AND WILL NOT DEFEND, INDEMNIFY, NOR HOLD YOU HARMLESS FOR ANY CLAIMS
+#  ARISING FROM OR RELATED TO THE CODE; AND (D)WITH RESPECT TO YOUR EXERCISE
+#  OF ANY RIGHTS GRANTED TO YOU FOR THE CODE, CLOUDERA IS NOT LIABLE FOR ANY
+#  DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, PUNITIVE OR
+#  CONSEQUENTIAL DAMAGES INCLUDING, BUT NOT LIMITED TO, DAMAGES
+#  RELATED TO LOST REVENUE, LOST PROFITS, LOSS OF INCOME, LOSS OF
+#  BUSINESS ADVANTAGE OR UNAVAILABILITY, OR LOSS OR CORRUPTION OF
+#  DATA.
+#
+# ###########################################################################
+
+# An in-process stand-in for the cmlapi package, installed as sys.modules["cmlapi"] (and
+# sys.modules["cmlapi.rest"]) by src.emulator.install(). It holds a single project with
+# one model, build and deployment, and records the applications created in it.
+
+import json
+import types
+import itertools
+import threading
+from multiprocessing.pool import ThreadPool
+
+
+class ApiException(Exception):
+    def __init__(self, status=None, reason=None):
+        super().__init__(f"({status}) {reason}")
+        self.status = status
+        self.reason = reason
+
+
+# exposed as the cmlapi.rest submodule
+rest = types.ModuleType("cmlapi.rest")
+rest.ApiException = ApiException
+
+
+class _Response(dict):
+    """A response supporting both the .to_dict() and attribute access of cmlapi models."""
+
+    def to_dict(self):
+        return dict(self)
+
+    def __getattr__(self, name):
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError(name)
+
+
+class CreateApplicationRequest:
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+
+class EmulatedClient:
+    """Implements the subset of cmlapi.CMLServiceApi used by src.api.ApiUtility."""
+
+    _pool = None
+
+    def __init__(self, project_id, model, build, deployment):
+        self.project_id = project_id
+        self.model = model
+        self.build = build
+        self.deployment = deployment
+        self.runtimes = [
+            {
+                "image_identifier": "emulator/ml-runtime-workbench-python3.6-standard:2021.12.1-b17",
+                "full_version": "2021.12.1-b17",
+                "kernel": "Python 3.6",
+                "edition": "Standard",
+                "editor": "Workbench",
+            }
+        ]
+        self.applications = []
+        self.restarts = []
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def _respond(self, func, async_req=False):
+        if not async_req:
+            return func()
+        if EmulatedClient._pool is None:
+            EmulatedClient._pool = ThreadPool(4)
+        return EmulatedClient._pool.apply_async(func)
+
+    def _list(
+        self,
+        key,
+        items,
+        search_filter=None,
+        page_size=None,
+        page_token=None,
+        sort=None,
+        **kwargs,
+    ):
+        for field, value in json.loads(search_filter or "{}").items():
+            items = [item for item in items if str(value) in str(item.get(field))]
+        if sort:
+            field = sort.lstrip("-+")
+            items = sorted(
+                items, key=lambda item: item.get(field), reverse=sort[0] == "-"
+            )
+
+        start = int(page_token or 0)
+        end = len(items) if page_size is None else start + page_size
+        next_page_token = str(end) if end < len(items) else ""
+
+        return _Response({key: items[start:end], "next_page_token": next_page_token})
+
+    def _check_project(self, project_id):
+        if project_id != self.project_id:
+            raise ApiException(404, f"Project {project_id} not found")
+
+    def list_models(self, project_id, async_req=False, **kwargs):
+        self._check_project(project_id)
+        return self._respond(
+            lambda: self._list("models", [self.model], **kwargs), async_req
+        )
+
+    def list_model_builds(self, project_id, model_id, async_req=False, **kwargs):
+        self._check_project(project_id)
+        builds = [self.build] if model_id == self.model["id"] else []
+        return self._respond(
+            lambda: self._list("model_builds", builds, **kwargs), async_req
+        )
+
+    def list_model_deployments(
+        self, project_id, model_id, build_id, async_req=False, **kwargs
+    ):
+        self._check_project(project_id)
+        deployments = [self.deployment] if build_id == self.build["id"] else []
+        return self._respond(
+            lambda: self._list("model_deployments", deployments, **kwargs), async_req
+        )
+
+    def list_runtimes(self, async_req=False, **kwargs):
+        return self._respond(
+            lambda: self._list("runtimes", self.runtimes, **kwargs), async_req
+        )
+
+    def get_project(self, project_id, async_req=False):
+        self._check_project(project_id)
+        return self._respond(
+            lambda: _Response({"id": project_id, "default_engine_type": "ml_runtime"}),
+            async_req,
+        )
+
+    def create_application(self, project_id, body, async_req=False):
+        self._check_project(project_id)
+        with self._lock:
+            application = _Response(
+                dict(
+                    vars(body),
+                    id=f"app-{next(self._ids)}",
+                    status="APPLICATION_RUNNING",
+                )
+            )
+            self.applications.append(application)
+        return self._respond(lambda: application, async_req)
+
+    def list_applications(self, project_id, async_req=False, **kwargs):
+        self._check_project(project_id)
+        return self._respond(
+            lambda: self._list("applications", list(self.applications), **kwargs),
+            async_req,
+        )
+
+    def restart_application(self, project_id, application_id, async_req=False):
+        self._check_project(project_id)
+        if application_id not in [app["id"] for app in self.applications]:
+            raise ApiException(404, f"Application {application_id} not found")
+        self.restarts.append(application_id)
+        return self._respond(lambda: _Response({}), async_req)
+
+
+_client = None
+
+
+def configure(client):
+    global _client
+    _client = client
+
+
+def default_client():
+    return _client
@@ -0,0 +1,150 @@
+# ###########################################################################
+#
+#  CLOUDERA APPLIED MACHINE LEARNING PROTOTYPE (AMP)
+#  (C) Cloudera, Inc. 2021
+#  All rights reserved.
+#
+#  Applicable Open Source License: Apache 2.0
+#
+#  NOTE: Cloudera open source products are modular software products
+#  made up of hundreds of individual components, each of which was
+#  individually copyrighted.  Each Cloudera open source product is a
+#  collective work under U.S. Copyright Law. Your license to use the
+#  collective work is as provided in your written agreement with
+#  Cloudera.  Used apart from the collective work, this file is
+#  licensed for your use pursuant to the open source license
+#  identified above.
+#
+#  This code is provided to you pursuant a written agreement with
+#  (i) Cloudera, Inc. or (ii) a third-party authorized to distribute
+#  this code. If you do not have a written agreement with Cloudera nor
+#  with an authorized and properly licensed third party, you do not
+#  have any rights to access nor to use this code.
+#
+#  Absent a written agreement with Cloudera, Inc. (“Cloudera”) to the
+#  contrary, A) CLOUDERA PROVIDES THIS CODE TO YOU WITHOUT WARRANTIES OF ANY
+#  KIND; (B) CLOUDERA DISCLAIMS ANY AND ALL EXPRESS AND IMPLIED
+#  WARRANTIES WITH RESPECT TO THIS CODE, INCLUDING BUT NOT LIMITED TO
+#  IMPLIED WARRANTIES OF TITLE, NON-INFRINGEMENT, MERCHANTABILITY AND
+#  FITNESS FOR A PARTICULAR PURPOSE; (C) CLOUDERA IS NOT LIABLE TO YOU,
+#  AND WILL NOT DEFEND, INDEMNIFY, NOR HOLD YOU HARMLESS FOR ANY CLAIMS
+#  ARISING FROM OR RELATED TO THE CODE; AND (D)WITH RESPECT TO YOUR EXERCISE
+#  OF ANY RIGHTS GRANTED TO YOU FOR THE CODE, CLOUDERA IS NOT LIABLE FOR ANY
+#  DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, PUNITIVE OR
+#  CONSEQUENTIAL DAMAGES INCLUDING, BUT NOT LIMITED TO, DAMAGES
+#  RELATED TO LOST REVENUE, LOST PROFITS, LOSS OF INCOME, LOSS OF
+#  BUSINESS ADVANTAGE OR UNAVAILABILITY, OR LOSS OR CORRUPTION OF
+#  DATA.
+#
+# ###########################################################################
+
+import os
+import json
+import sqlite3
+import threading
+
+
+class MetricStore:
+    """A SQLite-backed stand-in for the CML model metrics store
+
+    Holds one row per prediction: its uuid, deployment CRN, the start/end timestamps of
+    the tracked call and a JSON object of its metrics. Metrics tracked later with
+    track_delayed() are merged into that object, as cdsw.track_delayed_metrics() does.
+    read() returns records in the same shape as cdsw.read_metrics().
+
+    Attributes:
+        path (str): location of the SQLite database file, or ":memory:"
+
+    """
+
+    def __init__(self, path=":memory:"):
+        self.path = path
+        if path != ":memory:" and os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        if path != ":memory:":
+            self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS predictions (
+                prediction_uuid TEXT PRIMARY KEY,
+                model_deployment_crn TEXT,
+                start_timestamp_ms INTEGER,
+                end_timestamp_ms INTEGER,
+                metrics TEXT
+            );
+            CREATE INDEX IF NOT EXISTS idx_predictions_crn_start
+                ON predictions (model_deployment_crn, start_timestamp_ms);
+            """)
+
+    def track(self, prediction_uuid, model_deployment_crn, start_ms, end_ms, metrics):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO predictions VALUES (?, ?, ?, ?, ?)",
+                (
+                    prediction_uuid,
+                    model_deployment_crn,
+                    start_ms,
+                    end_ms,
+                    json.dumps(metrics),
+                ),
+            )
+
+    def track_delayed(self, prediction_uuid, metrics):
+        """Merge metrics into those of an existing prediction."""
+
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT metrics FROM predictions WHERE prediction_uuid = ?",
+                (prediction_uuid,),
+            ).fetchone()
+            if row is None:
+                raise ValueError(f"Unknown prediction uuid: {prediction_uuid}")
+
+            self._conn.execute(
+                "UPDATE predictions SET metrics = ? WHERE prediction_uuid = ?",
+                (json.dumps(dict(json.loads(row[0]), **metrics)), prediction_uuid),
+            )
+
+    def read(
+        self, model_deployment_crn, start_timestamp_ms=None, end_timestamp_ms=None
+    ):
+        """Predictions of a deployment tracked within [start_timestamp_ms, end_timestamp_ms]."""
+
+        query = (
+            "SELECT prediction_uuid, model_deployment_crn, start_timestamp_ms, "
+            "end_timestamp_ms, metrics FROM predictions WHERE model_deployment_crn = ?"
+        )
+        params = [model_deployment_crn]
+        if start_timestamp_ms is not None:
+            query += " AND start_timestamp_ms >= ?"
+            params.append(start_timestamp_ms)
+        if end_timestamp_ms is not None:
+            query += " AND start_timestamp_ms <= ?"
+            params.append(end_timestamp_ms)
+
+        with self._lock:
+            rows = self._conn.execute(
+                query + " ORDER BY start_timestamp_ms", params
+            ).fetchall()
+
+        return {
+            "metrics": [
+                {
+                    "modelDeploymentCrn": crn,
+                    "predictionUuid": prediction_uuid,
+                    "startTimestampMs": start_ms,
+                    "endTimestampMs": end_ms,
+                    "metrics": json.loads(metrics),
+                }
+                for prediction_uuid, crn, start_ms, end_ms, metrics in rows
+            ]
+        }
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM predictions").fetchone()[0]
+
+    def close(self):
+        self._conn.close()
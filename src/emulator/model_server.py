@@ -0,0 +1,155 @@
+# ###########################################################################
+#
+#  CLOUDERA APPLIED MACHINE LEARNING PROTOTYPE (AMP)
+#  (C) Cloudera, Inc. 2021
+#  All rights reserved.
+#
+#  Applicable Open Source License: Apache 2.0
+#
+#  NOTE: Cloudera open source products are modular software products
+#  made up of hundreds of individual components, each of which was
+#  individually copyrighted.  Each Cloudera open source product is a
+#  collective work under U.S. Copyright Law. Your license to use the
+#  collective work is as provided in your written agreement with
+#  Cloudera.  Used apart from the collective work, this file is
+#  licensed for your use pursuant to the open source license
+#  identified above.
+#
+#  This code is provided to you pursuant a written agreement with
+#  (i) Cloudera, Inc. or (ii) a third-party authorized to distribute
+#  this code. If you do not have a written agreement with Cloudera nor
+#  with an authorized and properly licensed third party, you do not
+#  have any rights to access nor to use this code.
+#
+#  Absent a written agreement with Cloudera, Inc. (“Cloudera”) to the
+#  contrary, A) CLOUDERA PROVIDES THIS CODE TO YOU WITHOUT WARRANTIES OF ANY
+#  KIND; (B) CLOUDERA DISCLAIMS ANY AND ALL EXPRESS AND IMPLIED
+#  WARRANTIES WITH RESPECT TO THIS CODE, INCLUDING BUT NOT LIMITED TO
+#  IMPLIED WARRANTIES OF TITLE, NON-INFRINGEMENT, MERCHANTABILITY AND
+#  FITNESS FOR A PARTICULAR PURPOSE; (C) CLOUDERA IS NOT LIABLE TO YOU,
+#  AND WILL NOT DEFEND, INDEMNIFY, NOR HOLD YOU HARMLESS FOR ANY CLAIMS
+#  ARISING FROM OR RELATED TO THE CODE; AND (D)WITH RESPECT TO YOUR EXERCISE
+#  OF ANY RIGHTS GRANTED TO YOU FOR THE CODE, CLOUDERA IS NOT LIABLE FOR ANY
+#  DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, PUNITIVE OR
+#  CONSEQUENTIAL DAMAGES INCLUDING, BUT NOT LIMITED TO, DAMAGES
+#  RELATED TO LOST REVENUE, LOST PROFITS, LOSS OF INCOME, LOSS OF
+#  BUSINESS ADVANTAGE OR UNAVAILABILITY, OR LOSS OR CORRUPTION OF
+#  DATA.
+#
+# ###########################################################################
+
+import json
+import time
+import uuid
+import threading
+from socketserver import ThreadingMixIn
+from http.server import HTTPServer, BaseHTTPRequestHandler
+
+
+class _ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+def stub_predict(request):
+    """Respond to a model request with fresh prediction UUIDs and a prediction of 0, without a model."""
+
+    if "records" in request:
+        return {
+            "predictions": [
+                {"id": record["id"], "uuid": str(uuid.uuid4()), "prediction": 0}
+                for record in request["records"]
+            ]
+        }
+
+    return {"uuid": str(uuid.uuid4()), "prediction": 0}
+
+
+class ModelServer:
+    """A local stand-in for a deployed model endpoint
+
+    Accepts the same JSON payloads as a CML model endpoint (single "record" or
+    batched "records" requests), passes the request to predict_fn and responds with
+    its result, optionally after an injected delay. With the default predict_fn
+    (stub_predict) no model is needed, which is useful for benchmarking the inference
+    engines in src.inference in isolation; the emulator (src.emulator.install) serves
+    the predict() function of scripts/predict.py instead.
+
+    Usage:
+
+        with ModelServer(latency=0.05) as server:
+            tmr = ThreadedModelRequest(details, model_service_url=server.url)
+
+    Attributes:
+        predict_fn (callable): called with each request's "request" payload
+        host (str)
+        port (int): port to bind; 0 selects a free port
+        latency (float): seconds to sleep before responding to each request
+
+    """
+
+    def __init__(self, predict_fn=stub_predict, host="127.0.0.1", port=0, latency=0.0):
+        self.predict_fn = predict_fn
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self._server = None
+        self._thread = None
+
+    @property
+    def url(self):
+        return f"http://{self.host}:{self.port}/model"
+
+    def _make_handler(self):
+        predict_fn = self.predict_fn
+        latency = self.latency
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                request = json.loads(self.rfile.read(length))["request"]
+
+                if latency:
+                    time.sleep(latency)
+
+                try:
+                    body = {"success": True, "response": predict_fn(request)}
+                    status = 200
+                except Exception as e:
+                    body = {"success": False, "errors": [repr(e)]}
+                    status = 500
+
+                body = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        self._server = _ThreadingHTTPServer(
+            (self.host, self.port), self._make_handler()
+        )
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
@@ -38,12 +38,97 @@
 #
 # ###########################################################################
 
+import os
 import time
 import cdsw
 import json
+import random
+import asyncio
+import aiohttp
 import requests
 import concurrent
 import threading
+from functools import partial
+
+# Failures worth retrying: connection problems, timeouts, rate limiting (429) and server
+# errors (5xx), raised as HTTP errors, and non-JSON responses (ValueError). Other 4xx
+# responses, and successful responses without the expected body (KeyError), are the
+# model rejecting the input, which a retry will not change, so they fail immediately.
+RETRYABLE_ERRORS = (requests.RequestException, ValueError)
+ASYNC_RETRYABLE_ERRORS = (aiohttp.ClientError, asyncio.TimeoutError, ValueError)
+
+
+class RejectedRequestError(Exception):
+    """The model endpoint rejected a request with a non-retryable 4xx status."""
+
+
+def is_retryable_status(status):
+    """Whether an HTTP error status is transient: rate limiting (429) or a server error."""
+    return status == 429 or status >= 500
+
+
+def backoff_delay(attempt, backoff_factor, backoff_max):
+    """Exponential backoff with full jitter for the given zero-indexed retry attempt."""
+    return random.uniform(0, min(backoff_max, backoff_factor * 2**attempt))
+
+
+def chunk_records(records, batch_size):
+    """Split records into consecutive lists of at most batch_size records."""
+    return [records[i : i + batch_size] for i in range(0, len(records), batch_size)]
+
+
+class IdUuidCheckpoint:
+    """An append-only, on-disk record of completed id/uuid pairs
+
+    Pairs are stored as JSON lines as soon as each API call completes, so that a rerun
+    after a failure can skip records that were already scored.
+
+    Attributes:
+        path (str): location of the checkpoint file
+        mapping (dict): all id/uuid pairs recorded so far
+
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.mapping = {}
+        self._lock = threading.Lock()
+
+        if os.path.exists(path):
+            with open(path) as f:
+                for line in f:
+                    if line.strip():
+                        id_, uuid = json.loads(line)
+                        self.mapping[id_] = uuid
+        elif os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    def __contains__(self, id_):
+        return id_ in self.mapping
+
+    def __len__(self):
+        return len(self.mapping)
+
+    def get(self, id_):
+        return self.mapping.get(id_)
+
+    def add(self, pairs):
+        with self._lock:
+            with open(self.path, "a") as f:
+                for id_, uuid, *_ in pairs:
+                    f.write(json.dumps([id_, uuid]) + "\n")
+                    self.mapping[id_] = uuid
+
+    def split(self, records):
+        """
+        Separate records already present in the checkpoint from those still to be
+        scored. Returns the (id, uuid) pairs of the former and the list of the latter.
+        """
+
+        resumed = [(r["id"], self.mapping[r["id"]]) for r in records if r["id"] in self]
+        remaining = [r for r in records if r["id"] not in self]
+
+        return resumed, remaining
 
 
 class ThreadedModelRequest:
@@ -54,16 +139,44 @@ class ThreadedModelRequest:
 
     Attributes:
         n_threads (int)
+        batch_size (int): number of records sent per API call; values greater than 1
+            use the deployed model's batch entry point
         deployment_details (dict): config info about deployed model
         model_service_url (str): deployed models API endpoint URL
         thread_local (_thread._local): A class that represents thread-local data
+        limiter (src.concurrency.AIMDLimiter): optional adaptive limit on in-flight
+            requests; when set, up to limiter.max_limit threads are started and the
+            limiter decides how many of them may call the model at once
+        max_retries (int): number of retries for a failed API call before its records
+            are reported as failed
+        backoff_factor (float): base delay in seconds for exponential backoff
+        backoff_max (float): maximum delay in seconds between retries
+        timeout (float): timeout in seconds for connecting to the endpoint and for each
+            read of its response, so a hung replica can't block a thread indefinitely
 
     """
 
-    def __init__(self, deployment_details, n_threads=2):
+    def __init__(
+        self,
+        deployment_details,
+        n_threads=2,
+        batch_size=1,
+        model_service_url=None,
+        limiter=None,
+        max_retries=3,
+        backoff_factor=0.5,
+        backoff_max=30,
+        timeout=30,
+    ):
         self.n_threads = n_threads
+        self.batch_size = batch_size
+        self.timeout = timeout
+        self.limiter = limiter
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.backoff_max = backoff_max
         self.deployment_details = deployment_details
-        self.model_service_url = cdsw._get_model_call_endpoint()
+        self.model_service_url = model_service_url or cdsw._get_model_call_endpoint()
         self.thread_local = threading.local()
 
     def get_session(self):
@@ -71,6 +184,29 @@ class ThreadedModelRequest:
             self.thread_local.session = requests.Session()
         return self.thread_local.session
 
+    def _post(self, headers, data):
+        """
+        Post a payload to the model endpoint and return its decoded JSON response.
+        Transient HTTP errors (see is_retryable_status()) raise requests.HTTPError, and
+        other error statuses raise RejectedRequestError.
+        """
+
+        session = self.get_session()
+        response = session.post(
+            url=self.model_service_url,
+            headers=headers,
+            data=json.dumps(data),
+            timeout=self.timeout,
+        )
+        if response.status_code >= 400:
+            if is_retryable_status(response.status_code):
+                response.raise_for_status()
+            raise RejectedRequestError(
+                f"Model endpoint responded with status {response.status_code}"
+            )
+
+        return response.json()
+
     def call_model(self, record):
         """'
         Use a self created payload object and the requests library to call the
@@ -89,14 +225,37 @@ class ThreadedModelRequest:
             "request": {"record": record},
         }
 
-        session = self.get_session()
-        response = session.post(
-            url=self.model_service_url,
-            headers=headers,
-            data=json.dumps(data),
-        ).json()
+        response = self._post(headers, data)
+
+        return (
+            record["id"],
+            response["response"]["uuid"],
+            response["response"]["prediction"],
+        )
+
+    def call_model_batch(self, records):
+        """
+        Call the deployed model with a batch of records in a single request.
+
+        The model scores the batch in one pass but tracks each record individually,
+        so a list of (id, uuid, prediction) triples is returned in input order.
+
+        """
+
+        headers = {
+            "Content-Type": "application/json",
+        }
+        data = {
+            "accessKey": self.deployment_details["model_access_key"],
+            "request": {"records": records},
+        }
 
-        return record["id"], response["response"]["uuid"]
+        response = self._post(headers, data)
+
+        return [
+            (prediction["id"], prediction["uuid"], prediction["prediction"])
+            for prediction in response["response"]["predictions"]
+        ]
 
     def call_model_cdsw(self, record):
         """
@@ -108,29 +267,279 @@ class ThreadedModelRequest:
             ipt={"record": record},
         )
 
-        return record["id"], response["response"]["uuid"]
+        return (
+            record["id"],
+            response["response"]["uuid"],
+            response["response"]["prediction"],
+        )
+
+    def limited_call(self, func, payload):
+        """
+        Invoke one of the call_model methods under the instance's limiter (if any),
+        reporting the call's latency and outcome back to it.
+
+        """
+
+        if self.limiter is None:
+            return func(payload)
+
+        self.limiter.acquire()
+        start = time.perf_counter()
+        error = False
+        try:
+            return func(payload)
+        except Exception:
+            error = True
+            raise
+        finally:
+            self.limiter.release(time.perf_counter() - start, error=error)
 
-    def threaded_call(self, records):
+    def score_chunk(self, records, batch=False, checkpoint=None):
+        """
+        Score a chunk of records with a single API call (one record unless batch is
+        True), retrying transient failures with exponential backoff and jitter.
+
+        Returns:
+            tuple: list of (id, uuid, prediction) triples and list of records that
+                could not be scored
+
+        """
+
+        for attempt in range(self.max_retries + 1):
+            try:
+                if batch:
+                    scored = self.limited_call(self.call_model_batch, records)
+                else:
+                    scored = [self.limited_call(self.call_model, records[0])]
+                break
+            except (RejectedRequestError, KeyError):
+                return [], records
+            except RETRYABLE_ERRORS:
+                if attempt == self.max_retries:
+                    return [], records
+                time.sleep(
+                    backoff_delay(attempt, self.backoff_factor, self.backoff_max)
+                )
+
+        if checkpoint is not None:
+            checkpoint.add(scored)
+
+        return scored, []
+
+    def threaded_call(self, records, batch_size=None, checkpoint=None):
         """
         Utilize the call_model() method to make API calls to the deployed model
         for a batch of input records using multithreading for efficiency.
 
+        If batch_size is greater than 1 (defaults to the instance's batch_size),
+        records are chunked and sent with call_model_batch() instead, so each
+        API call scores many records at once.
+
+        Failed calls are retried; records that still cannot be scored are returned
+        under "failed_records" rather than aborting the batch. If a checkpoint
+        (IdUuidCheckpoint) is provided, records it already holds are not re-scored
+        and newly completed pairs are appended to it.
+
+        The predictions of newly scored records are returned under
+        "id_prediction_mapping" (records resumed from a checkpoint have none).
+
+        """
+
+        batch_size = batch_size or self.batch_size
+        max_workers = self.n_threads if self.limiter is None else self.limiter.max_limit
+
+        start_timestamp_ms = int(round(time.time() * 1000))
+
+        resumed = []
+        if checkpoint is not None:
+            resumed, records = checkpoint.split(records)
+
+        score = partial(self.score_chunk, batch=batch_size > 1, checkpoint=checkpoint)
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+            completed = list(executor.map(score, chunk_records(records, batch_size)))
+
+        scored = [triple for triples, _ in completed for triple in triples]
+
+        end_timestamp_ms = int(round(time.time() * 1000))
+
+        return {
+            "start_timestamp_ms": start_timestamp_ms,
+            "end_timestamp_ms": end_timestamp_ms,
+            "id_uuid_mapping": dict(resumed + [(id_, uuid) for id_, uuid, _ in scored]),
+            "id_prediction_mapping": {id_: pred for id_, _, pred in scored},
+            "failed_records": [record for _, failed in completed for record in failed],
+        }
+
+
+class AsyncModelRequest:
+    """An asyncio-based alternative to ThreadedModelRequest
+
+    Rather than a small pool of threads each holding a blocking session, a single
+    event loop drives many in-flight requests over a pooled, keep-alive aiohttp
+    connector. The number of concurrent requests is bounded by a semaphore and each
+    request is subject to a timeout.
+
+    Exposes the same threaded_call() contract as ThreadedModelRequest so the two
+    engines are interchangeable.
+
+    Attributes:
+        concurrency (int): maximum number of in-flight requests
+        batch_size (int): number of records sent per API call
+        timeout (float): total timeout in seconds for each request
+        keepalive_timeout (float): seconds to keep idle pooled connections open
+        deployment_details (dict): config info about deployed model
+        model_service_url (str): deployed models API endpoint URL
+        max_retries (int): number of retries for a failed API call
+        backoff_factor (float): base delay in seconds for exponential backoff
+        backoff_max (float): maximum delay in seconds between retries
+
+    """
+
+    def __init__(
+        self,
+        deployment_details,
+        concurrency=64,
+        batch_size=1,
+        timeout=30,
+        keepalive_timeout=30,
+        model_service_url=None,
+        max_retries=3,
+        backoff_factor=0.5,
+        backoff_max=30,
+    ):
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.backoff_max = backoff_max
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        self.timeout = timeout
+        self.keepalive_timeout = keepalive_timeout
+        self.deployment_details = deployment_details
+        self.model_service_url = model_service_url or cdsw._get_model_call_endpoint()
+
+    async def _post(self, session, semaphore, request):
+        data = {
+            "accessKey": self.deployment_details["model_access_key"],
+            "request": request,
+        }
+
+        async with semaphore:
+            async with session.post(
+                self.model_service_url,
+                data=json.dumps(data),
+                headers={"Content-Type": "application/json"},
+            ) as response:
+                if response.status >= 400:
+                    if is_retryable_status(response.status):
+                        response.raise_for_status()
+                    raise RejectedRequestError(
+                        f"Model endpoint responded with status {response.status}"
+                    )
+                return await response.json(content_type=None)
+
+    async def call_model(self, session, semaphore, record):
+        """Call the deployed model with a single record."""
+
+        response = await self._post(session, semaphore, {"record": record})
+
+        return [
+            (
+                record["id"],
+                response["response"]["uuid"],
+                response["response"]["prediction"],
+            )
+        ]
+
+    async def call_model_batch(self, session, semaphore, records):
+        """Call the deployed model's batch entry point with a list of records."""
+
+        response = await self._post(session, semaphore, {"records": records})
+
+        return [
+            (prediction["id"], prediction["uuid"], prediction["prediction"])
+            for prediction in response["response"]["predictions"]
+        ]
+
+    async def score_chunk(self, session, semaphore, records, batch, checkpoint):
+        """
+        Score a chunk of records with a single API call, retrying transient failures
+        with exponential backoff and jitter. Returns (scored, failed_records), where
+        scored is a list of (id, uuid, prediction) triples.
+        """
+
+        for attempt in range(self.max_retries + 1):
+            try:
+                if batch:
+                    scored = await self.call_model_batch(session, semaphore, records)
+                else:
+                    scored = await self.call_model(session, semaphore, records[0])
+                break
+            except (RejectedRequestError, KeyError):
+                return [], records
+            except ASYNC_RETRYABLE_ERRORS:
+                if attempt == self.max_retries:
+                    return [], records
+                await asyncio.sleep(
+                    backoff_delay(attempt, self.backoff_factor, self.backoff_max)
+                )
+
+        if checkpoint is not None:
+            checkpoint.add(scored)
+
+        return scored, []
+
+    async def _gather(self, records, batch_size, checkpoint):
+        semaphore = asyncio.Semaphore(self.concurrency)
+        connector = aiohttp.TCPConnector(
+            limit=self.concurrency, keepalive_timeout=self.keepalive_timeout
+        )
+        timeout = aiohttp.ClientTimeout(total=self.timeout)
+
+        async with aiohttp.ClientSession(
+            connector=connector, timeout=timeout
+        ) as session:
+            tasks = [
+                self.score_chunk(session, semaphore, chunk, batch_size > 1, checkpoint)
+                for chunk in chunk_records(records, batch_size)
+            ]
+
+            return await asyncio.gather(*tasks)
+
+    def threaded_call(self, records, batch_size=None, checkpoint=None):
+        """
+        Make API calls to the deployed model for a batch of input records using
+        an event loop for concurrency.
+
+        Named for parity with ThreadedModelRequest.threaded_call(); returns the
+        same start/end timestamps, id-uuid and id-prediction mappings and failed
+        records, and accepts the same optional checkpoint.
+
         """
 
+        batch_size = batch_size or self.batch_size
+
         start_timestamp_ms = int(round(time.time() * 1000))
 
-        results = []
-        with concurrent.futures.ThreadPoolExecutor(
-            max_workers=self.n_threads
-        ) as executor:
-            completed = executor.map(self.call_model, records)
+        resumed = []
+        if checkpoint is not None:
+            resumed, records = checkpoint.split(records)
+
+        loop = asyncio.new_event_loop()
+        try:
+            completed = loop.run_until_complete(
+                self._gather(records, batch_size, checkpoint)
+            )
+        finally:
+            loop.close()
 
-        results.extend(completed)
+        scored = [triple for triples, _ in completed for triple in triples]
 
         end_timestamp_ms = int(round(time.time() * 1000))
 
         return {
             "start_timestamp_ms": start_timestamp_ms,
             "end_timestamp_ms": end_timestamp_ms,
-            "id_uuid_mapping": dict(results),
+            "id_uuid_mapping": dict(resumed + [(id_, uuid) for id_, uuid, _ in scored]),
+            "id_prediction_mapping": {id_: pred for id_, _, pred in scored},
+            "failed_records": [record for _, failed in completed for record in failed],
         }
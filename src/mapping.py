@@ -0,0 +1,265 @@
+# ###########################################################################
+#
+#  CLOUDERA APPLIED MACHINE LEARNING PROTOTYPE (AMP)
+#  (C) Cloudera, Inc. 2021
+#  All rights reserved.
+#
+#  Applicable Open Source License: Apache 2.0
+#
+#  NOTE: Cloudera open source products are modular software products
+#  made up of hundreds of individual components, each of which was
+#  individually copyrighted.  Each Cloudera open source product is a
+#  collective work under U.S. Copyright Law. Your license to use the
+#  collective work is as provided in your written agreement with
+#  Cloudera.  Used apart from the collective work, this file is
+#  licensed for your use pursuant to the open source license
+#  identified above.
+#
+#  This code is provided to you pursuant a written agreement with
+#  (i) Cloudera, Inc. or (ii) a third-party authorized to distribute
+#  this code. If you do not have a written agreement with Cloudera nor
+#  with an authorized and properly licensed third party, you do not
+#  have any rights to access nor to use this code.
+#
+#  Absent a written agreement with Cloudera, Inc. (“Cloudera”) to the
+#  contrary, A) CLOUDERA PROVIDES THIS CODE TO YOU WITHOUT WARRANTIES OF ANY
+#  KIND; (B) CLOUDERA DISCLAIMS ANY AND ALL EXPRESS AND IMPLIED
+#  WARRANTIES WITH RESPECT TO THIS CODE, INCLUDING BUT NOT LIMITED TO
+#  IMPLIED WARRANTIES OF TITLE, NON-INFRINGEMENT, MERCHANTABILITY AND
+#  FITNESS FOR A PARTICULAR PURPOSE; (C) CLOUDERA IS NOT LIABLE TO YOU,
+#  AND WILL NOT DEFEND, INDEMNIFY, NOR HOLD YOU HARMLESS FOR ANY CLAIMS
+#  ARISING FROM OR RELATED TO THE CODE; AND (D)WITH RESPECT TO YOUR EXERCISE
+#  OF ANY RIGHTS GRANTED TO YOU FOR THE CODE, CLOUDERA IS NOT LIABLE FOR ANY
+#  DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, PUNITIVE OR
+#  CONSEQUENTIAL DAMAGES INCLUDING, BUT NOT LIMITED TO, DAMAGES
+#  RELATED TO LOST REVENUE, LOST PROFITS, LOSS OF INCOME, LOSS OF
+#  BUSINESS ADVANTAGE OR UNAVAILABILITY, OR LOSS OR CORRUPTION OF
+#  DATA.
+#
+# ###########################################################################
+
+import os
+import threading
+import numpy as np
+
+_HEX_DIGITS = np.frombuffer(b"0123456789abcdef", dtype=np.uint8)
+_HEX_VALUES = np.full(256, 255, dtype=np.uint8)
+_HEX_VALUES[_HEX_DIGITS] = np.arange(16, dtype=np.uint8)
+_HEX_VALUES[np.frombuffer(b"ABCDEF", dtype=np.uint8)] = np.arange(
+    10, 16, dtype=np.uint8
+)
+
+# character positions of the hex digits and dashes in a canonical 36 character UUID
+_DASH_POSITIONS = [8, 13, 18, 23]
+_HEX_POSITIONS = [i for i in range(36) if i not in _DASH_POSITIONS]
+
+
+def encode_uuids(uuids):
+    """Vectorized conversion of canonical UUID strings to an array of 16-byte values.
+
+    Hex digits are accepted in either case; the case is not kept.
+    """
+
+    chars = np.array(uuids, dtype="S36").view(np.uint8).reshape(-1, 36)
+    if (chars[:, _DASH_POSITIONS] != ord("-")).any():
+        raise ValueError("UUIDs must be in canonical 8-4-4-4-12 hex form")
+
+    nibbles = _HEX_VALUES[chars[:, _HEX_POSITIONS]]
+    if (nibbles == 255).any():
+        raise ValueError("UUIDs must be in canonical 8-4-4-4-12 hex form")
+
+    return ((nibbles[:, ::2] << 4) | nibbles[:, 1::2]).copy().view("S16").ravel()
+
+
+def decode_uuids(values):
+    """Vectorized conversion of an array of 16-byte values to canonical UUID strings.
+
+    UUIDs are always decoded in lowercase, the form CML issues them in.
+    """
+
+    raw = np.asarray(values, dtype="S16").view(np.uint8).reshape(-1, 16)
+
+    chars = np.full((len(raw), 36), ord("-"), dtype=np.uint8)
+    chars[:, _HEX_POSITIONS[::2]] = _HEX_DIGITS[raw >> 4]
+    chars[:, _HEX_POSITIONS[1::2]] = _HEX_DIGITS[raw & 0x0F]
+
+    return chars.view("S36").ravel().astype(str)
+
+
+class IdUuidMapping:
+    """A compact, indexed lookup between input record IDs and prediction UUIDs
+
+    Entries are held in immutable segments, each a sorted int64 array of IDs with a
+    parallel array of UUIDs as 16-byte binary values (~24 bytes per entry, versus 150+
+    for a dict of int to str). A whole column of IDs is resolved with one vectorized
+    binary search per segment, newest first, and IDs without a known UUID resolve to NaN
+    instead of raising a KeyError.
+
+    Each update() adds a segment sorted on its own, so its cost depends only on the size
+    of the update. In-memory segments are merged geometrically (a segment is merged into
+    the one before it once it is at least half that one's size), each merge a linear
+    searchsorted merge of two sorted runs, so there are O(log N) of them and each entry
+    is merged O(log N) times overall.
+
+    If a spill_path is provided, once the in-memory segments reach spill_threshold
+    entries they are merged and written to disk as a new segment, which is memory-mapped
+    from there and never read back into memory or rewritten; resident memory therefore
+    stays bounded for long-running simulations, at the cost of one binary search per
+    spilled segment in lookups.
+
+    UUIDs are stored as their 128-bit values, so they are returned in the lowercase
+    canonical form that CML issues; uppercase input is returned lowercased.
+
+    Supports the subset of the dict interface used by the simulation (update, len, in,
+    and item access).
+
+    Attributes:
+        spill_path (str): optional directory for the memory-mapped segments
+        spill_threshold (int): number of in-memory entries at which to spill to disk
+
+    """
+
+    def __init__(self, mapping=None, spill_path=None, spill_threshold=1_000_000):
+        self.spill_path = spill_path
+        self.spill_threshold = spill_threshold
+        self._segments = []
+        self._spilled = []
+        self._len = 0
+        self._lock = threading.Lock()
+        if mapping:
+            self.update(mapping)
+
+    def update(self, mapping):
+        """Bulk add or overwrite id-uuid pairs from a dict (e.g. threaded_call output)."""
+
+        if not mapping:
+            return
+
+        ids = np.fromiter(mapping.keys(), dtype=np.int64, count=len(mapping))
+        uuids = encode_uuids(list(mapping.values()))
+
+        # dict keys are unique, so a stable sort is all the new segment needs
+        order = np.argsort(ids, kind="mergesort")
+        segment = (ids[order], uuids[order])
+
+        with self._lock:
+            self._len += int((self._find(segment[0]) < 0).sum())
+            self._segments.append(segment)
+
+            while len(self._segments) > 1 and 2 * len(self._segments[-1][0]) >= len(
+                self._segments[-2][0]
+            ):
+                newer = self._segments.pop()
+                self._segments[-1] = self._merge(self._segments[-1], newer)
+
+            in_memory = sum(len(segment_ids) for segment_ids, _ in self._segments)
+            if self.spill_path is not None and in_memory >= self.spill_threshold:
+                self._spill()
+
+    def lookup(self, ids):
+        """
+        Resolve an array-like of IDs to UUIDs in one vectorized join.
+
+        Returns:
+            np.ndarray: object array of UUIDs aligned with ids, NaN where an ID is unknown
+
+        """
+
+        ids = np.asarray(ids, dtype=np.int64)
+        result = np.full(len(ids), np.nan, dtype=object)
+
+        with self._lock:
+            segments = self._spilled + self._segments
+            unresolved = np.arange(len(ids))
+
+            for segment_ids, segment_uuids in reversed(segments):
+                if not len(unresolved):
+                    break
+                if not len(segment_ids):
+                    continue
+
+                targets = ids[unresolved]
+                positions = np.searchsorted(segment_ids, targets).clip(
+                    max=len(segment_ids) - 1
+                )
+                found = np.asarray(segment_ids[positions]) == targets
+                result[unresolved[found]] = decode_uuids(
+                    segment_uuids[positions[found]]
+                )
+                unresolved = unresolved[~found]
+
+        return result
+
+    def __getitem__(self, id_):
+        uuid = self.lookup([id_])[0]
+        if not isinstance(uuid, str):
+            raise KeyError(id_)
+        return uuid
+
+    def __contains__(self, id_):
+        return isinstance(self.lookup([id_])[0], str)
+
+    def __len__(self):
+        return self._len
+
+    def _find(self, ids):
+        """Index of the newest segment holding each of a sorted array of ids, or -1."""
+
+        segments = self._spilled + self._segments
+        where = np.full(len(ids), -1)
+
+        for i in reversed(range(len(segments))):
+            segment_ids = segments[i][0]
+            unresolved = np.flatnonzero(where < 0)
+            if not len(unresolved) or not len(segment_ids):
+                continue
+            positions = np.searchsorted(segment_ids, ids[unresolved]).clip(
+                max=len(segment_ids) - 1
+            )
+            found = np.asarray(segment_ids[positions]) == ids[unresolved]
+            where[unresolved[found]] = i
+
+        return where
+
+    @staticmethod
+    def _merge(older, newer):
+        """Merge two sorted segments in linear time, newer entries replacing older ones."""
+
+        old_ids, old_uuids = older
+        new_ids, new_uuids = newer
+
+        if len(old_ids):
+            positions = np.searchsorted(old_ids, new_ids).clip(max=len(old_ids) - 1)
+            replaced = positions[old_ids[positions] == new_ids]
+            keep = np.ones(len(old_ids), dtype=bool)
+            keep[replaced] = False
+            old_ids, old_uuids = old_ids[keep], old_uuids[keep]
+
+        positions = np.searchsorted(old_ids, new_ids)
+        return (
+            np.insert(old_ids, positions, new_ids),
+            np.insert(old_uuids, positions, new_uuids),
+        )
+
+    def _spill(self):
+        segment_ids, segment_uuids = self._segments[0]
+        for newer in self._segments[1:]:
+            segment_ids, segment_uuids = self._merge(
+                (segment_ids, segment_uuids), newer
+            )
+
+        os.makedirs(self.spill_path, exist_ok=True)
+
+        spilled = []
+        for name, array in (("ids", segment_ids), ("uuids", segment_uuids)):
+            path = os.path.join(
+                self.spill_path, f"segment-{len(self._spilled):05d}.{name}.npy"
+            )
+            tmp_path = os.path.join(self.spill_path, f".{os.path.basename(path)}.tmp")
+            with open(tmp_path, "wb") as f:
+                np.save(f, array)
+            os.replace(tmp_path, path)
+            spilled.append(np.load(path, mmap_mode="r"))
+
+        self._spilled.append(tuple(spilled))
+        self._segments = []
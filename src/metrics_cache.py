@@ -0,0 +1,182 @@
+# ###########################################################################
+#
+#  CLOUDERA APPLIED MACHINE LEARNING PROTOTYPE (AMP)
+#  (C) Cloudera, Inc. 2021
+#  All rights reserved.
+#
+#  Applicable Open Source License: Apache 2.0
+#
+#  NOTE: Cloudera open source products are modular software products
+#  made up of hundreds of individual components, each of which was
+#  individually copyrighted.  Each Cloudera open source product is a
+#  collective work under U.S. Copyright Law. Your license to use the
+#  collective work is as provided in your written agreement with
+#  Cloudera.  Used apart from the collective work, this file is
+#  licensed for your use pursuant to the open source license
+#  identified above.
+#
+#  This code is provided to you pursuant a written agreement with
+#  (i) Cloudera, Inc. or (ii) a third-party authorized to distribute
+#  this code. If you do not have a written agreement with Cloudera nor
+#  with an authorized and properly licensed third party, you do not
+#  have any rights to access nor to use this code.
+#
+#  Absent a written agreement with Cloudera, Inc. (“Cloudera”) to the
+#  contrary, A) CLOUDERA PROVIDES THIS CODE TO YOU WITHOUT WARRANTIES OF ANY
+#  KIND; (B) CLOUDERA DISCLAIMS ANY AND ALL EXPRESS AND IMPLIED
+#  WARRANTIES WITH RESPECT TO THIS CODE, INCLUDING BUT NOT LIMITED TO
+#  IMPLIED WARRANTIES OF TITLE, NON-INFRINGEMENT, MERCHANTABILITY AND
+#  FITNESS FOR A PARTICULAR PURPOSE; (C) CLOUDERA IS NOT LIABLE TO YOU,
+#  AND WILL NOT DEFEND, INDEMNIFY, NOR HOLD YOU HARMLESS FOR ANY CLAIMS
+#  ARISING FROM OR RELATED TO THE CODE; AND (D)WITH RESPECT TO YOUR EXERCISE
+#  OF ANY RIGHTS GRANTED TO YOU FOR THE CODE, CLOUDERA IS NOT LIABLE FOR ANY
+#  DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, PUNITIVE OR
+#  CONSEQUENTIAL DAMAGES INCLUDING, BUT NOT LIMITED TO, DAMAGES
+#  RELATED TO LOST REVENUE, LOST PROFITS, LOSS OF INCOME, LOSS OF
+#  BUSINESS ADVANTAGE OR UNAVAILABILITY, OR LOSS OR CORRUPTION OF
+#  DATA.
+#
+# ###########################################################################
+
+import logging
+import threading
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+
+def format_metrics_response(response):
+    """
+    Format a cdsw.read_metrics() response as a dataframe of its "metrics" columns and
+    predictionUuid. A response without any records (e.g. a scoring window read before
+    its metrics are stored) gives an empty dataframe with a predictionUuid column.
+    """
+
+    metrics = pd.json_normalize(response["metrics"])
+    if "predictionUuid" not in metrics:
+        return pd.DataFrame(columns=["predictionUuid"])
+
+    return metrics[
+        [col for col in metrics.columns if col.split(".")[0] == "metrics"]
+        + ["predictionUuid"]
+    ].rename(columns={col: col.split(".")[-1] for col in metrics.columns})
+
+
+class MetricsCache:
+    """An incremental view of the model metrics store
+
+    cdsw.read_metrics() can only filter by time, not by predictionUuid, so querying the
+    full store on every batch makes the total query cost grow quadratically over the
+    course of a simulation. Delayed metrics (ground truths) are attached to the original
+    prediction, so they surface under the timestamp at which the record was *scored*.
+
+    It therefore keeps a cursor over scoring windows: each call to
+    make_inference() registers the time window it scored in and the uuids it produced.
+    When metrics are needed for a set of uuids (e.g. newly sold records), only the
+    windows containing those uuids are read from the store. Because a record sells
+    shortly after it is listed, this is a small, bounded number of recent windows per
+    batch regardless of how much history has accumulated.
+
+    Fetched rows are returned to the caller rather than accumulated, so a batch costs
+    the same however long the simulation has run, and their uuids are dropped from the
+    window index since each record receives its ground truth only once.
+
+    Attributes:
+        read_fn (callable): called as read_fn(start_timestamp_ms=..., end_timestamp_ms=...)
+            or with no arguments for a full read; returns a formatted metrics dataframe
+        slack_ms (int): margin added around each window to absorb clock skew between
+            the client and the model replicas
+        windows (list): (start_timestamp_ms, end_timestamp_ms) of each scoring window
+
+    """
+
+    def __init__(self, read_fn, slack_ms=60_000):
+        self.read_fn = read_fn
+        self.slack_ms = slack_ms
+        self.windows = []
+        self._uuid_window = {}
+        self._lock = threading.Lock()
+
+    def register(self, inference_metadata):
+        """
+        Record the scoring window and uuids returned by a threaded_call(). Only records
+        scored in the call are filed under its window; uuids resumed from a checkpoint
+        were scored (and stored) by an earlier run, so they are left to the full-read
+        fallback of query().
+        """
+
+        with self._lock:
+            self.windows.append(
+                (
+                    inference_metadata["start_timestamp_ms"],
+                    inference_metadata["end_timestamp_ms"],
+                )
+            )
+            window = len(self.windows) - 1
+            scored = inference_metadata["id_prediction_mapping"]
+            for id_, uuid in inference_metadata["id_uuid_mapping"].items():
+                if id_ in scored:
+                    self._uuid_window.setdefault(uuid, window)
+
+    def query(self, uuids):
+        """
+        Return metrics rows for the provided uuids, reading only the scoring windows
+        that contain them.
+
+        Any uuids that cannot be located this way (e.g. resumed from a checkpoint
+        written by a previous run) are resolved with a single full read.
+
+        Args:
+            uuids (list)
+
+        Returns:
+            pd.DataFrame
+
+        """
+
+        uuids = set(uuids)
+        windows = sorted(
+            {self._uuid_window[u] for u in uuids if u in self._uuid_window}
+        )
+
+        fetched = [
+            self.read_fn(
+                start_timestamp_ms=self.windows[w][0] - self.slack_ms,
+                end_timestamp_ms=self.windows[w][1] + self.slack_ms,
+            )
+            for w in windows
+        ]
+        found = self._select(fetched, uuids)
+
+        missing = uuids - set(found.predictionUuid)
+        if missing:
+            logger.info(
+                f"Falling back to a full metrics read for {len(missing)} uuids outside of registered windows"
+            )
+            found = pd.concat([found, self._select([self.read_fn()], missing)])
+
+        logger.info(
+            f"Queried metrics for {len(found)} records from {len(windows)} scoring windows"
+        )
+
+        self.discard(uuids)
+
+        return found.reset_index(drop=True)
+
+    def discard(self, uuids):
+        """Drop uuids whose metrics were obtained elsewhere (e.g. a local mirror) from the index."""
+
+        with self._lock:
+            for uuid in uuids:
+                self._uuid_window.pop(uuid, None)
+
+    @staticmethod
+    def _select(frames, uuids):
+        frames = [df for df in frames if len(df)]
+        if not frames:
+            return pd.DataFrame(columns=["predictionUuid"])
+
+        combined = pd.concat(frames)
+        return combined[combined.predictionUuid.isin(uuids)].drop_duplicates(
+            subset="predictionUuid", keep="last"
+        )
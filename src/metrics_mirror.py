@@ -0,0 +1,235 @@
+# ###########################################################################
+#
+#  CLOUDERA APPLIED MACHINE LEARNING PROTOTYPE (AMP)
+#  (C) Cloudera, Inc. 2021
+#  All rights reserved.
+#
+#  Applicable Open Source License: Apache 2.0
+#
+#  NOTE: Cloudera open source products are modular software products
+#  made up of hundreds of individual components, each of which was
+#  individually copyrighted.  Each Cloudera open source product is a
+#  collective work under U.S. Copyright Law. Your license to use the
+#  collective work is as provided in your written agreement with
+#  Cloudera.  Used apart from the collective work, this file is
+#  licensed for your use pursuant to the open source license
+#  identified above.
+#
+#  This code is provided to you pursuant a written agreement with
+#  (i) Cloudera, Inc. or (ii) a third-party authorized to distribute
+#  this code. If you do not have a written agreement with Cloudera nor
+#  with an authorized and properly licensed third party, you do not
+#  have any rights to access nor to use this code.
+#
+#  Absent a written agreement with Cloudera, Inc. (“Cloudera”) to the
+#  contrary, A) CLOUDERA PROVIDES THIS CODE TO YOU WITHOUT WARRANTIES OF ANY
+#  KIND; (B) CLOUDERA DISCLAIMS ANY AND ALL EXPRESS AND IMPLIED
+#  WARRANTIES WITH RESPECT TO THIS CODE, INCLUDING BUT NOT LIMITED TO
+#  IMPLIED WARRANTIES OF TITLE, NON-INFRINGEMENT, MERCHANTABILITY AND
+#  FITNESS FOR A PARTICULAR PURPOSE; (C) CLOUDERA IS NOT LIABLE TO YOU,
+#  AND WILL NOT DEFEND, INDEMNIFY, NOR HOLD YOU HARMLESS FOR ANY CLAIMS
+#  ARISING FROM OR RELATED TO THE CODE; AND (D)WITH RESPECT TO YOUR EXERCISE
+#  OF ANY RIGHTS GRANTED TO YOU FOR THE CODE, CLOUDERA IS NOT LIABLE FOR ANY
+#  DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, PUNITIVE OR
+#  CONSEQUENTIAL DAMAGES INCLUDING, BUT NOT LIMITED TO, DAMAGES
+#  RELATED TO LOST REVENUE, LOST PROFITS, LOSS OF INCOME, LOSS OF
+#  BUSINESS ADVANTAGE OR UNAVAILABILITY, OR LOSS OR CORRUPTION OF
+#  DATA.
+#
+# ###########################################################################
+
+import os
+import json
+import sqlite3
+import threading
+
+
+class MetricsMirror:
+    """A local, indexed SQLite mirror of the CML model metrics store
+
+    Each record returned by cdsw.read_metrics() is upserted by predictionUuid, keeping
+    its deployment CRN, timestamps and sold date in indexed columns alongside the raw
+    "metrics" payload. Ad-hoc lookups by uuid, time range or sold date then run locally
+    rather than as round trips to the Postgres-backed service.
+
+    When enabled (metrics_mirror_path), Simulation keeps it in sync: the records of each
+    scoring window are read into it once, after the window is scored, and delayed metrics
+    are merged into it (track_delayed()) as they are written to the store. The metrics of
+    newly sold records are then served from the mirror by uuid, and only records it does
+    not hold (e.g. resumed from a checkpoint of an earlier run) are read from the store.
+
+    Query methods return a dictionary in the same shape as cdsw.read_metrics(), so the
+    results can be passed directly to Simulation.format_model_metrics_query().
+
+    Attributes:
+        path (str): location of the SQLite database file
+
+    """
+
+    # SQLite limits the number of bound parameters in a single statement
+    MAX_PARAMS = 500
+
+    def __init__(self, path):
+        self.path = path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS metrics (
+                prediction_uuid TEXT PRIMARY KEY,
+                model_deployment_crn TEXT,
+                start_timestamp_ms INTEGER,
+                end_timestamp_ms INTEGER,
+                date_sold TEXT,
+                record TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_metrics_crn_start
+                ON metrics (model_deployment_crn, start_timestamp_ms);
+            CREATE INDEX IF NOT EXISTS idx_metrics_end
+                ON metrics (end_timestamp_ms);
+            CREATE INDEX IF NOT EXISTS idx_metrics_date_sold
+                ON metrics (date_sold);
+            """)
+
+    def upsert(self, response):
+        """
+        Insert or replace the records from a cdsw.read_metrics() response.
+
+        Args:
+            response (dict): {"metrics": [...]} as returned by cdsw.read_metrics()
+
+        Returns:
+            int: number of records written
+
+        """
+
+        rows = [
+            (
+                record["predictionUuid"],
+                record.get("modelDeploymentCrn"),
+                record.get("startTimestampMs"),
+                record.get("endTimestampMs"),
+                (record.get("metrics") or {}).get("date_sold"),
+                json.dumps(record),
+            )
+            for record in response["metrics"]
+        ]
+
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO metrics VALUES (?, ?, ?, ?, ?, ?)", rows
+            )
+
+        return len(rows)
+
+    def track_delayed(self, prediction_uuids, metrics):
+        """
+        Merge metrics into those of mirrored records, as cdsw.track_delayed_metrics() does
+        in the store, keeping the indexed sold date up to date.
+
+        Args:
+            prediction_uuids (list)
+            metrics (list): dict of metrics for each uuid
+
+        Returns:
+            list: uuids the mirror holds no record for, which were not written
+
+        """
+
+        updates = dict(zip(prediction_uuids, metrics))
+        records = self.get(updates)["metrics"]
+
+        rows = []
+        for record in records:
+            record["metrics"] = dict(
+                record.get("metrics") or {}, **updates[record["predictionUuid"]]
+            )
+            rows.append(
+                (
+                    record["metrics"].get("date_sold"),
+                    json.dumps(record),
+                    record["predictionUuid"],
+                )
+            )
+
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "UPDATE metrics SET date_sold = ?, record = ? WHERE prediction_uuid = ?",
+                rows,
+            )
+
+        found = {record["predictionUuid"] for record in records}
+        return [uuid for uuid in updates if uuid not in found]
+
+    def read_metrics(
+        self, model_deployment_crn=None, start_timestamp_ms=None, end_timestamp_ms=None
+    ):
+        """Local equivalent of cdsw.read_metrics(), using the indexed columns."""
+
+        return self._select(
+            [
+                ("model_deployment_crn = ?", model_deployment_crn),
+                ("start_timestamp_ms >= ?", start_timestamp_ms),
+                ("end_timestamp_ms <= ?", end_timestamp_ms),
+            ]
+        )
+
+    def sold_between(self, start_date, end_date, model_deployment_crn=None):
+        """
+        Return records whose ground truth sold date falls within [start_date, end_date).
+
+        Args:
+            start_date (str): "%Y-%m-%d" formatted date
+            end_date (str): "%Y-%m-%d" formatted date
+            model_deployment_crn (str)
+
+        """
+
+        return self._select(
+            [
+                ("date_sold >= ?", start_date),
+                ("date_sold < ?", end_date),
+                ("model_deployment_crn = ?", model_deployment_crn),
+            ]
+        )
+
+    def get(self, prediction_uuids):
+        """Point lookup of records by predictionUuid."""
+
+        prediction_uuids = list(prediction_uuids)
+        records = []
+        for i in range(0, len(prediction_uuids), self.MAX_PARAMS):
+            chunk = prediction_uuids[i : i + self.MAX_PARAMS]
+            placeholders = ", ".join("?" * len(chunk))
+            records.extend(
+                self._select([], f"prediction_uuid IN ({placeholders})", chunk)[
+                    "metrics"
+                ]
+            )
+
+        return {"metrics": records}
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM metrics").fetchone()[0]
+
+    def close(self):
+        self._conn.close()
+
+    def _select(self, conditions, extra_clause=None, extra_params=()):
+        clauses = [clause for clause, value in conditions if value is not None]
+        params = [value for _, value in conditions if value is not None]
+        if extra_clause is not None:
+            clauses.append(extra_clause)
+            params.extend(extra_params)
+
+        query = "SELECT record FROM metrics"
+        if clauses:
+            query += " WHERE " + " AND ".join(clauses)
+
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+
+        return {"metrics": [json.loads(row[0]) for row in rows]}
@@ -0,0 +1,207 @@
+# ###########################################################################
+#
+#  CLOUDERA APPLIED MACHINE LEARNING PROTOTYPE (AMP)
+#  (C) Cloudera, Inc. 2021
+#  All rights reserved.
+#
+#  Applicable Open Source License: Apache 2.0
+#
+#  NOTE: Cloudera open source products are modular software products
+#  made up of hundreds of individual components, each of which was
+#  individually copyrighted.  Each Cloudera open source product is a
+#  collective work under U.S. Copyright Law. Your license to use the
+#  collective work is as provided in your written agreement with
+#  Cloudera.  Used apart from the collective work, this file is
+#  licensed for your use pursuant to the open source license
+#  identified above.
+#
+#  This code is provided to you pursuant a written agreement with
+#  (i) Cloudera, Inc. or (ii) a third-party authorized to distribute
+#  this code. If you do not have a written agreement with Cloudera nor
+#  with an authorized and properly licensed third party, you do not
+#  have any rights to access nor to use this code.
+#
+#  Absent a written agreement with Cloudera, Inc. (“Cloudera”) to the
+#  contrary, A) CLOUDERA PROVIDES THIS CODE TO YOU WITHOUT WARRANTIES OF ANY
+#  KIND; (B) CLOUDERA DISCLAIMS ANY AND ALL EXPRESS AND IMPLIED
+#  WARRANTIES WITH RESPECT TO THIS CODE, INCLUDING BUT NOT LIMITED TO
+#  IMPLIED WARRANTIES OF TITLE, NON-INFRINGEMENT, MERCHANTABILITY AND
+#  FITNESS FOR A PARTICULAR PURPOSE; (C) CLOUDERA IS NOT LIABLE TO YOU,
+#  AND WILL NOT DEFEND, INDEMNIFY, NOR HOLD YOU HARMLESS FOR ANY CLAIMS
+#  ARISING FROM OR RELATED TO THE CODE; AND (D)WITH RESPECT TO YOUR EXERCISE
+#  OF ANY RIGHTS GRANTED TO YOU FOR THE CODE, CLOUDERA IS NOT LIABLE FOR ANY
+#  DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, PUNITIVE OR
+#  CONSEQUENTIAL DAMAGES INCLUDING, BUT NOT LIMITED TO, DAMAGES
+#  RELATED TO LOST REVENUE, LOST PROFITS, LOSS OF INCOME, LOSS OF
+#  BUSINESS ADVANTAGE OR UNAVAILABILITY, OR LOSS OR CORRUPTION OF
+#  DATA.
+#
+# ###########################################################################
+
+import os
+import json
+import math
+import threading
+
+SUMMARY_PATH = "apps/reports/metrics_summary.json"
+
+
+def finite_or_none(obj):
+    """
+    Copy of a JSON-like object with non-finite floats (inf, NaN) replaced by None, as they
+    have no representation in standard JSON and are rejected by most clients.
+    """
+
+    if isinstance(obj, float):
+        return obj if math.isfinite(obj) else None
+    if isinstance(obj, dict):
+        return {key: finite_or_none(value) for key, value in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [finite_or_none(value) for value in obj]
+    return obj
+
+
+def read_summary(path=SUMMARY_PATH):
+    """The list of per-batch summaries in the aggregate file, or [] if there is none."""
+
+    if not os.path.exists(path):
+        return []
+
+    with open(path) as f:
+        return finite_or_none(json.load(f)["batches"])
+
+
+def update_metrics_summary(
+    date, drift_results, n_records, rolling=None, path=SUMMARY_PATH
+):
+    """
+    Add a batch's drift scores, regression error and per-feature statistics to the
+    aggregate file of monitoring metrics, which is rewritten atomically. Summarizing a
+    date again replaces its entry. Non-finite statistics are written as null.
+
+    Without drift results (e.g. the batch's drift was only calculated by Evidently, or it
+    had no records), the entry's drift and regression fields are null or empty, and it
+    carries the batch's record count and rolling windows only.
+
+    Args:
+        date (str): "%Y-%m-%d" end date of the batch
+        drift_results (dict): as returned by src.drift.calculate_drift(), or None
+        n_records (int): number of records in the batch
+        rolling (dict): optional summary from src.rolling.RollingMetrics.summary()
+        path (str)
+
+    Returns:
+        dict: the batch's summary
+
+    """
+
+    drift_results = drift_results or {}
+    entry = finite_or_none(
+        {
+            "date": date,
+            "n_records": n_records,
+            "dataset_drift": drift_results.get("dataset_drift"),
+            "share_drifted_features": drift_results.get("share_drifted_features"),
+            "regression_performance": drift_results.get("regression_performance", {}),
+            "features": dict(
+                drift_results.get("features", {}),
+                **drift_results.get("target_drift", {}),
+            ),
+        }
+    )
+    if rolling:
+        entry["rolling"] = finite_or_none(rolling)
+
+    batches = [batch for batch in read_summary(path) if batch["date"] != date]
+    batches = sorted(batches + [entry], key=lambda batch: batch["date"])
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = os.path.join(os.path.dirname(path), f".{os.path.basename(path)}.tmp")
+    with open(tmp_path, "w") as f:
+        json.dump({"batches": batches}, f, separators=(",", ":"), allow_nan=False)
+    os.replace(tmp_path, path)
+
+    return entry
+
+
+class MetricsSummary:
+    """A cached, queryable view of the aggregate file of monitoring metrics
+
+    The file is only re-read when its modification time changes, so serving the
+    metrics costs a stat() per request plus filtering a small in-memory list.
+
+    Attributes:
+        path (str)
+        batches (list): per-batch summaries, sorted by date
+
+    """
+
+    def __init__(self, path=SUMMARY_PATH):
+        self.path = path
+        self.batches = []
+        self._mtime = None
+        self._lock = threading.Lock()
+
+    def refresh(self):
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            self.batches, self._mtime = [], None
+            return
+
+        if mtime == self._mtime:
+            return
+
+        with self._lock:
+            if mtime != self._mtime:
+                self.batches = read_summary(self.path)
+                self._mtime = mtime
+
+    def query(self, start=None, end=None, features=None):
+        """
+        Per-batch summaries as a time series, optionally restricted to batches ending
+        within [start, end] and to a subset of features. The feature filter applies to
+        both the batch's own statistics and those of each of its rolling windows (whose
+        n_drifted_features still counts all features).
+
+        Args:
+            start (str): "%Y-%m-%d" earliest batch end date
+            end (str): "%Y-%m-%d" latest batch end date
+            features (list): feature names to include statistics for
+
+        Returns:
+            list: per-batch summaries, sorted by date
+
+        """
+
+        self.refresh()
+
+        batches = [
+            batch
+            for batch in self.batches
+            if (start is None or batch["date"] >= start)
+            and (end is None or batch["date"] <= end)
+        ]
+
+        if features is not None:
+            batches = [self._select_features(batch, features) for batch in batches]
+
+        return batches
+
+    @staticmethod
+    def _select_features(batch, features):
+        def select(stats):
+            return {name: s for name, s in stats.items() if name in features}
+
+        batch = dict(batch, features=select(batch["features"]))
+        if "rolling" in batch:
+            batch["rolling"] = {
+                window: (
+                    dict(results, features=select(results["features"]))
+                    if isinstance(results, dict) and "features" in results
+                    else results
+                )
+                for window, results in batch["rolling"].items()
+            }
+
+        return batch
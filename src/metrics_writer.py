@@ -0,0 +1,137 @@
+# ###########################################################################
+#
+#  CLOUDERA APPLIED MACHINE LEARNING PROTOTYPE (AMP)
+#  (C) Cloudera, Inc. 2021
+#  All rights reserved.
+#
+#  Applicable Open Source License: Apache 2.0
+#
+#  NOTE: Cloudera open source products are modular software products
+#  made up of hundreds of individual components, each of which was
+#  individually copyrighted.  Each Cloudera open source product is a
+#  collective work under U.S. Copyright Law. Your license to use the
+#  collective work is as provided in your written agreement with
+#  Cloudera.  Used apart from the collective work, this file is
+#  licensed for your use pursuant to the open source license
+#  identified above.
+#
+#  This code is provided to you pursuant a written agreement with
+#  (i) Cloudera, Inc. or (ii) a third-party authorized to distribute
+#  this code. If you do not have a written agreement with Cloudera nor
+#  with an authorized and properly licensed third party, you do not
+#  have any rights to access nor to use this code.
+#
+#  Absent a written agreement with Cloudera, Inc. (“Cloudera”) to the
+#  contrary, A) CLOUDERA PROVIDES THIS CODE TO YOU WITHOUT WARRANTIES OF ANY
+#  KIND; (B) CLOUDERA DISCLAIMS ANY AND ALL EXPRESS AND IMPLIED
+#  WARRANTIES WITH RESPECT TO THIS CODE, INCLUDING BUT NOT LIMITED TO
+#  IMPLIED WARRANTIES OF TITLE, NON-INFRINGEMENT, MERCHANTABILITY AND
+#  FITNESS FOR A PARTICULAR PURPOSE; (C) CLOUDERA IS NOT LIABLE TO YOU,
+#  AND WILL NOT DEFEND, INDEMNIFY, NOR HOLD YOU HARMLESS FOR ANY CLAIMS
+#  ARISING FROM OR RELATED TO THE CODE; AND (D)WITH RESPECT TO YOUR EXERCISE
+#  OF ANY RIGHTS GRANTED TO YOU FOR THE CODE, CLOUDERA IS NOT LIABLE FOR ANY
+#  DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, PUNITIVE OR
+#  CONSEQUENTIAL DAMAGES INCLUDING, BUT NOT LIMITED TO, DAMAGES
+#  RELATED TO LOST REVENUE, LOST PROFITS, LOSS OF INCOME, LOSS OF
+#  BUSINESS ADVANTAGE OR UNAVAILABILITY, OR LOSS OR CORRUPTION OF
+#  DATA.
+#
+# ###########################################################################
+
+import time
+import cdsw
+import concurrent
+
+from src.inference import backoff_delay
+
+
+class DelayedMetricsWriter:
+    """A utility for writing delayed metrics to the metric store concurrently
+
+    cdsw.track_delayed_metrics() writes one prediction's metrics per call, so a batch of
+    ground truths is I/O bound on round trips to the metric store. This writer fans the
+    calls out over a bounded pool of threads, retries failed writes with exponential
+    backoff and jitter, and reports its throughput.
+
+    The function used to write each record is injectable, which allows the writer to be
+    exercised against a local fake metric store.
+
+    Attributes:
+        track_fn (callable): called as track_fn(metrics=..., prediction_uuid=...);
+            defaults to cdsw.track_delayed_metrics
+        n_threads (int): maximum number of concurrent writes
+        max_retries (int): number of retries for a failed write
+        backoff_factor (float): base delay in seconds for exponential backoff
+        backoff_max (float): maximum delay in seconds between retries
+
+    """
+
+    def __init__(
+        self,
+        track_fn=None,
+        n_threads=8,
+        max_retries=3,
+        backoff_factor=0.5,
+        backoff_max=30,
+    ):
+        self.track_fn = track_fn or cdsw.track_delayed_metrics
+        self.n_threads = n_threads
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.backoff_max = backoff_max
+
+    def write_one(self, uuid, metrics):
+        """Write metrics for a single prediction, returning whether it succeeded."""
+
+        for attempt in range(self.max_retries + 1):
+            try:
+                self.track_fn(metrics=metrics, prediction_uuid=uuid)
+                return True
+            except Exception:
+                if attempt == self.max_retries:
+                    return False
+                time.sleep(
+                    backoff_delay(attempt, self.backoff_factor, self.backoff_max)
+                )
+
+    def write(self, uuids, ground_truths, sold_dates):
+        """
+        Write ground truth and sold date metrics for a batch of predictions.
+
+        Args:
+            uuids (list)
+            ground_truths (list)
+            sold_dates (list)
+
+        Returns:
+            dict: summary of the write
+
+                {'n_records': 10000,
+                 'n_written': 9998,
+                 'failed_uuids': ['c213d9d2-...', '7a3e8c56-...'],
+                 'elapsed_s': 12.5,
+                 'records_per_s': 800.0}
+
+        """
+
+        metrics = [
+            {"ground_truth": gt, "date_sold": ds}
+            for gt, ds in zip(ground_truths, sold_dates)
+        ]
+
+        start = time.perf_counter()
+        with concurrent.futures.ThreadPoolExecutor(
+            max_workers=self.n_threads
+        ) as executor:
+            succeeded = list(executor.map(self.write_one, uuids, metrics))
+        elapsed = time.perf_counter() - start
+
+        failed_uuids = [uuid for uuid, ok in zip(uuids, succeeded) if not ok]
+
+        return {
+            "n_records": len(uuids),
+            "n_written": len(uuids) - len(failed_uuids),
+            "failed_uuids": failed_uuids,
+            "elapsed_s": elapsed,
+            "records_per_s": len(uuids) / elapsed if elapsed > 0 else float("inf"),
+        }
@@ -0,0 +1,242 @@
+# ###########################################################################
+#
+#  CLOUDERA APPLIED MACHINE LEARNING PROTOTYPE (AMP)
+#  (C) Cloudera, Inc. 2021
+#  All rights reserved.
+#
+#  Applicable Open Source License: Apache 2.0
+#
+#  NOTE: Cloudera open source products are modular software products
+#  made up of hundreds of individual components, each of which was
+#  individually copyrighted.  Each Cloudera open source product is a
+#  collective work under U.S. Copyright Law. Your license to use the
+#  collective work is as provided in your written agreement with
+#  Cloudera.  Used apart from the collective work, this file is
+#  licensed for your use pursuant to the open source license
+#  identified above.
+#
+#  This code is provided to you pursuant a written agreement with
+#  (i) Cloudera, Inc. or (ii) a third-party authorized to distribute
+#  this code. If you do not have a written agreement with Cloudera nor
+#  with an authorized and properly licensed third party, you do not
+#  have any rights to access nor to use this code.
+#
+#  Absent a written agreement with Cloudera, Inc. (“Cloudera”) to the
+#  contrary, A) CLOUDERA PROVIDES THIS CODE TO YOU WITHOUT WARRANTIES OF ANY
+#  KIND; (B) CLOUDERA DISCLAIMS ANY AND ALL EXPRESS AND IMPLIED
+#  WARRANTIES WITH RESPECT TO THIS CODE, INCLUDING BUT NOT LIMITED TO
+#  IMPLIED WARRANTIES OF TITLE, NON-INFRINGEMENT, MERCHANTABILITY AND
+#  FITNESS FOR A PARTICULAR PURPOSE; (C) CLOUDERA IS NOT LIABLE TO YOU,
+#  AND WILL NOT DEFEND, INDEMNIFY, NOR HOLD YOU HARMLESS FOR ANY CLAIMS
+#  ARISING FROM OR RELATED TO THE CODE; AND (D)WITH RESPECT TO YOUR EXERCISE
+#  OF ANY RIGHTS GRANTED TO YOU FOR THE CODE, CLOUDERA IS NOT LIABLE FOR ANY
+#  DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, PUNITIVE OR
+#  CONSEQUENTIAL DAMAGES INCLUDING, BUT NOT LIMITED TO, DAMAGES
+#  RELATED TO LOST REVENUE, LOST PROFITS, LOSS OF INCOME, LOSS OF
+#  BUSINESS ADVANTAGE OR UNAVAILABILITY, OR LOSS OR CORRUPTION OF
+#  DATA.
+#
+# ###########################################################################
+
+import os
+import re
+import pickle
+import logging
+import numpy as np
+
+from src.drift import bin_counts, quantile_bin_edges
+from src.columns import TARGET, PREDICTION, NUM_FEATURES, CAT_FEATURES
+from src.utils import scale_prices
+
+logger = logging.getLogger(__name__)
+
+PROFILE_DIR = "data/working/reference_profiles/"
+
+
+class ReferenceProfile:
+    """A precomputed profile of the reference (training) metrics for a model deployment
+
+    The reference data is constant for a given deployment, so rather than re-scaling,
+    re-sampling, re-sorting and re-rounding the full reference metrics for every batch,
+    it is profiled once and persisted to disk keyed by deployment CRN. The profile holds:
+
+        - a fixed-size sample of the prepared reference (prices scaled, rounded), shuffled
+          once so that any leading slice of it is a uniform random sample
+        - quantiles and histograms (over reference-quantile bins) of numerical columns
+        - category frequencies of categorical columns
+
+    A profile can be passed in place of the reference dataframe to
+    src.reporting.prepare_report_data() and everything built on it.
+
+    Attributes:
+        crn (str): deployment CRN the profile was built for
+        n_rows (int): number of rows in the full reference data
+        data (pd.DataFrame): shuffled, prepared sample of the reference data
+        quantiles (dict): column name to values at QUANTILES
+        bin_edges (dict): column name to edges of its reference-quantile bins
+        histograms (dict): column name to reference counts within bin_edges
+        category_frequencies (dict): column name to {category: share of rows}
+
+    """
+
+    QUANTILES = np.linspace(0, 1, 101)
+
+    def __init__(self, crn, n_rows, data, quantiles, bin_edges, histograms, freqs):
+        self.crn = crn
+        self.n_rows = n_rows
+        self.data = data
+        self.quantiles = quantiles
+        self.bin_edges = bin_edges
+        self.histograms = histograms
+        self.category_frequencies = freqs
+
+    @classmethod
+    def build(
+        cls,
+        reference_df,
+        crn,
+        sample_size=10_000,
+        bins=10,
+        num_features=NUM_FEATURES,
+        cat_features=CAT_FEATURES,
+        random_state=42,
+    ):
+        """
+        Profile a reference metrics dataframe (as returned by Simulation.query_model_metrics()).
+
+        Args:
+            reference_df (pd.DataFrame)
+            crn (str): deployment CRN the reference metrics belong to
+            sample_size (int): number of rows kept in the profile's sample
+            bins (int): number of reference-quantile bins per numerical column
+            num_features (list)
+            cat_features (list)
+            random_state (int): seed for shuffling the sample
+
+        Returns:
+            ReferenceProfile
+
+        """
+
+        prepared = scale_prices(reference_df).round(2)
+        num_columns = [
+            column
+            for column in list(num_features) + [TARGET, PREDICTION]
+            if column in prepared
+        ]
+
+        values = prepared[num_columns].to_numpy(dtype=float)
+        edges = quantile_bin_edges(values, bins)
+        quantiles = np.quantile(values, cls.QUANTILES, axis=0)
+
+        data = prepared.sample(
+            n=min(sample_size, len(prepared)), random_state=random_state
+        ).set_index("date_sold", drop=True)
+
+        return cls(
+            crn=crn,
+            n_rows=len(prepared),
+            data=data,
+            quantiles={c: quantiles[:, j] for j, c in enumerate(num_columns)},
+            bin_edges={c: edges[j] for j, c in enumerate(num_columns)},
+            histograms={
+                c: bin_counts(values[:, j], edges[j]) for j, c in enumerate(num_columns)
+            },
+            freqs={
+                c: prepared[c].value_counts(normalize=True).to_dict()
+                for c in cat_features
+                if c in prepared
+            },
+        )
+
+    def sample(self, n):
+        """
+        A uniform random sample of n rows of the prepared reference, indexed and sorted by
+        sold date. Capped at the size of the profile's sample, so the profile should be
+        built with a sample_size of at least the largest n it will be asked for.
+        """
+
+        if n > len(self.data):
+            logger.warning(
+                f"Requested {n} reference rows but the profile holds {len(self.data)}"
+            )
+
+        return self.data.iloc[:n].sort_index()
+
+    @staticmethod
+    def path_for(crn, profile_dir=PROFILE_DIR, tag=None, sample_size=10_000, bins=10):
+        """
+        Profiles are named by their deployment CRN, made safe for use as a filename, along
+        with the tag and build parameters they depend on, so that a profile is only reused
+        for the same reference data and configuration.
+        """
+
+        name = "-".join(
+            str(part)
+            for part in (crn, tag, f"n{sample_size}", f"b{bins}")
+            if part is not None
+        )
+
+        return os.path.join(profile_dir, re.sub(r"[^A-Za-z0-9_.-]", "_", name) + ".pkl")
+
+    def save(self, path):
+        """Pickle the profile to path, atomically."""
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = os.path.join(os.path.dirname(path), f".{os.path.basename(path)}.tmp")
+        with open(tmp_path, "wb") as f:
+            pickle.dump(self, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def load(path):
+        with open(path, "rb") as f:
+            return pickle.load(f)
+
+    @classmethod
+    def load_or_build(
+        cls, reference_df, crn, profile_dir=PROFILE_DIR, tag=None, **kwargs
+    ):
+        """
+        Load the persisted profile for a deployment CRN and configuration, or build it from
+        reference_df and persist it if none exists yet.
+
+        Args:
+            reference_df (pd.DataFrame | callable): reference metrics, or a callable returning
+                them so they are only fetched when the profile must be built
+            crn (str)
+            profile_dir (str)
+            tag (str): optional label for reference data that differs between runs against
+                the same deployment (e.g. the simulation's dev mode sample)
+            **kwargs: passed to build()
+
+        Returns:
+            ReferenceProfile
+
+        """
+
+        path = cls.path_for(
+            crn,
+            profile_dir,
+            tag=tag,
+            **{k: v for k, v in kwargs.items() if k in ("sample_size", "bins")},
+        )
+
+        if os.path.exists(path):
+            profile = cls.load(path)
+            logger.info(f"Loaded reference profile for {crn} from {path}")
+            return profile
+
+        if callable(reference_df):
+            reference_df = reference_df()
+
+        profile = cls.build(reference_df, crn, **kwargs)
+        profile.save(path)
+        logger.info(
+            f"Built reference profile for {crn} from {profile.n_rows} records: {path}"
+        )
+
+        return profile
+
+    def __len__(self):
+        return len(self.data)
@@ -0,0 +1,237 @@
+# ###########################################################################
+#
+#  CLOUDERA APPLIED MACHINE LEARNING PROTOTYPE (AMP)
+#  (C) Cloudera, Inc. 2021
+#  All rights reserved.
+#
+#  Applicable Open Source License: Apache 2.0
+#
+#  NOTE: Cloudera open source products are modular software products
+#  made up of hundreds of individual components, each of which was
+#  individually copyrighted.  Each Cloudera open source product is a
+#  collective work under U.S. Copyright Law. Your license to use the
+#  collective work is as provided in your written agreement with
+#  Cloudera.  Used apart from the collective work, this file is
+#  licensed for your use pursuant to the open source license
+#  identified above.
+#
+#  This code is provided to you pursuant a written agreement with
+#  (i) Cloudera, Inc. or (ii) a third-party authorized to distribute
+#  this code. If you do not have a written agreement with Cloudera nor
+#  with an authorized and properly licensed third party, you do not
+#  have any rights to access nor to use this code.
+#
+#  Absent a written agreement with Cloudera, Inc. (“Cloudera”) to the
+#  contrary, A) CLOUDERA PROVIDES THIS CODE TO YOU WITHOUT WARRANTIES OF ANY
+#  KIND; (B) CLOUDERA DISCLAIMS ANY AND ALL EXPRESS AND IMPLIED
+#  WARRANTIES WITH RESPECT TO THIS CODE, INCLUDING BUT NOT LIMITED TO
+#  IMPLIED WARRANTIES OF TITLE, NON-INFRINGEMENT, MERCHANTABILITY AND
+#  FITNESS FOR A PARTICULAR PURPOSE; (C) CLOUDERA IS NOT LIABLE TO YOU,
+#  AND WILL NOT DEFEND, INDEMNIFY, NOR HOLD YOU HARMLESS FOR ANY CLAIMS
+#  ARISING FROM OR RELATED TO THE CODE; AND (D)WITH RESPECT TO YOUR EXERCISE
+#  OF ANY RIGHTS GRANTED TO YOU FOR THE CODE, CLOUDERA IS NOT LIABLE FOR ANY
+#  DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, PUNITIVE OR
+#  CONSEQUENTIAL DAMAGES INCLUDING, BUT NOT LIMITED TO, DAMAGES
+#  RELATED TO LOST REVENUE, LOST PROFITS, LOSS OF INCOME, LOSS OF
+#  BUSINESS ADVANTAGE OR UNAVAILABILITY, OR LOSS OR CORRUPTION OF
+#  DATA.
+#
+# ###########################################################################
+
+import os
+import json
+import threading
+from datetime import datetime
+from collections import namedtuple
+
+from src.utils import gzip_copy
+
+MANIFEST = "manifest.json"
+
+ReportEntry = namedtuple(
+    "ReportEntry", ["date", "filename", "path", "gzip_path", "mtime", "size", "etag"]
+)
+
+
+def dated_files(report_dir, date):
+    """Published files in report_dir for a "%Y-%m-%d" date, excluding compressed copies of reports."""
+
+    return sorted(
+        filename
+        for filename in os.listdir(report_dir)
+        if filename.startswith(f"{date}_") and not filename.endswith(".html.gz")
+    )
+
+
+def read_manifest(report_dir):
+    """The list of published batches in report_dir's manifest, or None if it has none."""
+
+    path = os.path.join(report_dir, MANIFEST)
+    if not os.path.exists(path):
+        return None
+
+    with open(path) as f:
+        return json.load(f)["reports"]
+
+
+def publish_report(report_dir, date):
+    """
+    Record a batch's files (report, drift results, rolling metrics) in report_dir's
+    manifest, which is rewritten atomically so readers never see a partial manifest.
+    Publishing a date again replaces its entry.
+
+    Args:
+        report_dir (str)
+        date (str): "%Y-%m-%d" date prefix of the batch's files
+
+    Returns:
+        dict: the batch's manifest entry
+
+    """
+
+    entry = {
+        "date": date,
+        "files": dated_files(report_dir, date),
+        "published_at": datetime.utcnow().isoformat(timespec="seconds") + "Z",
+    }
+
+    reports = [
+        report for report in read_manifest(report_dir) or [] if report["date"] != date
+    ]
+    reports = sorted(reports + [entry], key=lambda report: report["date"])
+
+    path = os.path.join(report_dir, MANIFEST)
+    tmp_path = os.path.join(report_dir, f".{MANIFEST}.tmp")
+    with open(tmp_path, "w") as f:
+        json.dump({"reports": reports}, f, indent=2)
+    os.replace(tmp_path, path)
+
+    return entry
+
+
+class ReportIndex:
+    """An in-memory index of the published reports in a directory
+
+    Batches are published by recording their files in the directory's manifest (see
+    publish_report()); reports in a directory without a manifest are found by their
+    "%Y-%m-%d" filename prefix instead. Rather than reading the manifest or listing the
+    directory on each request, the index is rebuilt only when the directory's
+    modification time changes, which happens whenever a file is added, removed or
+    atomically replaced (reports and the manifest are always moved into place with
+    os.replace). A running application therefore picks up new reports live.
+
+    Reports are normally published with a gzip-compressed copy alongside them, so
+    compressed responses can be served straight from disk. While rebuilding, a copy is
+    written for any HTML report that lacks an up to date one, in a separate cache_dir:
+    writing it to the report directory would itself change the directory's modification
+    time and trigger another rebuild.
+
+    Each entry carries a validator (ETag) derived from the report's size and
+    modification time, for answering conditional requests.
+
+    Attributes:
+        report_dir (str)
+        cache_dir (str): where the index writes its own gzip-compressed copies
+        manifest (list): manifest entry (date, files, published_at) of each batch
+        entries (list): ReportEntry for each HTML report, sorted by date
+
+    """
+
+    def __init__(self, report_dir, cache_dir=None):
+        self.report_dir = report_dir
+        self.cache_dir = cache_dir or os.path.join(
+            os.path.dirname(os.path.normpath(report_dir)), ".report_cache"
+        )
+        self.manifest = []
+        self.entries = []
+        self._by_date = {}
+        self._mtime = None
+        self._lock = threading.Lock()
+
+    def refresh(self):
+        """Rebuild the index if the report directory has changed since it was last built."""
+
+        try:
+            mtime = os.stat(self.report_dir).st_mtime_ns
+        except FileNotFoundError:
+            self.manifest, self.entries, self._by_date = [], [], {}
+            self._mtime = None
+            return
+
+        if mtime == self._mtime:
+            return
+
+        with self._lock:
+            if mtime != self._mtime:
+                # the mtime is read before scanning, so a file added during the scan
+                # leaves it out of date and is picked up by the next refresh
+                self._scan()
+                self._mtime = mtime
+
+    def _scan(self):
+        manifest = read_manifest(self.report_dir)
+        if manifest is None:
+            dates = {
+                filename.split("_")[0]
+                for filename in os.listdir(self.report_dir)
+                if filename.endswith(".html") and len(filename.split("_")[0]) == 10
+            }
+            manifest = [
+                {"date": date, "files": dated_files(self.report_dir, date)}
+                for date in sorted(dates)
+            ]
+
+        entries = []
+        for report in manifest:
+            for filename in report["files"]:
+                path = os.path.join(self.report_dir, filename)
+                if filename.endswith(".html") and os.path.exists(path):
+                    entries.append(self._entry(report["date"], filename, path))
+
+        self.manifest = manifest
+        self.entries = sorted(entries, key=lambda entry: entry.date)
+        self._by_date = {entry.date: entry for entry in self.entries}
+
+    def _entry(self, date, filename, path):
+        stat = os.stat(path)
+
+        def up_to_date(gzip_path):
+            return (
+                os.path.exists(gzip_path)
+                and os.stat(gzip_path).st_mtime_ns >= stat.st_mtime_ns
+            )
+
+        gzip_path = path + ".gz"
+        if not up_to_date(gzip_path):
+            gzip_path = os.path.join(self.cache_dir, filename + ".gz")
+            if not up_to_date(gzip_path):
+                os.makedirs(self.cache_dir, exist_ok=True)
+                gzip_copy(path, gzip_path=gzip_path)
+
+        return ReportEntry(
+            date=date,
+            filename=filename,
+            path=path,
+            gzip_path=gzip_path,
+            mtime=stat.st_mtime,
+            size=stat.st_size,
+            etag=f"{stat.st_mtime_ns:x}-{stat.st_size:x}",
+        )
+
+    def latest(self):
+        """The most recent report's entry, or None if there are no reports."""
+
+        self.refresh()
+        return self.entries[-1] if self.entries else None
+
+    def get(self, date):
+        """The entry of the report for a "%Y-%m-%d" date, or None if there is none."""
+
+        self.refresh()
+        return self._by_date.get(date)
+
+    def list(self):
+        """The manifest entry of every published batch, sorted by date."""
+
+        self.refresh()
+        return list(self.manifest)
@@ -0,0 +1,437 @@
+# ###########################################################################
+#
+#  CLOUDERA APPLIED MACHINE LEARNING PROTOTYPE (AMP)
+#  (C) Cloudera, Inc. 2021
+#  All rights reserved.
+#
+#  Applicable Open Source License: Apache 2.0
+#
+#  NOTE: Cloudera open source products are modular software products
+#  made up of hundreds of individual components, each of which was
+#  individually copyrighted.  Each Cloudera open source product is a
+#  collective work under U.S. Copyright Law. Your license to use the
+#  collective work is as provided in your written agreement with
+#  Cloudera.  Used apart from the collective work, this file is
+#  licensed for your use pursuant to the open source license
+#  identified above.
+#
+#  This code is provided to you pursuant a written agreement with
+#  (i) Cloudera, Inc. or (ii) a third-party authorized to distribute
+#  this code. If you do not have a written agreement with Cloudera nor
+#  with an authorized and properly licensed third party, you do not
+#  have any rights to access nor to use this code.
+#
+#  Absent a written agreement with Cloudera, Inc. (“Cloudera”) to the
+#  contrary, A) CLOUDERA PROVIDES THIS CODE TO YOU WITHOUT WARRANTIES OF ANY
+#  KIND; (B) CLOUDERA DISCLAIMS ANY AND ALL EXPRESS AND IMPLIED
+#  WARRANTIES WITH RESPECT TO THIS CODE, INCLUDING BUT NOT LIMITED TO
+#  IMPLIED WARRANTIES OF TITLE, NON-INFRINGEMENT, MERCHANTABILITY AND
+#  FITNESS FOR A PARTICULAR PURPOSE; (C) CLOUDERA IS NOT LIABLE TO YOU,
+#  AND WILL NOT DEFEND, INDEMNIFY, NOR HOLD YOU HARMLESS FOR ANY CLAIMS
+#  ARISING FROM OR RELATED TO THE CODE; AND (D)WITH RESPECT TO YOUR EXERCISE
+#  OF ANY RIGHTS GRANTED TO YOU FOR THE CODE, CLOUDERA IS NOT LIABLE FOR ANY
+#  DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, PUNITIVE OR
+#  CONSEQUENTIAL DAMAGES INCLUDING, BUT NOT LIMITED TO, DAMAGES
+#  RELATED TO LOST REVENUE, LOST PROFITS, LOSS OF INCOME, LOSS OF
+#  BUSINESS ADVANTAGE OR UNAVAILABILITY, OR LOSS OR CORRUPTION OF
+#  DATA.
+#
+# ###########################################################################
+
+import os
+import sys
+import gzip
+import json
+import uuid
+import shutil
+import logging
+import multiprocessing
+import concurrent.futures
+import numpy as np
+import pandas as pd
+import evidently
+from dataclasses import asdict
+from evidently.dashboard import Dashboard
+from evidently.model.dashboard import DashboardInfo
+from evidently.utils import NumpyEncoder
+from evidently.tabs import DataDriftTab, NumTargetDriftTab, RegressionPerformanceTab
+
+from src.columns import TARGET, PREDICTION, NUM_FEATURES, CAT_FEATURES
+from src.utils import gzip_copy, scale_prices, unique_tmp_path
+
+logger = logging.getLogger(__name__)
+
+REPORT_DIR = "apps/reports/"
+STATIC_DIR = os.path.join(REPORT_DIR, "static")
+
+# where the monitoring application serves shared assets and report payloads from
+STATIC_URL = "/assets/"
+PAYLOAD_URL = "/payloads/"
+
+SHARED_CSS = """@font-face {
+  font-family: 'Material Icons';
+  font-style: normal;
+  font-weight: 400;
+  src: url(material-ui-icons.woff2) format('woff2');
+}
+.material-icons {
+  font-family: 'Material Icons';
+  font-weight: normal;
+  font-style: normal;
+  font-size: 24px;
+  line-height: 1;
+  letter-spacing: normal;
+  text-transform: none;
+  display: inline-block;
+  white-space: nowrap;
+  word-wrap: normal;
+  direction: ltr;
+  text-rendering: optimizeLegibility;
+  -webkit-font-smoothing: antialiased;
+}
+"""
+
+SHARED_HTML_TEMPLATE = """<html>
+<head>
+<meta charset="utf-8">
+<link rel="stylesheet" href="{static_url}evidently.css">
+</head>
+<body>
+<div id="root_{dashboard_id}">Loading...</div>
+<script src="{static_url}evidently.js"></script>
+<script>
+fetch("{payload_url}")
+  .then(function (response) {{ return response.json(); }})
+  .then(function (payload) {{
+    window.drawDashboard(payload.dashboard_info,
+      new Map(Object.entries(payload.additional_graphs)),
+      "root_{dashboard_id}"
+    );
+  }});
+</script>
+</body>
+</html>
+"""
+
+COLUMN_MAP = {
+    "target": TARGET,
+    "prediction": PREDICTION,
+    "numerical_features": NUM_FEATURES,
+    "categorical_features": CAT_FEATURES,
+    "datetime": None,
+}
+
+
+def report_path(current_date_range, report_dir=REPORT_DIR, extension="html"):
+    """Reports are named by the end date of the provided date range."""
+
+    return os.path.join(
+        report_dir,
+        f'{current_date_range[1].strftime("%Y-%m-%d")}_price_regressor.{extension}',
+    )
+
+
+def prepare_report_data(reference_df, current_df):
+    """
+    Prepare reference and current metrics for drift calculation: scale prices, sample
+    the reference down to the size of the current data, index and sort by sold date,
+    and round.
+
+    reference_df may instead be a src.reference_profile.ReferenceProfile, in which case
+    its already prepared sample is used.
+
+    Returns:
+        tuple: (reference, current) dataframes
+
+    """
+
+    if not isinstance(reference_df, pd.DataFrame):
+        reference = reference_df.sample(len(current_df))
+    else:
+        reference = (
+            scale_prices(reference_df)
+            .sample(n=len(current_df), random_state=42)
+            .set_index("date_sold", drop=True)
+            .sort_index()
+            .round(2)
+        )
+    current = (
+        scale_prices(current_df).set_index("date_sold", drop=True).sort_index().round(2)
+    )
+
+    return reference, current
+
+
+def _sequence_length(value):
+    return len(value) if isinstance(value, (list, tuple, np.ndarray)) else None
+
+
+def _take(obj, positions, length):
+    """Take positions from every sequence of the given length in a (nested) plot trace."""
+
+    if isinstance(obj, dict):
+        return {key: _take(value, positions, length) for key, value in obj.items()}
+    if _sequence_length(obj) == length:
+        return [obj[p] for p in positions]
+    return obj
+
+
+def downsample_plot_data(obj, max_points):
+    """
+    Recursively reduce every plot trace (a dict with "x" or "y" data) holding more than
+    max_points points to max_points evenly spaced points, along with any other per-point
+    data in the trace (text, marker colors, etc). Tables and summary statistics are left
+    untouched.
+
+    """
+
+    if isinstance(obj, dict):
+        length = _sequence_length(obj.get("x")) or _sequence_length(obj.get("y"))
+        if length is not None and length > max_points:
+            positions = np.linspace(0, length - 1, max_points).round().astype(int)
+            return _take(obj, positions, length)
+        return {
+            key: downsample_plot_data(value, max_points) for key, value in obj.items()
+        }
+    if isinstance(obj, (list, tuple)):
+        return [downsample_plot_data(value, max_points) for value in obj]
+    return obj
+
+
+def dashboard_payload(dashboard, max_points=None):
+    """
+    The data an Evidently dashboard renders from (its widgets and additional graphs), as
+    a dict serializable with evidently.utils.NumpyEncoder, optionally with plot data
+    downsampled to max_points.
+
+    Mirrors the data that Dashboard.save() embeds in its HTML template, gathered from
+    the dashboard's public tabs_data.
+
+    """
+
+    dashboard_id = "evidently_dashboard_" + uuid.uuid4().hex
+    widgets = [
+        widget
+        for tab in dashboard.tabs_data
+        for widget in tab.info()
+        if widget is not None
+    ]
+
+    payload = {
+        "dashboard_info": asdict(DashboardInfo(dashboard_id, widgets)),
+        "additional_graphs": {
+            graph.id: graph.params
+            for widget in widgets
+            for graph in widget.additionalGraphs
+        },
+    }
+    if max_points is not None:
+        payload = downsample_plot_data(payload, max_points)
+
+    return payload
+
+
+def export_static_assets(static_dir=STATIC_DIR):
+    """
+    Write the assets shared by every report exported with export="shared" (Evidently's
+    JS bundle, its icon font and a stylesheet referencing it) to static_dir, along with
+    gzip-compressed copies. Assets already present with the same size are left alone, so
+    this only writes once per Evidently version. Each write goes through a uniquely named
+    temporary file, so concurrent report workers can call this safely.
+
+    """
+
+    os.makedirs(static_dir, exist_ok=True)
+    evidently_static = os.path.join(evidently.__path__[0], "nbextension", "static")
+
+    for src_name, dst_name in (
+        ("index.js", "evidently.js"),
+        ("material-ui-icons.woff2", "material-ui-icons.woff2"),
+    ):
+        src, dst = os.path.join(evidently_static, src_name), os.path.join(
+            static_dir, dst_name
+        )
+        if not os.path.exists(dst) or os.path.getsize(dst) != os.path.getsize(src):
+            tmp = unique_tmp_path(dst)
+            shutil.copyfile(src, tmp)
+            os.replace(tmp, dst)
+            gzip_copy(dst)
+
+    css_path = os.path.join(static_dir, "evidently.css")
+    if not os.path.exists(css_path):
+        tmp = unique_tmp_path(css_path)
+        with open(tmp, "w") as f:
+            f.write(SHARED_CSS)
+        os.replace(tmp, css_path)
+
+
+def save_shared_report(dashboard, path, max_points=None, static_url=STATIC_URL):
+    """
+    Save an Evidently dashboard as a small HTML shell that loads the shared assets (see
+    export_static_assets()) and a separate gzip-compressed JSON payload of the
+    dashboard's data, saved alongside it.
+
+    Returns:
+        str: path of the saved payload
+
+    """
+
+    payload = dashboard_payload(dashboard, max_points=max_points)
+    dashboard_id = payload["dashboard_info"]["name"]
+    report_dir = os.path.dirname(path)
+    payload_path = path[: -len(".html")] + ".dashboard.json.gz"
+
+    tmp_path = os.path.join(report_dir, f".{os.path.basename(payload_path)}.tmp")
+    with open(tmp_path, "wb") as f:
+        # serializing in one pass is much faster than streaming json.dump through gzip
+        data = json.dumps(payload, separators=(",", ":"), cls=NumpyEncoder)
+        f.write(gzip.compress(data.encode("utf-8"), compresslevel=6))
+    os.replace(tmp_path, payload_path)
+
+    tmp_path = os.path.join(report_dir, f".{os.path.basename(path)}.tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(
+            SHARED_HTML_TEMPLATE.format(
+                dashboard_id=dashboard_id,
+                static_url=static_url,
+                payload_url=PAYLOAD_URL + os.path.basename(payload_path),
+            )
+        )
+    os.replace(tmp_path, path)
+
+    return payload_path
+
+
+def build_evidently_report(
+    reference_df,
+    current_df,
+    current_date_range,
+    report_dir=REPORT_DIR,
+    export="standalone",
+    max_points=None,
+):
+    """
+    Constructs a set of Evidently.ai monitoring reports (Data Drift, Numerical
+    Target Drift, and Regression Performance) provided a reference and current
+    dataframe. Save the HTML report to disk for use as an Application.
+
+    With export="standalone", the report is a single self-contained HTML file (as
+    written by Dashboard.save(), embedding Evidently's JS bundle and icon font). With
+    export="shared", the bundle and font are written once to report_dir/static/ and the
+    report is a small HTML shell plus a gzip-compressed JSON payload of its data, which
+    the monitoring application serves (see save_shared_report()).
+
+    The report is written to a temporary file and moved into place once complete,
+    so a partially written report is never served, and a gzip-compressed copy is
+    saved alongside it for the monitoring application to serve.
+
+    Args:
+        reference_df (pd.Dataframe | src.reference_profile.ReferenceProfile)
+        current_df (pd.Dataframe)
+        current_date_range (tuple)
+        report_dir (str)
+        export (str): "standalone" or "shared"
+        max_points (int): if set, plots in a "shared" report are downsampled to at most
+            this many points per trace
+
+    Returns:
+        str: path of the saved report
+
+    """
+
+    dashboard = Dashboard(
+        tabs=[DataDriftTab, NumTargetDriftTab, RegressionPerformanceTab]
+    )
+
+    reference_data, current_data = prepare_report_data(reference_df, current_df)
+
+    dashboard.calculate(
+        reference_data=reference_data,
+        current_data=current_data,
+        column_mapping=COLUMN_MAP,
+    )
+
+    path = report_path(current_date_range, report_dir)
+    os.makedirs(report_dir, exist_ok=True)
+
+    if export == "shared":
+        export_static_assets(os.path.join(report_dir, "static"))
+        save_shared_report(dashboard, path, max_points=max_points)
+    else:
+        tmp_path = os.path.join(report_dir, f".{os.path.basename(path)}.tmp")
+        dashboard.save(tmp_path)
+        os.replace(tmp_path, path)
+
+    gzip_copy(path)
+    logger.info(f"Generated new Evidently report: {path}")
+
+    return path
+
+
+class ReportBuilder:
+    """A utility for building Evidently reports off the main simulation thread
+
+    Report calculation is CPU-heavy, so reports are built in a pool of worker processes.
+    Each submission returns a future that resolves to the saved report's path, letting
+    the simulation continue scoring the next batch while the report is calculated, and
+    wait on the future only before refreshing the monitoring application. Reports for
+    several batches can be calculated in parallel when max_workers > 1.
+
+    Evidently calculates a Dashboard's tabs against shared analyzer results within a
+    single pipeline, so the unit of parallelism is a whole report.
+
+    Attributes:
+        max_workers (int): number of worker processes
+        report_dir (str)
+        export (str): "standalone" or "shared" (see build_evidently_report())
+        max_points (int): maximum points per plot trace in "shared" reports
+
+    """
+
+    def __init__(
+        self, max_workers=2, report_dir=REPORT_DIR, export="standalone", max_points=None
+    ):
+        self.max_workers = max_workers
+        self.report_dir = report_dir
+        self.export = export
+        self.max_points = max_points
+
+        # export the shared assets once up front, rather than racing to from each worker
+        if export == "shared":
+            export_static_assets(os.path.join(report_dir, "static"))
+
+        # forking a process that is already running threads (the inference pools, or an
+        # emulated workspace) can leave the child blocked on a lock held by one of them, so
+        # workers are spawned; Python 3.6 can't set a pool's start method, so there they are
+        # forked immediately instead, before the simulation starts threads of its own
+        if sys.version_info >= (3, 7):
+            self._executor = concurrent.futures.ProcessPoolExecutor(
+                max_workers=max_workers, mp_context=multiprocessing.get_context("spawn")
+            )
+        else:
+            self._executor = concurrent.futures.ProcessPoolExecutor(
+                max_workers=max_workers
+            )
+            self._executor.submit(int).result()
+
+    def submit(self, reference_df, current_df, current_date_range):
+        """
+        Build a report in a worker process.
+
+        Returns:
+            concurrent.futures.Future: resolves to the saved report's path
+
+        """
+
+        return self._executor.submit(
+            build_evidently_report,
+            reference_df,
+            current_df,
+            current_date_range,
+            self.report_dir,
+            self.export,
+            self.max_points,
+        )
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
@@ -0,0 +1,344 @@
+# ###########################################################################
+#
+#  CLOUDERA APPLIED MACHINE LEARNING PROTOTYPE (AMP)
+#  (C) Cloudera, Inc. 2021
+#  All rights reserved.
+#
+#  Applicable Open Source License: Apache 2.0
+#
+#  NOTE: Cloudera open source products are modular software products
+#  made up of hundreds of individual components, each of which was
+#  individually copyrighted.  Each Cloudera open source product is a
+#  collective work under U.S. Copyright Law. Your license to use the
+#  collective work is as provided in your written agreement with
+#  Cloudera.  Used apart from the collective work, this file is
+#  licensed for your use pursuant to the open source license
+#  identified above.
+#
+#  This code is provided to you pursuant a written agreement with
+#  (i) Cloudera, Inc. or (ii) a third-party authorized to distribute
+#  this code. If you do not have a written agreement with Cloudera nor
+#  with an authorized and properly licensed third party, you do not
+#  have any rights to access nor to use this code.
+#
+#  Absent a written agreement with Cloudera, Inc. (“Cloudera”) to the
+#  contrary, A) CLOUDERA PROVIDES THIS CODE TO YOU WITHOUT WARRANTIES OF ANY
+#  KIND; (B) CLOUDERA DISCLAIMS ANY AND ALL EXPRESS AND IMPLIED
+#  WARRANTIES WITH RESPECT TO THIS CODE, INCLUDING BUT NOT LIMITED TO
+#  IMPLIED WARRANTIES OF TITLE, NON-INFRINGEMENT, MERCHANTABILITY AND
+#  FITNESS FOR A PARTICULAR PURPOSE; (C) CLOUDERA IS NOT LIABLE TO YOU,
+#  AND WILL NOT DEFEND, INDEMNIFY, NOR HOLD YOU HARMLESS FOR ANY CLAIMS
+#  ARISING FROM OR RELATED TO THE CODE; AND (D)WITH RESPECT TO YOUR EXERCISE
+#  OF ANY RIGHTS GRANTED TO YOU FOR THE CODE, CLOUDERA IS NOT LIABLE FOR ANY
+#  DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, PUNITIVE OR
+#  CONSEQUENTIAL DAMAGES INCLUDING, BUT NOT LIMITED TO, DAMAGES
+#  RELATED TO LOST REVENUE, LOST PROFITS, LOSS OF INCOME, LOSS OF
+#  BUSINESS ADVANTAGE OR UNAVAILABILITY, OR LOSS OR CORRUPTION OF
+#  DATA.
+#
+# ###########################################################################
+
+import threading
+import numpy as np
+import pandas as pd
+
+from src.drift import jensen_shannon_distance, population_stability_index
+from src.columns import TARGET, PREDICTION, CAT_FEATURES
+from src.utils import scale_prices
+
+WINDOWS = (7, 30, 90)
+
+# category under which records missing a categorical value are counted
+MISSING_CATEGORY = "(missing)"
+
+
+class RollingMetrics:
+    """Rolling-window drift and regression error, maintained incrementally
+
+    Newly sold records are reduced to per-day aggregates keyed on date_sold: record
+    count, error sums (for mean error, MAE and RMSE), counts within the reference
+    profile's histogram bins for each numerical column and category counts for each
+    categorical column. Each aggregate is additive, so records for a day that already
+    exists simply add into it.
+
+    Alongside the per-day rows, prefix sums over days are kept, so the aggregate of any
+    window of days is the difference of two prefix-sum rows. Every window (and the whole
+    history since deployment) is therefore summarized from a single update per batch,
+    without re-scanning earlier records; adding another window costs two lookups.
+
+    The per-day rows and prefix sums live in buffers whose capacity (in days) doubles
+    whenever it is exceeded, so a batch of new days usually only writes into spare rows
+    rather than reallocating every array.
+
+    Missing values are handled explicitly: records without a sold date can't be placed
+    in any window and are skipped; a missing numerical value is left out of that
+    column's bin counts, and records missing a target or prediction are left out of the
+    error aggregates; a missing categorical value is counted under MISSING_CATEGORY.
+
+    Drift within each window is measured as PSI and Jensen-Shannon distance between the
+    window's bin/category counts and the reference profile's.
+
+    Attributes:
+        profile (src.reference_profile.ReferenceProfile): reference bins and frequencies
+        windows (tuple): window lengths in days
+        psi_threshold (float): PSI at or above which a column is considered drifted
+        days (np.ndarray): sorted day numbers (days since epoch) with aggregates
+        capacity (int): number of days the per-day buffers can hold before growing
+
+    """
+
+    def __init__(
+        self,
+        profile,
+        windows=WINDOWS,
+        cat_features=CAT_FEATURES,
+        psi_threshold=0.2,
+    ):
+        self.profile = profile
+        self.windows = tuple(windows)
+        self.psi_threshold = psi_threshold
+        self.num_columns = list(profile.bin_edges)
+        self.cat_columns = [
+            c for c in cat_features if c in profile.category_frequencies
+        ]
+
+        # per-column category vocabularies; each column's counts grow with its vocabulary
+        self.categories = {
+            c: list(profile.category_frequencies[c]) for c in self.cat_columns
+        }
+
+        self.capacity = 0
+        self._days = np.empty(0, dtype=np.int64)
+        self._n_days = 0
+        self._daily = {}
+        self._prefix = {}
+        self._lock = threading.Lock()
+
+    @property
+    def days(self):
+        return self._days[: self._n_days]
+
+    def _day_aggregates(self, df):
+        """Reduce records to one row of each aggregate per distinct sold date."""
+
+        df = scale_prices(df)
+        dates = pd.to_datetime(df["date_sold"])
+        df, dates = df[dates.notna().to_numpy()], dates[dates.notna()]
+
+        days = dates.values.astype("datetime64[D]").astype(np.int64)
+        unique_days, day_index = np.unique(days, return_inverse=True)
+        n_days = len(unique_days)
+
+        def per_day(values):
+            # sum rows of values (n_records x k) into n_days x k
+            out = np.zeros((n_days, values.shape[1]))
+            np.add.at(out, day_index, values)
+            return out
+
+        def per_day_counts(codes, k, mask=slice(None)):
+            # count codes (one per record, in range(k)) into n_days x k
+            out = np.zeros((n_days, k))
+            np.add.at(out, (day_index[mask], codes[mask]), 1)
+            return out
+
+        aggregates = {}
+
+        if TARGET in df and PREDICTION in df:
+            errors = (df[PREDICTION] - df[TARGET]).to_numpy(dtype=float)
+        else:
+            errors = np.zeros(len(df))
+        scored = np.isfinite(errors)
+        errors = np.where(scored, errors, 0.0)
+        aggregates["errors"] = per_day(
+            np.column_stack([scored, errors, np.abs(errors), errors**2])
+        )
+
+        for column in self.num_columns:
+            if column in df:
+                edges = self.profile.bin_edges[column]
+                values = df[column].to_numpy(dtype=float)
+                codes = np.searchsorted(edges[1:-1], values, side="right")
+                aggregates[column] = per_day_counts(
+                    codes, max(len(edges) - 1, 1), mask=~np.isnan(values)
+                )
+
+        for column in self.cat_columns:
+            if column in df:
+                values = df[column].astype(object).where(df[column].notna())
+                values = values.fillna(MISSING_CATEGORY)
+                vocabulary = self.categories[column]
+                index = {category: j for j, category in enumerate(vocabulary)}
+                for category in pd.unique(values):
+                    if category not in index:
+                        index[category] = len(vocabulary)
+                        vocabulary.append(category)
+                codes = values.map(index).to_numpy(dtype=np.int64)
+                aggregates[column] = per_day_counts(codes, len(vocabulary))
+
+        return unique_days, aggregates
+
+    def _reserve(self, n_days):
+        """Grow the per-day buffers, doubling their capacity, to hold at least n_days."""
+
+        if n_days <= self.capacity:
+            return
+
+        capacity = max(n_days, 2 * self.capacity, 16)
+        days = np.zeros(capacity, dtype=np.int64)
+        days[: self._n_days] = self.days
+        self._days = days
+
+        for name, daily in self._daily.items():
+            grown = np.zeros((capacity, daily.shape[1]))
+            grown[: self._n_days] = daily[: self._n_days]
+            self._daily[name] = grown
+
+            prefix = np.zeros((capacity + 1, daily.shape[1]))
+            prefix[: self._n_days + 1] = self._prefix[name][: self._n_days + 1]
+            self._prefix[name] = prefix
+
+        self.capacity = capacity
+
+    def _widen(self, name, k):
+        """Make room for k columns in an aggregate, e.g. after new categories appear."""
+
+        daily = self._daily.get(name)
+        if daily is not None and daily.shape[1] >= k:
+            return
+
+        # counts of new columns are zero on every earlier day, so the prefix sums of the
+        # existing columns carry over unchanged
+        widened = np.zeros((self.capacity, k))
+        prefix = np.zeros((self.capacity + 1, k))
+        if daily is not None:
+            widened[:, : daily.shape[1]] = daily
+            prefix[:, : daily.shape[1]] = self._prefix[name]
+        self._daily[name] = widened
+        self._prefix[name] = prefix
+
+    def update(self, df):
+        """
+        Add a batch of newly sold records (as returned by Simulation.query_model_metrics())
+        to the per-day aggregates and bring the prefix sums up to date.
+        """
+
+        if not len(df):
+            return
+
+        with self._lock:
+            new_days, new_aggregates = self._day_aggregates(df)
+            if not len(new_days):
+                return
+
+            days = np.union1d(self.days, new_days)
+            old_positions = np.searchsorted(days, self.days)
+            new_positions = np.searchsorted(days, new_days)
+            n_old = self._n_days
+
+            self._reserve(len(days))
+            for name, values in new_aggregates.items():
+                self._widen(name, values.shape[1])
+
+            if (old_positions != np.arange(n_old)).any():
+                # a batch reaching back before the latest day: shift existing rows into place
+                for daily in self._daily.values():
+                    rows = daily[:n_old].copy()
+                    daily[: len(days)] = 0
+                    daily[old_positions] = rows
+
+            self._days[: len(days)] = days
+            self._n_days = len(days)
+
+            for name, values in new_aggregates.items():
+                self._daily[name][new_positions, : values.shape[1]] += values
+
+            # days before the earliest touched day keep their prefix sums
+            first = int(new_positions.min())
+            for name, daily in self._daily.items():
+                prefix = self._prefix[name]
+                prefix[first + 1 : len(days) + 1] = prefix[first] + np.cumsum(
+                    daily[first : len(days)], axis=0
+                )
+
+    def window(self, start_day=None, end_day=None):
+        """Aggregates over day numbers in [start_day, end_day] (all days if None)."""
+
+        lo = 0 if start_day is None else np.searchsorted(self.days, start_day, "left")
+        hi = (
+            len(self.days)
+            if end_day is None
+            else np.searchsorted(self.days, end_day, side="right")
+        )
+
+        return {name: prefix[hi] - prefix[lo] for name, prefix in self._prefix.items()}
+
+    def _window_results(self, aggregates):
+        n, error_sum, abs_error_sum, sq_error_sum = aggregates["errors"]
+        results = {"n_records": int(n)}
+        if not n:
+            return results
+
+        results["regression_performance"] = {
+            "mean_error": float(error_sum / n),
+            "mean_abs_error": float(abs_error_sum / n),
+            "rmse": float(np.sqrt(sq_error_sum / n)),
+        }
+
+        drift = {}
+        for column in self.num_columns:
+            if column in aggregates:
+                drift[column] = self._drift(
+                    self.profile.histograms[column], aggregates[column]
+                )
+        for column in self.cat_columns:
+            if column in aggregates:
+                frequencies = self.profile.category_frequencies[column]
+                reference = np.array(
+                    [frequencies.get(c, 0.0) for c in self.categories[column]]
+                )
+                drift[column] = self._drift(reference, aggregates[column])
+
+        results["features"] = drift
+        results["n_drifted_features"] = sum(d["drift_detected"] for d in drift.values())
+
+        return results
+
+    def _drift(self, reference_counts, current_counts):
+        psi = population_stability_index(reference_counts, current_counts)
+        return {
+            "psi": psi,
+            "jensen_shannon": jensen_shannon_distance(reference_counts, current_counts),
+            "drift_detected": psi >= self.psi_threshold,
+        }
+
+    def summary(self, as_of=None):
+        """
+        Drift and regression error for every rolling window ending on as_of (defaults
+        to the latest sold date seen) and for all records since deployment.
+
+        Returns:
+            dict: JSON-serializable results keyed by window name ("7d", ..., "since_deploy")
+
+        """
+
+        with self._lock:
+            if not len(self.days):
+                return {}
+
+            end_day = (
+                self.days[-1]
+                if as_of is None
+                else pd.Timestamp(as_of)
+                .to_datetime64()
+                .astype("datetime64[D]")
+                .astype(np.int64)
+            )
+
+            results = {"as_of": str(np.datetime64(int(end_day), "D"))}
+            for days in self.windows:
+                results[f"{days}d"] = self._window_results(
+                    self.window(end_day - days + 1, end_day)
+                )
+            results["since_deploy"] = self._window_results(self.window(None, end_day))
+
+            return results
@@ -38,34 +38,42 @@
 #
 # ###########################################################################
 
-import os
 import cdsw
+import queue
+import concurrent.futures
 import logging
+import threading
 import numpy as np
 import pandas as pd
 from typing import Dict
 from tqdm import tqdm
 from pandas.tseries.offsets import DateOffset
-from evidently.dashboard import Dashboard
-from evidently.tabs import DataDriftTab, NumTargetDriftTab, RegressionPerformanceTab
 
-from src.utils import scale_prices
 from src.api import ApiUtility
-from src.inference import ThreadedModelRequest
+from src.concurrency import AIMDLimiter
+from src.mapping import IdUuidMapping
+from src.metrics_cache import MetricsCache, format_metrics_response
+from src.metrics_mirror import MetricsMirror
+from src.metrics_summary import SUMMARY_PATH, update_metrics_summary
+from src.metrics_writer import DelayedMetricsWriter
+from src.drift import calculate_drift, save_drift_results
+from src.sketches import FeatureSketches
+from src.reference_profile import PROFILE_DIR, ReferenceProfile
+from src.rolling import WINDOWS, RollingMetrics
+from src.report_index import publish_report
+from src.columns import CAT_FEATURES, NUM_FEATURES, PREDICTION
+from src.reporting import (
+    REPORT_DIR,
+    ReportBuilder,
+    build_evidently_report,
+    prepare_report_data,
+    report_path,
+)
+from src.inference import ThreadedModelRequest, AsyncModelRequest, IdUuidCheckpoint
+
+INFERENCE_ENGINES = {"threaded": ThreadedModelRequest, "async": AsyncModelRequest}
 
 logger = logging.getLogger(__name__)
-logger.setLevel(logging.INFO)
-
-formatter = logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
-
-log_file = "logs/simulation.log"
-os.makedirs(os.path.dirname(log_file), exist_ok=True)
-file_handler = logging.FileHandler(log_file)
-file_handler.setLevel(logging.DEBUG)
-file_handler.setFormatter(formatter)
-
-if not logger.handlers:
-    logger.addHandler(file_handler)
 
 
 class Simulation:
@@ -84,122 +92,545 @@ class Simulation:
             - Query the prod_df for newly *listed* recrods and score them using deployed model
             - Query the prod_df for newly *sold* records and add ground truths to metric store
             - Query the metric store for thoes newly *sold* records and generate new Evidently report
-            - Redeploy the hosted Application to surface the new monitoring report
+            - Publish the new monitoring report to the hosted Application (deployed once, then updated live)
 
     Attributes:
         api (src.api.ApiUtility): utility class for help with CML APIv2 calls
         latest_deployment_details (dict): config info about deployed model
-        tmr (src.inference.ThreadedModelRequest): utility for making concurrent model API calls
-        master_id_uuid_mapping (dict): lookup between input data ID's and predictionUuids
+        tmr (src.inference.ThreadedModelRequest | src.inference.AsyncModelRequest): utility for
+            making concurrent model API calls, selected by the inference_engine argument
+            ("threaded" or "async")
+        master_id_uuid_mapping (src.mapping.IdUuidMapping): compact, indexed lookup between input
+            data ID's and predictionUuids; optionally memory-mapped from mapping_spill_path
         dev_mode (bool): flag for running simulation with 5% of total data
         sample_size (float): fraction of data to run simulation with
+        checkpoint (src.inference.IdUuidCheckpoint): optional on-disk record of scored
+            id-uuid pairs, so a rerun only scores records that are still missing
+        metrics_writer (src.metrics_writer.DelayedMetricsWriter): utility for concurrently
+            writing delayed metrics to the metric store
+        metrics_cache (src.metrics_cache.MetricsCache): incremental view of the metric store
+            used to query newly sold records; None if incremental_metrics is False
+        metrics_mirror (src.metrics_mirror.MetricsMirror): opt-in local indexed copy of the metric store,
+            synced after each scoring window and on each write of delayed metrics, from which the metrics
+            of sold records are served by uuid. None (the default) if metrics_mirror_path is None
+        report_builder (src.reporting.ReportBuilder): pool of worker processes that build Evidently
+            reports off the main thread; None (build synchronously) if report_workers is 0
+        report_engine (str): "evidently" to build a full Evidently HTML report every batch, or "native"
+            to compute drift statistics with src.drift every batch (saved as compact JSON) and build the
+            Evidently report only on the first and last batch and every evidently_every batches
+        evidently_every (int): cadence of full Evidently reports when report_engine is "native"
+        report_export (str): "standalone" to save each Evidently report as a self-contained HTML file, or
+            "shared" to save Evidently's assets once and each report as a small HTML shell plus a compressed
+            JSON payload (see src.reporting.build_evidently_report)
+        report_max_points (int): maximum points per plot in "shared" reports; plots are not downsampled
+            if None
+        reference_profile_dir (str): directory of persisted reference profiles, keyed by deployment CRN
+        reference_profile (src.reference_profile.ReferenceProfile): profile of the train data metrics,
+            used as the reference of every batch's report; None until the train data is scored
+        rolling_windows (tuple): lengths in days of the rolling windows to monitor (besides since-deploy);
+            rolling metrics are disabled if empty
+        rolling_metrics (src.rolling.RollingMetrics): per-day aggregates of sold records, summarized
+            over each rolling window every batch; None until the reference profile is built
+        metrics_summary_path (str): location of the aggregate file of per-batch monitoring metrics
+            (see src.metrics_summary); not written if None
+        reference_sketches (src.sketches.FeatureSketches): streaming summary of the features and
+            predictions of the scored train data
+        current_sketches (src.sketches.FeatureSketches): streaming summary of the features and
+            predictions of the most recently scored batch; None until the first batch is scored
 
     """
 
-    def __init__(self, model_name: str, dev_mode: bool = False):
+    def __init__(
+        self,
+        model_name: str,
+        dev_mode: bool = False,
+        inference_engine: str = "threaded",
+        inference_batch_size: int = 1,
+        adaptive_concurrency: bool = False,
+        checkpoint_path: str = None,
+        delayed_metrics_threads: int = 8,
+        incremental_metrics: bool = True,
+        metrics_mirror_path: str = None,
+        mapping_spill_path: str = None,
+        report_workers: int = 2,
+        report_engine: str = "evidently",
+        evidently_every: int = 3,
+        reference_profile_dir: str = PROFILE_DIR,
+        rolling_windows: tuple = WINDOWS,
+        metrics_summary_path: str = SUMMARY_PATH,
+        report_export: str = "standalone",
+        report_max_points: int = None,
+    ):
+        if inference_engine not in INFERENCE_ENGINES:
+            raise ValueError(
+                f"inference_engine must be one of {list(INFERENCE_ENGINES)}, got {inference_engine!r}"
+            )
+        if report_export not in ("standalone", "shared"):
+            raise ValueError(
+                f"report_export must be one of ['standalone', 'shared'], got {report_export!r}"
+            )
+        if report_engine not in ("evidently", "native"):
+            raise ValueError(
+                f"report_engine must be one of ['evidently', 'native'], got {report_engine!r}"
+            )
+        if adaptive_concurrency and inference_engine != "threaded":
+            raise ValueError(
+                "adaptive_concurrency is only supported by the threaded inference engine"
+            )
+
+        engine_kwargs = {"batch_size": inference_batch_size}
+        if adaptive_concurrency:
+            engine_kwargs["limiter"] = AIMDLimiter()
+
         self.api = ApiUtility()
         self.latest_deployment_details = self.api.get_latest_deployment_details(
             model_name=model_name
         )
-        self.tmr = ThreadedModelRequest(self.latest_deployment_details)
-        self.master_id_uuid_mapping = {}
+        self.tmr = INFERENCE_ENGINES[inference_engine](
+            self.latest_deployment_details, **engine_kwargs
+        )
+        self.master_id_uuid_mapping = IdUuidMapping(spill_path=mapping_spill_path)
+        self.checkpoint = (
+            IdUuidCheckpoint(checkpoint_path) if checkpoint_path is not None else None
+        )
+        self.metrics_writer = DelayedMetricsWriter(n_threads=delayed_metrics_threads)
+        self.metrics_cache = (
+            MetricsCache(self.query_model_metrics) if incremental_metrics else None
+        )
+        self.report_builder = (
+            ReportBuilder(
+                max_workers=report_workers,
+                export=report_export,
+                max_points=report_max_points,
+            )
+            if report_workers > 0
+            else None
+        )
+        self.metrics_mirror = (
+            MetricsMirror(metrics_mirror_path)
+            if metrics_mirror_path is not None
+            else None
+        )
+        self.report_engine = report_engine
+        self.report_export = report_export
+        self.report_max_points = report_max_points
+        self.evidently_every = evidently_every
+        self.reference_profile_dir = reference_profile_dir
+        self.reference_profile = None
+        self.rolling_windows = rolling_windows
+        self.rolling_metrics = None
+        self.metrics_summary_path = metrics_summary_path
+        self.reference_sketches = self.new_sketches()
+        self.current_sketches = None
         self.dev_mode = dev_mode
         self.sample_size = 0.05 if self.dev_mode is True else 0.8
 
-    def run_simulation(self, train_df, prod_df):
-        """Operates the main logic to simulate a production scenario."""
+    def run_simulation(self, train_df, prod_df, pipelined=False):
+        """
+        Operates the main logic to simulate a production scenario.
+
+        If pipelined is True, the production batches are processed with run_pipelined_batches() so that
+        scoring, ground truth ingestion and reporting of consecutive batches overlap.
+
+        The report_builder's worker processes are shut down once the simulation ends, even if it fails.
+
+        """
+
+        try:
+            self.set_simulation_clock(prod_df, months_in_batch=1)
+
+            # sample data
+            train_df, prod_df = [
+                self.sample_dataframe(df, self.sample_size)
+                for df in (train_df, prod_df)
+            ]
+            self.partition_simulation_clock(prod_df)
+
+            # ------------------------ Training Data ------------------------
+            # make inference on training data so records are query-able, add
+            # ground truth prices to the metrics store, and query records for reporting
+            logger.info("------- Starting Section: Train Data -------")
+
+            train_inference_metadata = self.make_inference(
+                train_df, sketches=self.reference_sketches
+            )
+            formatted_metadata = self.format_metadata_for_delayed_metrics(
+                train_df, is_train=True
+            )
+            self.add_delayed_metrics(*formatted_metadata)
+
+            def query_train_store(uuids):
+                if self.metrics_cache is not None:
+                    return self.metrics_cache.query(uuids)
+
+                # records resumed from a checkpoint were scored by a previous run, outside of this
+                # run's scoring window, so if any train uuids are missing from the window the full
+                # store is read instead
+                train_uuids = set(uuids)
+                metrics_df = self.query_model_metrics(
+                    start_timestamp_ms=train_inference_metadata["start_timestamp_ms"],
+                    end_timestamp_ms=train_inference_metadata["end_timestamp_ms"],
+                )
+                if not train_uuids.issubset(metrics_df.predictionUuid):
+                    logger.info(
+                        "Train records resumed from a checkpoint, reading their metrics from the full store"
+                    )
+                    metrics_df = self.query_model_metrics()
+
+                return metrics_df[
+                    metrics_df.predictionUuid.isin(train_uuids)
+                ].reset_index(drop=True)
+
+            def query_train_metrics():
+                return self.query_metrics_by_uuid(
+                    formatted_metadata[0], query_train_store
+                )
+
+            # the reference is constant for a deployment, so it is profiled (and its metrics queried) only
+            # once, then reused by every batch's report
+            # reports sample as many reference rows as the batch has newly sold records, so the
+            # profile's sample is sized to the largest batch
+            self.reference_profile = ReferenceProfile.load_or_build(
+                query_train_metrics,
+                crn=self.latest_deployment_details["latest_deployment_crn"],
+                profile_dir=self.reference_profile_dir,
+                tag="dev" if self.dev_mode else "full",
+                sample_size=max(
+                    (len(positions) for positions in self.sold_batches), default=0
+                ),
+            )
+            if self.rolling_windows:
+                self.rolling_metrics = RollingMetrics(
+                    self.reference_profile, windows=self.rolling_windows
+                )
+
+            logger.info("------- Finished Section: Train Data -------")
+
+            # ----------------------- Production Data -----------------------
+
+            if pipelined:
+                self.run_pipelined_batches(prod_df, self.reference_profile)
+                return
+
+            # each batch's publishing is deferred until the next batch's report has been submitted, so
+            # report generation overlaps with scoring and ingestion of the following batch
+            pending_publish = None
+
+            for i in tqdm(
+                range(len(self.date_ranges)), total=len(self.date_ranges) + 1
+            ):
+
+                self.log_section(i, "Starting")
 
-        self.set_simulation_clock(prod_df, months_in_batch=1)
+                self.score_batch(prod_df, i)
+                sold_uuids = self.ingest_batch(prod_df, i)
+                report = self.report_batch(i, sold_uuids, self.reference_profile)
 
-        # sample data
-        train_df, prod_df = [
-            self.sample_dataframe(df, self.sample_size) for df in (train_df, prod_df)
+                if pending_publish is not None:
+                    self.publish_batch(*pending_publish)
+                pending_publish = (i, report)
+
+                self.log_section(i, "Finished")
+
+            if pending_publish is not None:
+                self.publish_batch(*pending_publish)
+        finally:
+            if self.report_builder is not None:
+                self.report_builder.shutdown()
+
+    def run_pipelined_batches(self, prod_df, reference_df, queue_size=1):
+        """
+        Operates the production section of the simulation as a staged pipeline, so that network-bound and
+        CPU-bound work for consecutive batches overlaps rather than running strictly in sequence.
+
+        Stages run in their own threads, connected by bounded queues (at most queue_size batches waiting
+        between stages):
+
+            1. score_batch   - make inference on newly *listed* records
+            2. ingest_batch  - track ground truths for newly *sold* records
+            3. report_batch + publish_batch (main thread) - query metrics, submit report, publish
+
+        Reports are built by the report_builder's worker processes, and each batch's publishing waits on
+        its report future only after the next batch's report has been submitted.
+
+        Because each stage consumes batches in order from a FIFO queue, batch i is only ingested once its
+        listings (and those of every earlier batch) have been scored, and only reported once its ground
+        truths have been added. Meanwhile, scoring of batch i+1 proceeds while batch i is being ingested and
+        reported. An exception in any stage stops the pipeline and is re-raised here.
+
+        Args:
+            prod_df (pd.DataFrame)
+            reference_df (src.reference_profile.ReferenceProfile | pd.DataFrame): profile of (or metrics for)
+                the training data, used as the report reference
+            queue_size (int): maximum number of batches buffered between consecutive stages
+
+        """
+
+        n_batches = len(self.date_ranges)
+        scored = queue.Queue(maxsize=queue_size)
+        ingested = queue.Queue(maxsize=queue_size)
+        stop = threading.Event()
+        errors = []
+
+        def put(q, item):
+            while not stop.is_set():
+                try:
+                    q.put(item, timeout=0.1)
+                    return
+                except queue.Full:
+                    continue
+
+        def get(q):
+            while not stop.is_set():
+                try:
+                    return q.get(timeout=0.1)
+                except queue.Empty:
+                    continue
+
+        def score_stage():
+            try:
+                for i in range(n_batches):
+                    self.log_section(i, "Starting")
+                    self.score_batch(prod_df, i)
+                    put(scored, i)
+            except Exception as e:
+                errors.append(e)
+                stop.set()
+            finally:
+                put(scored, None)
+
+        def ingest_stage():
+            try:
+                for i in iter(lambda: get(scored), None):
+                    put(ingested, (i, self.ingest_batch(prod_df, i)))
+            except Exception as e:
+                errors.append(e)
+                stop.set()
+            finally:
+                put(ingested, None)
+
+        threads = [
+            threading.Thread(target=score_stage, daemon=True),
+            threading.Thread(target=ingest_stage, daemon=True),
         ]
+        for thread in threads:
+            thread.start()
+
+        try:
+            pending_publish = None
+            with tqdm(total=n_batches) as progress:
+                for i, sold_uuids in iter(lambda: get(ingested), None):
+                    report = self.report_batch(i, sold_uuids, reference_df)
+
+                    if pending_publish is not None:
+                        self.publish_batch(*pending_publish)
+                    pending_publish = (i, report)
+
+                    self.log_section(i, "Finished")
+                    progress.update()
+
+            if pending_publish is not None and not errors:
+                self.publish_batch(*pending_publish)
+        finally:
+            stop.set()
+            for thread in threads:
+                thread.join()
 
-        # ------------------------ Training Data ------------------------
-        # make inference on training data so records are query-able, add
-        # ground truth prices to the metrics store, and query records for reporting
-        logger.info("------- Starting Section: Train Data -------")
+        if errors:
+            raise errors[0]
+
+    def score_batch(self, prod_df, i):
+        """
+        Slice prod_df for newly *listed* records from batch i and make inference, summarizing them in a
+        fresh set of sketches so drift against the train data is known as soon as the batch is scored.
+        """
+
+        new_listings_df = prod_df.iloc[self.listing_batches[i]]
+        sketches = self.new_sketches()
+        metadata = self.make_inference(new_listings_df, sketches=sketches)
+        self.current_sketches = sketches
+
+        drift = self.sketch_drift(sketches)
+        logger.info(
+            f"Sketch drift for scored batch {i}: {sum(d['drift_detected'] for d in drift.values())} of {len(drift)} columns drifted"
+        )
+
+        return metadata
+
+    @staticmethod
+    def new_sketches():
+        """Empty streaming sketches over the report's numerical/categorical features and the prediction."""
+
+        return FeatureSketches(NUM_FEATURES + [PREDICTION], CAT_FEATURES)
+
+    def sketch_drift(self, sketches=None):
+        """
+        Approximate drift of the scored records summarized by sketches (defaults to the most recently
+        scored batch) relative to the scored train data. Computed from the sketches alone, so it needs
+        neither the metric store nor the raw records.
+
+        Returns:
+            dict: column name to drift statistics (see src.sketches.FeatureSketches.drift)
+
+        """
+
+        sketches = sketches if sketches is not None else self.current_sketches
+        if sketches is None:
+            return {}
+
+        return sketches.drift(self.reference_sketches)
+
+    def ingest_batch(self, prod_df, i):
+        """
+        Slice prod_df for newly *sold* records from batch i and track their ground truths.
+
+        Returns:
+            list: prediction uuids of the newly sold records
+
+        """
 
-        train_inference_metadata = self.make_inference(train_df)
         formatted_metadata = self.format_metadata_for_delayed_metrics(
-            train_df, is_train=True
+            prod_df, positions=self.sold_batches[i], is_train=False
         )
         self.add_delayed_metrics(*formatted_metadata)
 
-        train_metrics_df = self.query_model_metrics(
-            **{
-                k: train_inference_metadata[k]
-                for k in train_inference_metadata
-                if k != "id_uuid_mapping"
-            }
-        )
+        return formatted_metadata[0]
 
-        logger.info("------- Finished Section: Train Data -------")
+    def report_batch(self, i, sold_uuids, reference_df):
+        """
+        Query the metric store for the newly sold records of batch i and build its drift report(s).
+
+        The batch's records are also added to the rolling window metrics (if any), whose summary is saved
+        as JSON alongside the report, and the rolling metrics and (with the "native" engine) the batch's
+        drift statistics and regression error are added to the aggregate metrics summary (if any) served
+        by the monitoring application's JSON API.
+
+        With the "native" report engine, drift statistics are computed in-process and saved as JSON, and
+        the (much slower) Evidently report is only built on the batches selected by use_evidently().
 
-        # ----------------------- Production Data -----------------------
+        Returns:
+            concurrent.futures.Future: resolves to the saved report's path once it has been built by the
+                report_builder (or immediately, if reports are built synchronously or not at all)
 
-        for i, date_range in tqdm(
-            enumerate(self.date_ranges), total=len(self.date_ranges) + 1
-        ):
+        """
 
-            formatted_date_range = " <--> ".join(
-                [ts.strftime("%Y-%m-%d") for ts in date_range]
+        # Note: because we cant query the store by UUID, either query only the scoring windows that hold
+        # the new_sold records (incremental), or query all records; then filter to new_sold by uuid
+        def query_store(uuids):
+            if self.metrics_cache is not None:
+                return self.metrics_cache.query(uuids)
+            metrics_df = self.query_model_metrics()
+            return metrics_df[metrics_df.predictionUuid.isin(uuids)]
+
+        new_sold_metrics_df = self.query_metrics_by_uuid(sold_uuids, query_store)
+
+        rolling = None
+        if self.rolling_metrics is not None:
+            self.rolling_metrics.update(new_sold_metrics_df)
+            rolling = self.rolling_metrics.summary()
+            rolling_path = report_path(self.date_ranges[i], extension="rolling.json")
+            save_drift_results(rolling, rolling_path)
+            logger.info(f"Updated rolling window metrics: {rolling_path}")
+
+        # drift is only calculated natively by the "native" engine; the Evidently engine calculates it in
+        # the report, so its summary entries carry the rolling window metrics only
+        drift = None
+        if self.report_engine == "native":
+            drift = calculate_drift(
+                *prepare_report_data(reference_df, new_sold_metrics_df)
             )
 
-            logger.info(
-                f"------- Starting Section {i+1}/{len(self.date_ranges)}: Prod Data ({formatted_date_range})-------"
+        if self.metrics_summary_path is not None:
+            update_metrics_summary(
+                self.date_ranges[i][1].strftime("%Y-%m-%d"),
+                drift,
+                n_records=len(new_sold_metrics_df),
+                rolling=rolling,
+                path=self.metrics_summary_path,
             )
+            logger.info(f"Updated metrics summary: {self.metrics_summary_path}")
 
-            # Query prod_df for newly *listed* records from this batch and make inference
-            # TO-DO: refactor this first call into self.make_inference()
-            new_listings_df = prod_df.loc[
-                prod_df.date_listed.between(
-                    date_range[0], date_range[1], inclusive="left"
-                )
-            ]
-            inference_metadata = self.make_inference(new_listings_df)
+        if self.report_engine == "native":
+            drift_path = report_path(self.date_ranges[i], extension="json")
+            save_drift_results(drift, drift_path)
+            logger.info(f"Generated new drift results: {drift_path}")
 
-            # Query prod_df for newly *sold* records from this batch and track ground truths
-            formatted_metadata = self.format_metadata_for_delayed_metrics(
-                prod_df, date_range, is_train=False
-            )
-            self.add_delayed_metrics(*formatted_metadata)
+            if not self.use_evidently(i):
+                report = concurrent.futures.Future()
+                report.set_result(drift_path)
+                return report
 
-            # Query metric store and build Evidently report
-            # Note: because we cant query by UUID, first query all records, then filter to new_sold by uuid
-            metrics_df = self.query_model_metrics()
-            new_sold_metrics_df = metrics_df[
-                metrics_df.predictionUuid.isin(formatted_metadata[0])
-            ]
+        if self.report_builder is not None:
+            return self.report_builder.submit(
+                reference_df, new_sold_metrics_df, self.date_ranges[i]
+            )
 
+        report = concurrent.futures.Future()
+        report.set_result(
             self.build_evidently_report(
-                reference_df=train_metrics_df,
+                reference_df=reference_df,
                 current_df=new_sold_metrics_df,
-                current_date_range=date_range,
+                current_date_range=self.date_ranges[i],
+                export=self.report_export,
+                max_points=self.report_max_points,
             )
+        )
+        return report
 
-            # Create/Refresh Monitoring Dashboard application
-            app_name = "Price Regressor Monitoring Dashboard"
+    def use_evidently(self, i):
+        """Whether a full Evidently report is built for batch i."""
 
-            if i == 0:
-                self.api.deploy_monitoring_application(application_name=app_name)
-            else:
-                self.api.restart_running_application(application_name=app_name)
+        if self.report_engine == "evidently":
+            return True
 
-            logger.info(
-                f"------- Finished Section {i+1}/{len(self.date_ranges)}: Prod Data ({formatted_date_range})-------"
+        return (
+            i == 0
+            or i == len(self.date_ranges) - 1
+            or (self.evidently_every > 0 and (i + 1) % self.evidently_every == 0)
+        )
+
+    def publish_batch(self, i, report):
+        """
+        Wait for batch i's report to be written, then publish the batch's files in the report manifest.
+
+        The Monitoring Dashboard application picks up newly published reports live, so it is only
+        deployed once (on the first batch) rather than restarted for every batch.
+        """
+
+        report.result()
+
+        publish_report(REPORT_DIR, self.date_ranges[i][1].strftime("%Y-%m-%d"))
+        logger.info(f"Published reports for batch {i}")
+
+        if i == 0:
+            self.api.deploy_monitoring_application(
+                application_name="Price Regressor Monitoring Dashboard"
             )
 
-    def make_inference(self, df):
+    def log_section(self, i, status):
+        formatted_date_range = " <--> ".join(
+            [ts.strftime("%Y-%m-%d") for ts in self.date_ranges[i]]
+        )
+
+        logger.info(
+            f"------- {status} Section {i+1}/{len(self.date_ranges)}: Prod Data ({formatted_date_range})-------"
+        )
+
+    def make_inference(self, df, sketches=None):
         """
-        Uses the instance's ThreadedModelRequest object to make inference on each record in input dataframe
+        Uses the instance's inference engine (ThreadedModelRequest or AsyncModelRequest) to make inference on each record in input dataframe
         by calling the deployed model endpoint.
 
         Additionally, this method updates the instance's master_id_uuid_mapping with new prediction metadata.
+        Records that could not be scored after retries are logged and returned under "failed_records". If the
+        instance has a checkpoint, previously scored records are resumed from it rather than re-scored.
+
+        If sketches (src.sketches.FeatureSketches) are provided, they are updated with the features and
+        predictions of the scored records.
 
         Args:
             df (pd.DataFrame)
+            sketches (src.sketches.FeatureSketches)
 
         Returns:
             dict: metadata about threaded API call including start/end timestamps and id-uuid mapping
@@ -210,18 +641,39 @@ class Simulation:
                                       5561000190: 'cf7340ec-35b8-4201-b342-111cd184babd',
                                       7575600100: 'de41cf61-4977-450d-a718-c7585b7624ad',
                                       2025700730: '7a3e8c56-8a0b-4b67-91f7-097bc5b8ba7d',
-                                      587550340: '74f5eb4f-e85b-4434-80f4-1c8ffb02821c'}
+                                      587550340: '74f5eb4f-e85b-4434-80f4-1c8ffb02821c'},
+                 'id_prediction_mapping': {1962200037: 487013.7, ...},
+                 'failed_records': []
                 }
         """
 
         records = self.cast_date_as_str_for_json(df).to_dict(orient="records")
-        metadata = self.tmr.threaded_call(records)
+        metadata = self.tmr.threaded_call(records, checkpoint=self.checkpoint)
 
         self.master_id_uuid_mapping.update(metadata["id_uuid_mapping"])
+        if self.metrics_cache is not None:
+            self.metrics_cache.register(metadata)
+        if self.metrics_mirror is not None:
+            self.sync_metrics_mirror(metadata)
+        if sketches is not None:
+            sketches.update(
+                df.assign(**{PREDICTION: df.id.map(metadata["id_prediction_mapping"])})
+            )
         logger.info(
             f'Made inference and updated the master_id_uuid_mapping with {len(metadata["id_uuid_mapping"])} records'
         )
 
+        if metadata["failed_records"]:
+            logger.warning(
+                f'Failed to score {len(metadata["failed_records"])} records after retries'
+            )
+
+        limiter = getattr(self.tmr, "limiter", None)
+        if limiter is not None and limiter.latency_ms is not None:
+            logger.info(
+                f"Adaptive concurrency limit at {limiter.limit} with smoothed latency of {limiter.latency_ms:.1f}ms"
+            )
+
         return metadata
 
     def set_simulation_clock(self, prod_df, months_in_batch=1):
@@ -264,7 +716,41 @@ class Simulation:
 
         self.date_ranges = date_ranges
 
-    def format_metadata_for_delayed_metrics(self, df, date_range=None, is_train=False):
+    def partition_simulation_clock(self, prod_df):
+        """
+        Precompute, once, the row positions in prod_df belonging to each batch of the simulation clock, for
+        both newly *listed* (date_listed) and newly *sold* (date_sold) records.
+
+        Each date column is sorted once and the batch boundaries located with a binary search, so every batch
+        becomes a cheap positional slice rather than a full scan of prod_df with between(). Positions within
+        a batch are kept in their original row order. Batches include their start date and exclude their end
+        date, matching the date ranges set by set_simulation_clock().
+
+        Args:
+            prod_df (pd.DataFrame): the (sampled) production dataframe the simulation iterates over
+
+        """
+
+        # consecutive date ranges share boundaries, so batch i spans boundaries[i] to boundaries[i+1]
+        boundaries = pd.to_datetime(
+            [date_range[0] for date_range in self.date_ranges]
+            + [self.date_ranges[-1][1]]
+        ).values
+
+        def partition(column):
+            values = prod_df[column].values
+            order = np.argsort(values, kind="mergesort")
+            edges = np.searchsorted(values[order], boundaries, side="left")
+            return [np.sort(order[lo:hi]) for lo, hi in zip(edges[:-1], edges[1:])]
+
+        self.listing_batches = partition("date_listed")
+        self.sold_batches = partition("date_sold")
+
+        logger.info(f"Simulation clock partitioned {len(prod_df)} records into batches")
+
+    def format_metadata_for_delayed_metrics(
+        self, df, date_range=None, is_train=False, positions=None
+    ):
         """
         In order to add delayed metrics to the metric store via cdsw.track_delayed_metrics(), we must pass in
         list of metrics to track along with a list of corresponding uuids that the metrics should join to. This
@@ -275,63 +761,139 @@ class Simulation:
             - use the full train_df to lookup the prediction_uuid's given the record id using the master_id_uuid_mapping
 
         If batch from production dataset:
-            - first pull all the "sold" records within the current batch's date range
+            - first pull all the "sold" records within the current batch (by precomputed positions from
+              partition_simulation_clock(), or else by the batch's date range)
             - then lookup the prediction_uuid's given the record id using the master_id_uuid_mapping
 
         Args:
             df (pd.DataFrame): either the train_df or prod_df
-            date_range (tuple): start and end dates; must be populated if is_train=False
+            date_range (tuple): start and end dates; must be populated if is_train=False and positions is None
+            positions (np.ndarray): row positions of the batch's newly sold records in df
 
         """
 
         if not is_train:
 
-            assert date_range is not None
+            if positions is not None:
+                # slice records from prod_df that were newly "sold" in this batch
+                new_sold_records = df.iloc[positions]
+            else:
+                assert date_range is not None
 
-            # query records from prod_df that were newly "sold" in this batch
-            new_sold_records = df.loc[
-                df.date_sold.between(date_range[0], date_range[1], inclusive="left")
-            ]
+                # query records from prod_df that were newly "sold" in this batch
+                new_sold_records = df.loc[
+                    df.date_sold.between(date_range[0], date_range[1], inclusive="left")
+                ]
         else:
             # for train dataset, all records are "newly sold"
-            new_sold_records = df.copy()
+            new_sold_records = df
 
-        # lookup uuids from newly sold records
-        uuids = new_sold_records.id.apply(
-            lambda x: self.master_id_uuid_mapping[x]
-        ).tolist()
+        # lookup uuids from newly sold records in a single vectorized join; the ground truth
+        # prices and sold dates come from the same rows, so no further scans of df are needed
+        uuids = self.master_id_uuid_mapping.lookup(new_sold_records.id)
+        has_uuid = pd.notna(uuids)
 
-        # get list of ground truth prices for newly sold properties
-        gts = df[df.id.isin(new_sold_records.id)].price.tolist()
+        if not has_uuid.all():
+            logger.warning(
+                f"Skipping {(~has_uuid).sum()} newly sold records without a prediction uuid"
+            )
 
-        # get list of sold_dates for newly sold properties
-        sold_dates = df[df.id.isin(new_sold_records.id)].date_sold.astype(str).tolist()
+        new_sold_records = new_sold_records[has_uuid]
 
-        return uuids, gts, sold_dates
+        return (
+            uuids[has_uuid].tolist(),
+            new_sold_records.price.tolist(),
+            new_sold_records.date_sold.astype(str).tolist(),
+        )
 
     def add_delayed_metrics(self, uuids, ground_truths, sold_dates):
         """
         Add delayed metrics to CML Model Metrics database provided a list of prediction UUID's
         and corresponding list of metrics (ground truth values and sold dates).
 
+        Writes are made concurrently (with retries) by the instance's DelayedMetricsWriter. If the local
+        metrics_mirror is enabled, the written metrics are merged into it as well.
+
         Args:
             uuids (list)
             ground_truths (list)
             sold_dates (list)
 
+        Returns:
+            dict: summary of the write from DelayedMetricsWriter.write()
+
         """
 
-        if len(uuids) != len(ground_truths) != len(sold_dates):
+        if not len(uuids) == len(ground_truths) == len(sold_dates):
             raise ValueError(
                 "UUIDs, ground_truths, and sold_dates must be of same length and correspond by index."
             )
 
-        for uuid, gt, ds in zip(uuids, ground_truths, sold_dates):
-            cdsw.track_delayed_metrics(
-                metrics={"ground_truth": gt, "date_sold": ds}, prediction_uuid=uuid
+        stats = self.metrics_writer.write(uuids, ground_truths, sold_dates)
+
+        if self.metrics_mirror is not None:
+            failed = set(stats["failed_uuids"])
+            written = [
+                (uuid, {"ground_truth": gt, "date_sold": ds})
+                for uuid, gt, ds in zip(uuids, ground_truths, sold_dates)
+                if uuid not in failed
+            ]
+            if written:
+                unmirrored = self.metrics_mirror.track_delayed(*zip(*written))
+                if unmirrored:
+                    logger.info(
+                        f"{len(unmirrored)} records with new ground truths are not in the metrics mirror"
+                    )
+
+        logger.info(
+            f'Sucessfully added ground truth values to {stats["n_written"]} records ({stats["records_per_s"]:.0f} records/s)'
+        )
+        if stats["failed_uuids"]:
+            logger.warning(
+                f'Failed to add ground truth values to {len(stats["failed_uuids"])} records after retries'
             )
 
-        logger.info(f"Sucessfully added ground truth values to {len(uuids)} records")
+        return stats
+
+    def sync_metrics_mirror(self, inference_metadata, slack_ms=60_000):
+        """
+        Read the records of a scoring window (as returned by make_inference()) from the metric store into
+        the local metrics_mirror. slack_ms is added around the window to absorb clock skew between the
+        client and the model replicas.
+        """
+
+        response = cdsw.read_metrics(
+            model_deployment_crn=self.latest_deployment_details[
+                "latest_deployment_crn"
+            ],
+            start_timestamp_ms=inference_metadata["start_timestamp_ms"] - slack_ms,
+            end_timestamp_ms=inference_metadata["end_timestamp_ms"] + slack_ms,
+        )
+        n_records = self.metrics_mirror.upsert(response)
+        logger.info(f"Mirrored {n_records} records of the scoring window")
+
+    def query_metrics_by_uuid(self, uuids, query_store):
+        """
+        Metrics of a list of prediction uuids, as a formatted dataframe.
+
+        If the local metrics_mirror is enabled, the records it holds are served from it with an indexed
+        lookup, and only the remainder are read from the metric store with query_store(uuids). Otherwise
+        all of them are read with query_store(uuids).
+        """
+
+        if self.metrics_mirror is None:
+            return query_store(uuids)
+
+        mirrored = self.format_model_metrics_query(self.metrics_mirror.get(uuids))
+        if self.metrics_cache is not None:
+            self.metrics_cache.discard(mirrored.predictionUuid)
+
+        missing = list(set(uuids) - set(mirrored.predictionUuid))
+        if not missing:
+            return mirrored
+
+        logger.info(f"Reading {len(missing)} records missing from the metrics mirror")
+        return pd.concat([mirrored, query_store(missing)], ignore_index=True)
 
     def query_model_metrics(self, **kwargs):
         """
@@ -341,6 +903,9 @@ class Simulation:
         Query metrics for the model deployment saved in self.latest_deployment_details. Optionally, can pass
         additional arguments to indicate start/end timestamp.
 
+        If the local metrics_mirror is enabled, every record read is also upserted into it, which adds
+        a write of every response (the whole store, on the non-incremental path) to each query.
+
         """
 
         ipt = {}
@@ -351,7 +916,11 @@ class Simulation:
         if kwargs:
             ipt.update(kwargs)
 
-        return self.format_model_metrics_query(cdsw.read_metrics(**ipt))
+        response = cdsw.read_metrics(**ipt)
+        if self.metrics_mirror is not None:
+            self.metrics_mirror.upsert(response)
+
+        return self.format_model_metrics_query(response)
 
     @staticmethod
     def sample_dataframe(df, fraction):
@@ -387,74 +956,28 @@ class Simulation:
             metrics (dict)
 
         Returns:
-            pd.DataFrame
+            pd.DataFrame: empty, with a predictionUuid column, if the response holds no records
         """
-        metrics = pd.json_normalize(metrics["metrics"])
-
-        return metrics[
-            [col for col in metrics.columns if col.split(".")[0] == "metrics"]
-            + ["predictionUuid"]
-        ].rename(columns={col: col.split(".")[-1] for col in metrics.columns})
+        return format_metrics_response(metrics)
 
     @staticmethod
-    def build_evidently_report(reference_df, current_df, current_date_range):
+    def build_evidently_report(reference_df, current_df, current_date_range, **kwargs):
         """
-        Constructs a set of Evidently.ai monitoring reports (Data Drift, Numerical
-        Target Drift, and Regression Performance) provided a reference and current
-        dataframe. Save the HTML report to disk for use as an Application.
-
-        Reports are named by the end date of the provided date range.
+        Synchronously constructs a set of Evidently.ai monitoring reports (Data Drift, Numerical
+        Target Drift, and Regression Performance) provided a reference and current dataframe, and
+        saves the HTML report to disk for use as an Application. See src.reporting.build_evidently_report.
 
         Args:
             reference_df (pd.Dataframe)
             current_df (pd.Dataframe)
             current_date_range (tuple)
+            **kwargs: export options passed to src.reporting.build_evidently_report
 
-        """
-
-        TARGET = "ground_truth"
-        PREDICTION = "predicted_result"
-        NUM_FEATURES = ["sqft_living", "sqft_lot", "sqft_above"]
-        CAT_FEATURES = [
-            "waterfront",
-            "zipcode",
-            "condition",
-            "view",
-            "bedrooms",
-            "bathrooms",
-        ]
-
-        column_map = {
-            "target": TARGET,
-            "prediction": PREDICTION,
-            "numerical_features": NUM_FEATURES,
-            "categorical_features": CAT_FEATURES,
-            "datetime": None,
-        }
-
-        dashboard = Dashboard(
-            tabs=[DataDriftTab, NumTargetDriftTab, RegressionPerformanceTab]
-        )
+        Returns:
+            str: path of the saved report
 
-        dashboard.calculate(
-            reference_data=scale_prices(reference_df)
-            .sample(n=len(current_df), random_state=42)
-            .set_index("date_sold", drop=True)
-            .sort_index()
-            .round(2),
-            current_data=scale_prices(current_df)
-            .set_index("date_sold", drop=True)
-            .sort_index()
-            .round(2),
-            column_mapping=column_map,
-        )
+        """
 
-        report_dir = "apps/reports/"
-        report_path = os.path.join(
-            report_dir,
-            f'{current_date_range[1].strftime("%Y-%m-%d")}_price_regressor.html',
+        return build_evidently_report(
+            reference_df, current_df, current_date_range, **kwargs
         )
-
-        os.makedirs(report_dir, exist_ok=True)
-        dashboard.save(report_path)
-        logger.info(f"Generated new Evidently report: {report_path}")
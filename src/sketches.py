@@ -0,0 +1,280 @@
+# ###########################################################################
+#
+#  CLOUDERA APPLIED MACHINE LEARNING PROTOTYPE (AMP)
+#  (C) Cloudera, Inc. 2021
+#  All rights reserved.
+#
+#  Applicable Open Source License: Apache 2.0
+#
+#  NOTE: Cloudera open source products are modular software products
+#  made up of hundreds of individual components, each of which was
+#  individually copyrighted.  Each Cloudera open source product is a
+#  collective work under U.S. Copyright Law. Your license to use the
+#  collective work is as provided in your written agreement with
+#  Cloudera.  Used apart from the collective work, this file is
+#  licensed for your use pursuant to the open source license
+#  identified above.
+#
+#  This code is provided to you pursuant a written agreement with
+#  (i) Cloudera, Inc. or (ii) a third-party authorized to distribute
+#  this code. If you do not have a written agreement with Cloudera nor
+#  with an authorized and properly licensed third party, you do not
+#  have any rights to access nor to use this code.
+#
+#  Absent a written agreement with Cloudera, Inc. (“Cloudera”) to the
+#  contrary, A) CLOUDERA PROVIDES THIS CODE TO YOU WITHOUT WARRANTIES OF ANY
+#  KIND; (B) CLOUDERA DISCLAIMS ANY AND ALL EXPRESS AND IMPLIED
+#  WARRANTIES WITH RESPECT TO THIS CODE, INCLUDING BUT NOT LIMITED TO
+#  IMPLIED WARRANTIES OF TITLE, NON-INFRINGEMENT, MERCHANTABILITY AND
+#  FITNESS FOR A PARTICULAR PURPOSE; (C) CLOUDERA IS NOT LIABLE TO YOU,
+#  AND WILL NOT DEFEND, INDEMNIFY, NOR HOLD YOU HARMLESS FOR ANY CLAIMS
+#  ARISING FROM OR RELATED TO THE CODE; AND (D)WITH RESPECT TO YOUR EXERCISE
+#  OF ANY RIGHTS GRANTED TO YOU FOR THE CODE, CLOUDERA IS NOT LIABLE FOR ANY
+#  DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, PUNITIVE OR
+#  CONSEQUENTIAL DAMAGES INCLUDING, BUT NOT LIMITED TO, DAMAGES
+#  RELATED TO LOST REVENUE, LOST PROFITS, LOSS OF INCOME, LOSS OF
+#  BUSINESS ADVANTAGE OR UNAVAILABILITY, OR LOSS OR CORRUPTION OF
+#  DATA.
+#
+# ###########################################################################
+
+import numpy as np
+import pandas as pd
+from scipy.stats import kstwo
+
+from src.drift import (
+    chi_square_test,
+    jensen_shannon_distance,
+    population_stability_index,
+)
+
+
+class KLLSketch:
+    """A mergeable quantile sketch (KLL) for a stream of numerical values
+
+    Values are held in a hierarchy of compactors. Level h holds items that each stand
+    for 2**h original values; when a level exceeds its capacity it is sorted and every
+    other item (from a random offset) is promoted to the next level. Capacities shrink
+    geometrically towards the lower levels, so memory stays O(k) regardless of how many
+    values are added, while rank queries have error of roughly 1/k.
+
+    Sketches built on separate streams can be merged, which makes them suitable for
+    combining per-batch or per-worker summaries.
+
+    Attributes:
+        k (int): accuracy parameter; capacity of the top compactor
+        n (int): number of values added
+
+    """
+
+    C = 2 / 3
+
+    def __init__(self, k=200, seed=None):
+        self.k = k
+        self.n = 0
+        self.levels = [np.empty(0)]
+        self._rng = np.random.RandomState(seed)
+
+    def _capacity(self, level):
+        depth = len(self.levels) - level - 1
+        return max(2, int(np.ceil(self.k * self.C**depth)))
+
+    def update(self, values):
+        """Add an array-like of values to the sketch; NaNs are ignored."""
+
+        values = np.asarray(values, dtype=float).ravel()
+        values = values[~np.isnan(values)]
+        if not len(values):
+            return
+
+        self.n += len(values)
+        self.levels[0] = np.concatenate([self.levels[0], values])
+        self._compress()
+
+    def merge(self, other):
+        """Merge another KLLSketch into this one in place."""
+
+        while len(self.levels) < len(other.levels):
+            self.levels.append(np.empty(0))
+        for h, items in enumerate(other.levels):
+            self.levels[h] = np.concatenate([self.levels[h], items])
+
+        self.n += other.n
+        self._compress()
+        return self
+
+    def _compress(self):
+        h = 0
+        while h < len(self.levels):
+            if len(self.levels[h]) > self._capacity(h):
+                if h + 1 == len(self.levels):
+                    self.levels.append(np.empty(0))
+
+                items = np.sort(self.levels[h])
+                # keep an odd trailing item at this level so no weight is lost
+                if len(items) % 2:
+                    items, kept = items[:-1], items[-1:]
+                else:
+                    kept = np.empty(0)
+
+                promoted = items[self._rng.randint(2) :: 2]
+                self.levels[h + 1] = np.concatenate([self.levels[h + 1], promoted])
+                self.levels[h] = kept
+            h += 1
+
+    def _weighted_items(self):
+        items = np.concatenate(self.levels)
+        weights = np.concatenate(
+            [np.full(len(level), 2.0**h) for h, level in enumerate(self.levels)]
+        )
+        order = np.argsort(items, kind="mergesort")
+        return items[order], weights[order]
+
+    def cdf(self, values):
+        """Estimated fraction of values less than or equal to each of the provided values."""
+
+        items, weights = self._weighted_items()
+        if not len(items):
+            return np.zeros(len(np.atleast_1d(values)))
+
+        cumulative = np.concatenate([[0.0], np.cumsum(weights)]) / weights.sum()
+        return cumulative[np.searchsorted(items, values, side="right")]
+
+    def quantile(self, q):
+        """Estimated value at each of the provided quantiles."""
+
+        items, weights = self._weighted_items()
+        cumulative = np.cumsum(weights) / weights.sum()
+        positions = np.searchsorted(cumulative, q, side="left")
+        return items[np.clip(positions, 0, len(items) - 1)]
+
+    def __len__(self):
+        return self.n
+
+
+class CategoryCounts:
+    """A mergeable table of counts for a stream of categorical values"""
+
+    def __init__(self):
+        self.counts = {}
+
+    def update(self, values):
+        categories, counts = np.unique(
+            np.asarray(values).astype(str), return_counts=True
+        )
+        for category, count in zip(categories, counts):
+            self.counts[category] = self.counts.get(category, 0) + int(count)
+
+    def merge(self, other):
+        for category, count in other.counts.items():
+            self.counts[category] = self.counts.get(category, 0) + count
+        return self
+
+    def aligned(self, other):
+        """Counts of both tables over the union of their categories."""
+
+        categories = sorted(set(self.counts) | set(other.counts))
+        return (
+            np.array([self.counts.get(c, 0) for c in categories]),
+            np.array([other.counts.get(c, 0) for c in categories]),
+        )
+
+    def __len__(self):
+        return sum(self.counts.values())
+
+
+class FeatureSketches:
+    """Streaming, mergeable summaries of the features and predictions of scored records
+
+    Holds a KLLSketch per numerical column and a CategoryCounts table per categorical
+    column. Sketches are updated incrementally as records are scored, and drift between
+    two sets of sketches (e.g. the training data and the latest batch) can be computed
+    at any time in constant memory, without materializing dataframes or re-querying the
+    metric store.
+
+    Attributes:
+        num_features (list): numerical columns, including the prediction
+        cat_features (list): categorical columns
+        sketches (dict): column name to KLLSketch or CategoryCounts
+
+    """
+
+    def __init__(self, num_features, cat_features, k=200):
+        self.num_features = list(num_features)
+        self.cat_features = list(cat_features)
+        self.sketches = {column: KLLSketch(k=k) for column in self.num_features}
+        self.sketches.update({column: CategoryCounts() for column in self.cat_features})
+
+    def update(self, df):
+        """Update the sketches with any of their columns present in the dataframe."""
+
+        for column, sketch in self.sketches.items():
+            if column in df:
+                sketch.update(df[column].to_numpy())
+
+    def merge(self, other):
+        for column, sketch in self.sketches.items():
+            sketch.merge(other.sketches[column])
+        return self
+
+    def drift(self, reference, threshold=0.05, bins=10):
+        """
+        Approximate drift of these sketches relative to a reference set of sketches,
+        using the same statistics as src.drift.calculate_drift(): KS for numerical
+        columns (evaluated over the items retained by both sketches), chi-square for
+        categorical columns, and PSI / Jensen-Shannon distance for both.
+
+        Args:
+            reference (FeatureSketches)
+            threshold (float): p-value below which a column is considered drifted
+            bins (int): number of reference-quantile bins for numerical PSI/JS
+
+        Returns:
+            dict: column name to drift statistics
+
+        """
+
+        results = {}
+
+        for column in self.num_features:
+            ref, cur = reference.sketches[column], self.sketches[column]
+            if not len(ref) or not len(cur):
+                continue
+
+            points = np.unique(np.concatenate(ref.levels + cur.levels))
+            statistic = float(np.abs(ref.cdf(points) - cur.cdf(points)).max())
+            p_value = float(kstwo.sf(statistic, round(ref.n * cur.n / (ref.n + cur.n))))
+
+            edges = np.unique(ref.quantile(np.linspace(0, 1, bins + 1)))[1:-1]
+            ref_counts = np.diff(np.concatenate([[0.0], ref.cdf(edges), [1.0]]))
+            cur_counts = np.diff(np.concatenate([[0.0], cur.cdf(edges), [1.0]]))
+
+            results[column] = {
+                "feature_type": "num",
+                "stattest": "ks",
+                "statistic": statistic,
+                "p_value": p_value,
+                "psi": population_stability_index(ref_counts, cur_counts),
+                "jensen_shannon": jensen_shannon_distance(ref_counts, cur_counts),
+                "drift_detected": p_value < threshold,
+            }
+
+        for column in self.cat_features:
+            ref_counts, cur_counts = reference.sketches[column].aligned(
+                self.sketches[column]
+            )
+            if not ref_counts.sum() or not cur_counts.sum():
+                continue
+
+            statistic, p_value = chi_square_test(ref_counts, cur_counts)
+            results[column] = {
+                "feature_type": "cat",
+                "stattest": "chisquare",
+                "statistic": statistic,
+                "p_value": p_value,
+                "psi": population_stability_index(ref_counts, cur_counts),
+                "jensen_shannon": jensen_shannon_distance(ref_counts, cur_counts),
+                "drift_detected": p_value < threshold,
+            }
+
+        return results
@@ -0,0 +1,255 @@
+# ###########################################################################
+#
+#  CLOUDERA APPLIED MACHINE LEARNING PROTOTYPE (AMP)
+#  (C) Cloudera, Inc. 2021
+#  All rights reserved.
+#
+#  Applicable Open Source License: Apache 2.0
+#
+#  NOTE: Cloudera open source products are modular software products
+#  made up of hundreds of individual components, each of which was
+#  individually copyrighted.  Each Cloudera open source product is a
+#  collective work under U.S. Copyright Law. Your license to use the
+#  collective work is as provided in your written agreement with
+#  Cloudera.  Used apart from the collective work, this file is
+#  licensed for your use pursuant to the open source license
+#  identified above.
+#
+#  This code is provided to you pursuant a written agreement with
+#  (i) Cloudera, Inc. or (ii) a third-party authorized to distribute
+#  this code. If you do not have a written agreement with Cloudera nor
+#  with an authorized and properly licensed third party, you do not
+#  have any rights to access nor to use this code.
+#
+#  Absent a written agreement with Cloudera, Inc. (“Cloudera”) to the
+#  contrary, A) CLOUDERA PROVIDES THIS CODE TO YOU WITHOUT WARRANTIES OF ANY
+#  KIND; (B) CLOUDERA DISCLAIMS ANY AND ALL EXPRESS AND IMPLIED
+#  WARRANTIES WITH RESPECT TO THIS CODE, INCLUDING BUT NOT LIMITED TO
+#  IMPLIED WARRANTIES OF TITLE, NON-INFRINGEMENT, MERCHANTABILITY AND
+#  FITNESS FOR A PARTICULAR PURPOSE; (C) CLOUDERA IS NOT LIABLE TO YOU,
+#  AND WILL NOT DEFEND, INDEMNIFY, NOR HOLD YOU HARMLESS FOR ANY CLAIMS
+#  ARISING FROM OR RELATED TO THE CODE; AND (D)WITH RESPECT TO YOUR EXERCISE
+#  OF ANY RIGHTS GRANTED TO YOU FOR THE CODE, CLOUDERA IS NOT LIABLE FOR ANY
+#  DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, PUNITIVE OR
+#  CONSEQUENTIAL DAMAGES INCLUDING, BUT NOT LIMITED TO, DAMAGES
+#  RELATED TO LOST REVENUE, LOST PROFITS, LOSS OF INCOME, LOSS OF
+#  BUSINESS ADVANTAGE OR UNAVAILABILITY, OR LOSS OR CORRUPTION OF
+#  DATA.
+#
+# ###########################################################################
+
+import os
+import gzip
+import numpy as np
+import pandas as pd
+from collections import namedtuple
+
+DRIFT_KINDS = ("zipcode_mix", "sqft_inflation", "price_shock")
+
+# area columns scaled by sqft inflation; sqft_living is kept equal to sqft_above + sqft_basement
+SQFT_COLUMNS = ["sqft_living", "sqft_above", "sqft_basement", "sqft_living15"]
+
+# A drift injected into synthetic records sold on or after start. It ramps in linearly over
+# ramp_days (immediately if 0), after which it applies in full:
+#
+#   zipcode_mix     magnitude is the fraction of records drawn from the most expensive decile
+#                   of zipcodes instead of from the source data's zipcode mix
+#   sqft_inflation  living areas are scaled by (1 + magnitude)
+#   price_shock     prices are scaled by (1 + magnitude)
+DriftEvent = namedtuple("DriftEvent", ["kind", "start", "magnitude", "ramp_days"])
+
+
+def parse_drift_event(spec):
+    """
+    Parse a drift event from a "kind:start:magnitude[:ramp_days]" string, eg
+    "price_shock:2015-01-01:0.15:60".
+    """
+
+    parts = spec.split(":")
+    if len(parts) not in (3, 4) or parts[0] not in DRIFT_KINDS:
+        raise ValueError(
+            f"drift must be given as kind:start:magnitude[:ramp_days] with kind one of {list(DRIFT_KINDS)}, got {spec!r}"
+        )
+
+    return DriftEvent(
+        kind=parts[0],
+        start=pd.Timestamp(parts[1]),
+        magnitude=float(parts[2]),
+        ramp_days=int(parts[3]) if len(parts) == 4 else 0,
+    )
+
+
+def drift_weight(event, dates):
+    """The fraction (0 to 1) of event applied to records sold on each of dates."""
+
+    days = (dates - np.datetime64(event.start)) / np.timedelta64(1, "D")
+    if event.ramp_days <= 0:
+        return (days >= 0).astype(float)
+
+    return np.clip(days / event.ramp_days, 0, 1)
+
+
+class SyntheticHouseData:
+    """Generator of kc_house_data-like records, in streamed chunks, with scheduled drift
+
+    Records are bootstrapped from a source dataframe in the raw kc_house_data schema: each
+    synthetic record is a randomly drawn source row, so the joint distribution of its
+    columns (zipcode, rooms, condition, grade, sale date, ...) is preserved, with small
+    multiplicative jitter on prices and areas and additive jitter on coordinates so that
+    records are not exact copies. Every record is given a new, unique id. Sale dates
+    (the "date" column) are those of the source rows, so the output can be passed through
+    scripts/prepare_data.py to derive date_listed/date_sold and the train/prod split
+    exactly as for the source data.
+
+    Drift events (see DriftEvent) are applied by sale date, so the production period can
+    be given a known drift on a known schedule.
+
+    Usage:
+
+        generator = SyntheticHouseData(
+            pd.read_csv("data/raw/kc_house_data.csv"),
+            schedule=[parse_drift_event("price_shock:2015-01-01:0.15:60")],
+        )
+        generator.to_csv("data/raw/synthetic_house_data.csv.gz", n_rows=20_000_000)
+
+    Attributes:
+        source (pd.DataFrame): source records in the raw schema
+        schedule (list): DriftEvents to apply
+        price_jitter (float): standard deviation of the multiplicative price jitter
+        sqft_jitter (float): standard deviation of the multiplicative area jitter
+        coord_jitter (float): standard deviation of the additive lat/long jitter (degrees)
+        id_start (int): id of the first synthetic record; ids then increase by one per record
+        seed (int)
+
+    """
+
+    def __init__(
+        self,
+        source,
+        schedule=(),
+        price_jitter=0.05,
+        sqft_jitter=0.03,
+        coord_jitter=0.001,
+        id_start=10**10,
+        seed=42,
+    ):
+        self.source = source.reset_index(drop=True)
+        self.schedule = list(schedule)
+        self.price_jitter = price_jitter
+        self.sqft_jitter = sqft_jitter
+        self.coord_jitter = coord_jitter
+        self.id_start = id_start
+        self.seed = seed
+
+        self._dates = pd.to_datetime(self.source.date, format="%Y%m%dT%H%M%S").values
+
+        # rows in the most expensive decile of zipcodes (by median price), which zipcode_mix
+        # drift over-samples
+        median_prices = self.source.groupby("zipcode").price.median()
+        expensive = median_prices[median_prices >= median_prices.quantile(0.9)].index
+        self._expensive_rows = np.flatnonzero(self.source.zipcode.isin(expensive))
+
+    def _sample_rows(self, rng, n):
+        """
+        Draw n source rows, and the (possibly different) source rows whose sale dates they
+        take: records redrawn by zipcode_mix drift keep the sale date of the record they
+        replace, so the drift only shows from its start date.
+        """
+
+        date_rows = rng.randint(0, len(self.source), size=n)
+        rows = date_rows.copy()
+
+        for event in self.schedule:
+            if event.kind != "zipcode_mix":
+                continue
+            share = event.magnitude * drift_weight(event, self._dates[date_rows])
+            redraw = rng.random_sample(n) < share
+            rows[redraw] = self._expensive_rows[
+                rng.randint(0, len(self._expensive_rows), size=redraw.sum())
+            ]
+
+        return rows, date_rows
+
+    def chunk(self, rng, n, id_start):
+        """Generate n synthetic records with ids from id_start."""
+
+        rows, date_rows = self._sample_rows(rng, n)
+        df = self.source.iloc[rows].reset_index(drop=True)
+        df["date"] = self.source.date.values[date_rows]
+        dates = self._dates[date_rows]
+
+        price = df.price.values * rng.lognormal(0, self.price_jitter, n)
+        sqft_scale = rng.lognormal(0, self.sqft_jitter, n)
+        lot_scale = rng.lognormal(0, self.sqft_jitter, n)
+
+        for event in self.schedule:
+            weight = event.magnitude * drift_weight(event, dates)
+            if event.kind == "price_shock":
+                price *= 1 + weight
+            elif event.kind == "sqft_inflation":
+                sqft_scale *= 1 + weight
+
+        df["id"] = np.arange(id_start, id_start + n, dtype=np.int64)
+        df["price"] = np.round(price).astype(np.int64)
+        for col in SQFT_COLUMNS:
+            df[col] = np.round(df[col].values * sqft_scale).astype(np.int64)
+        df["sqft_living"] = df.sqft_above + df.sqft_basement
+        for col in ["sqft_lot", "sqft_lot15"]:
+            df[col] = np.maximum(np.round(df[col].values * lot_scale), 1).astype(
+                np.int64
+            )
+        for col in ["lat", "long"]:
+            df[col] = np.round(df[col].values + rng.normal(0, self.coord_jitter, n), 4)
+
+        return df
+
+    def generate(self, n_rows, chunk_size=1_000_000):
+        """
+        Generate n_rows synthetic records, in chunks.
+
+        Yields:
+            pd.DataFrame: up to chunk_size records in the source's columns
+
+        """
+
+        rng = np.random.RandomState(self.seed)
+
+        for start in range(0, n_rows, chunk_size):
+            yield self.chunk(
+                rng, min(chunk_size, n_rows - start), self.id_start + start
+            )
+
+    def to_csv(
+        self, path, n_rows, chunk_size=1_000_000, compresslevel=1, progress=None
+    ):
+        """
+        Stream n_rows synthetic records to a CSV file (gzip-compressed if path ends in .gz),
+        one chunk at a time, so memory use is bounded by chunk_size rather than n_rows. The
+        file is written under a temporary name and moved into place once complete.
+
+        Args:
+            path (str)
+            n_rows (int)
+            chunk_size (int)
+            compresslevel (int): gzip compression level; at these volumes the default level
+                (9) costs several times the time taken to generate the records
+            progress (callable): optional wrapper for the chunk iterator, eg tqdm
+
+        """
+
+        chunks = self.generate(n_rows, chunk_size)
+        if progress is not None:
+            chunks = progress(chunks)
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = os.path.join(os.path.dirname(path), f".{os.path.basename(path)}.tmp")
+
+        if path.endswith(".gz"):
+            f = gzip.open(tmp_path, "wt", compresslevel=compresslevel)
+        else:
+            f = open(tmp_path, "w")
+
+        with f:
+            for i, df in enumerate(chunks):
+                df.to_csv(f, header=i == 0, index=False)
+        os.replace(tmp_path, path)
@@ -39,6 +39,11 @@
 # ###########################################################################
 
 import os
+import glob
+import gzip
+import shutil
+import logging
+import tempfile
 import numpy as np
 import pandas as pd
 from datetime import datetime
@@ -69,6 +74,8 @@ col_order = [
     "date_listed",
 ]
 
+WORKING_DIR = "data/working"
+
 
 def random_day_offset(ts: pd._libs.tslibs.timestamps.Timestamp, max_days=60):
     """
@@ -78,6 +85,20 @@ def random_day_offset(ts: pd._libs.tslibs.timestamps.Timestamp, max_days=60):
     return ts - DateOffset(np.random.randint(0, max_days))
 
 
+def random_day_offsets(dates, max_days=60):
+    """
+    Vectorized random_day_offset(): offset each of a series of dates to an earlier date by a
+    random number of days between 0 and max_days.
+
+    The offsets are drawn in one call from NumPy's global random state, which yields the
+    same offsets as drawing them one date at a time, so results match random_day_offset()
+    applied row by row under the same seed (also when the dates arrive in chunks).
+    """
+    return dates - pd.to_timedelta(
+        np.random.randint(0, max_days, size=len(dates)), unit="D"
+    )
+
+
 def get_active_feature_names(
     column_transformer,
 ):
@@ -96,27 +117,43 @@ def get_active_feature_names(
     ).tolist()
 
 
-def outlier_removal(X, multiple, cols):
+def outlier_bounds(X, multiple, cols):
     """
-    Replaces outliers in each column of a pd.DataFrame with np.Nan values.
+    Compute the lower and upper outlier bounds of each column of a pd.DataFrame, at
+    multiples of the IQR from each quantile, from a single quantile pass over the columns.
+
+    Returns:
+        dict: column name to (lower, upper)
 
-    Outlier strictness is controlled by multiples of the IQR from each quantile.
     """
 
-    X = pd.DataFrame(X).copy()
+    quantiles = pd.DataFrame(X)[cols].quantile([0.25, 0.75])
+    iqr = quantiles.loc[0.75] - quantiles.loc[0.25]
+    lower = quantiles.loc[0.25] - (multiple * iqr)
+    upper = quantiles.loc[0.75] + (multiple * iqr)
+
+    return {col: (lower[col], upper[col]) for col in cols}
 
-    for col in cols:
 
-        x = pd.Series(X.loc[:, col]).copy()
-        q1 = x.quantile(0.25)
-        q3 = x.quantile(0.75)
-        iqr = q3 - q1
-        lower = q1 - (multiple * iqr)
-        upper = q3 + (multiple * iqr)
+def outlier_removal(X, multiple, cols, bounds=None):
+    """
+    Drops rows of a pd.DataFrame with an outlier in any of cols, or with a missing value.
 
-        X.loc[~X.loc[:, col].between(lower, upper, inclusive=True), col] = np.nan
+    Outlier strictness is controlled by multiples of the IQR from each quantile. Bounds
+    precomputed with outlier_bounds() (eg over a larger dataset than X) may be passed
+    instead.
+    """
 
-    return X[~X.isna().any(axis=1)]
+    X = pd.DataFrame(X)
+    bounds = bounds if bounds is not None else outlier_bounds(X, multiple, cols)
+
+    keep = ~X.isna().any(axis=1).values
+    for col in cols:
+        lower, upper = bounds[col]
+        values = X[col].values
+        keep &= (values >= lower) & (values <= upper)
+
+    return X[keep]
 
 
 def scale_prices(df):
@@ -147,3 +184,88 @@ def find_latest_report(report_dir):
     latest_report = max(date_map.keys(), key=lambda d: datetime.strptime(d, "%Y-%m-%d"))
 
     return reports[date_map[latest_report]]
+
+
+def unique_tmp_path(path):
+    """
+    Create an empty temporary file, with a name unique to this call, in the directory of
+    path, and return its path. Writing to it and then os.replace()-ing it onto path is
+    atomic, and safe against concurrent writers of the same path in other processes.
+
+    """
+    fd, tmp_path = tempfile.mkstemp(
+        prefix=f".{os.path.basename(path)}.", suffix=".tmp", dir=os.path.dirname(path)
+    )
+    os.close(fd)
+
+    return tmp_path
+
+
+def gzip_copy(path, compresslevel=6, gzip_path=None):
+    """
+    Write a gzip-compressed copy of a file, atomically, and return the copy's path. The
+    copy is written alongside the file (at path + ".gz") unless gzip_path is given.
+
+    """
+    gzip_path = gzip_path or path + ".gz"
+    tmp_path = unique_tmp_path(gzip_path)
+
+    with open(path, "rb") as src, open(tmp_path, "wb") as raw:
+        with gzip.GzipFile(
+            filename="", mode="wb", fileobj=raw, compresslevel=compresslevel, mtime=0
+        ) as dst:
+            shutil.copyfileobj(src, dst, length=1 << 20)
+    os.replace(tmp_path, gzip_path)
+
+    return gzip_path
+
+
+def configure_logging(log_file="logs/simulation.log"):
+    """
+    Attach a file handler writing to log_file to the "src" package logger, which every
+    module logger propagates to. Called by entry-point scripts, so that importing src
+    never creates log files itself; repeated calls add no further handlers.
+
+    """
+    logger = logging.getLogger("src")
+    logger.setLevel(logging.INFO)
+
+    if logger.handlers:
+        return logger
+
+    formatter = logging.Formatter(
+        "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+    )
+
+    os.makedirs(os.path.dirname(log_file), exist_ok=True)
+    file_handler = logging.FileHandler(log_file)
+    file_handler.setLevel(logging.DEBUG)
+    file_handler.setFormatter(formatter)
+    logger.addHandler(file_handler)
+
+    return logger
+
+
+def split_path(name, working_dir=WORKING_DIR):
+    """Directory holding the part files of the train or prod split (name) of the prepared data."""
+
+    return os.path.join(working_dir, f"{name}_df")
+
+
+def load_split(name, working_dir=WORKING_DIR):
+    """
+    Load the train or prod split (name) written by scripts/prepare_data.py: its part files,
+    concatenated and sorted by date_sold and then id, with a fresh RangeIndex. Ids are
+    unique, so the row order is fully determined by the data (the original single-pickle
+    layout kept an unstable sort order within each sale date and the row labels of its
+    listed-date ordering). Data prepared as a single pickle (<name>_df.pkl) is read as is.
+    """
+
+    path = split_path(name, working_dir)
+    if not os.path.isdir(path):
+        return pd.read_pickle(f"{path}.pkl")
+
+    parts = sorted(glob.glob(os.path.join(path, "part-*.pkl")))
+    df = pd.concat([pd.read_pickle(part) for part in parts], ignore_index=True)
+
+    return df.sort_values(["date_sold", "id"]).reset_index(drop=True)
@@ -0,0 +1,82 @@
+# ###########################################################################
+#
+#  CLOUDERA APPLIED MACHINE LEARNING PROTOTYPE (AMP)
+#  (C) Cloudera, Inc. 2021
+#  All rights reserved.
+#
+#  Applicable Open Source License: Apache 2.0
+#
+#  NOTE: Cloudera open source products are modular software products
+#  made up of hundreds of individual components, each of which was
+#  individually copyrighted.  Each Cloudera open source product is a
+#  collective work under U.S. Copyright Law. Your license to use the
+#  collective work is as provided in your written agreement with
+#  Cloudera.  Used apart from the collective work, this file is
+#  licensed for your use pursuant to the open source license
+#  identified above.
+#
+#  This code is provided to you pursuant a written agreement with
+#  (i) Cloudera, Inc. or (ii) a third-party authorized to distribute
+#  this code. If you do not have a written agreement with Cloudera nor
+#  with an authorized and properly licensed third party, you do not
+#  have any rights to access nor to use this code.
+#
+#  Absent a written agreement with Cloudera, Inc. (“Cloudera”) to the
+#  contrary, A) CLOUDERA PROVIDES THIS CODE TO YOU WITHOUT WARRANTIES OF ANY
+#  KIND; (B) CLOUDERA DISCLAIMS ANY AND ALL EXPRESS AND IMPLIED
+#  WARRANTIES WITH RESPECT TO THIS CODE, INCLUDING BUT NOT LIMITED TO
+#  IMPLIED WARRANTIES OF TITLE, NON-INFRINGEMENT, MERCHANTABILITY AND
+#  FITNESS FOR A PARTICULAR PURPOSE; (C) CLOUDERA IS NOT LIABLE TO YOU,
+#  AND WILL NOT DEFEND, INDEMNIFY, NOR HOLD YOU HARMLESS FOR ANY CLAIMS
+#  ARISING FROM OR RELATED TO THE CODE; AND (D)WITH RESPECT TO YOUR EXERCISE
+#  OF ANY RIGHTS GRANTED TO YOU FOR THE CODE, CLOUDERA IS NOT LIABLE FOR ANY
+#  DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, PUNITIVE OR
+#  CONSEQUENTIAL DAMAGES INCLUDING, BUT NOT LIMITED TO, DAMAGES
+#  RELATED TO LOST REVENUE, LOST PROFITS, LOSS OF INCOME, LOSS OF
+#  BUSINESS ADVANTAGE OR UNAVAILABILITY, OR LOSS OR CORRUPTION OF
+#  DATA.
+#
+# ###########################################################################
+
+import json
+import numpy as np
+import pandas as pd
+
+from src.columns import TARGET, PREDICTION
+from src.drift import calculate_drift, ks_2samp_columns, save_drift_results
+
+
+def frame(n, seed=0):
+    rng = np.random.RandomState(seed)
+    return pd.DataFrame(
+        {
+            "sqft_living": rng.normal(2000, 500, n),
+            "zipcode": rng.choice(["98001", "98002"], n),
+            TARGET: rng.normal(5, 1, n),
+            PREDICTION: rng.normal(5, 1, n),
+        }
+    )
+
+
+def test_ks_2samp_columns_with_an_empty_sample():
+    statistics, p_values = ks_2samp_columns(np.ones((10, 2)), np.empty((0, 2)))
+
+    assert np.isnan(statistics).all()
+    assert np.isnan(p_values).all()
+
+
+def test_calculate_drift_with_an_empty_frame():
+    kwargs = {"num_features": ["sqft_living"], "cat_features": ["zipcode"]}
+
+    assert calculate_drift(frame(100), frame(0), **kwargs) is None
+    assert calculate_drift(frame(0), frame(100), **kwargs) is None
+    assert calculate_drift(frame(100), frame(50, seed=1), **kwargs)["n_features"] == 2
+
+
+def test_save_drift_results_writes_non_finite_values_as_null(tmp_path):
+    path = str(tmp_path / "drift.json")
+
+    save_drift_results({"statistic": float("nan"), "psi": float("inf")}, path)
+
+    with open(path) as f:
+        assert json.load(f) == {"statistic": None, "psi": None}
@@ -0,0 +1,104 @@
+# ###########################################################################
+#
+#  CLOUDERA APPLIED MACHINE LEARNING PROTOTYPE (AMP)
+#  (C) Cloudera, Inc. 2021
+#  All rights reserved.
+#
+#  Applicable Open Source License: Apache 2.0
+#
+#  NOTE: Cloudera open source products are modular software products
+#  made up of hundreds of individual components, each of which was
+#  individually copyrighted.  Each Cloudera open source product is a
+#  collective work under U.S. Copyright Law. Your license to use the
+#  collective work is as provided in your written agreement with
+#  Cloudera.  Used apart from the collective work, this file is
+#  licensed for your use pursuant to the open source license
+#  identified above.
+#
+#  This code is provided to you pursuant a written agreement with
+#  (i) Cloudera, Inc. or (ii) a third-party authorized to distribute
+#  this code. If you do not have a written agreement with Cloudera nor
+#  with an authorized and properly licensed third party, you do not
+#  have any rights to access nor to use this code.
+#
+#  Absent a written agreement with Cloudera, Inc. (“Cloudera”) to the
+#  contrary, A) CLOUDERA PROVIDES THIS CODE TO YOU WITHOUT WARRANTIES OF ANY
+#  KIND; (B) CLOUDERA DISCLAIMS ANY AND ALL EXPRESS AND IMPLIED
+#  WARRANTIES WITH RESPECT TO THIS CODE, INCLUDING BUT NOT LIMITED TO
+#  IMPLIED WARRANTIES OF TITLE, NON-INFRINGEMENT, MERCHANTABILITY AND
+#  FITNESS FOR A PARTICULAR PURPOSE; (C) CLOUDERA IS NOT LIABLE TO YOU,
+#  AND WILL NOT DEFEND, INDEMNIFY, NOR HOLD YOU HARMLESS FOR ANY CLAIMS
+#  ARISING FROM OR RELATED TO THE CODE; AND (D)WITH RESPECT TO YOUR EXERCISE
+#  OF ANY RIGHTS GRANTED TO YOU FOR THE CODE, CLOUDERA IS NOT LIABLE FOR ANY
+#  DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, PUNITIVE OR
+#  CONSEQUENTIAL DAMAGES INCLUDING, BUT NOT LIMITED TO, DAMAGES
+#  RELATED TO LOST REVENUE, LOST PROFITS, LOSS OF INCOME, LOSS OF
+#  BUSINESS ADVANTAGE OR UNAVAILABILITY, OR LOSS OR CORRUPTION OF
+#  DATA.
+#
+# ###########################################################################
+
+import sys
+import json
+import requests
+
+from src.emulator import cdsw
+
+# src.inference imports cdsw, which only exists in a CML workspace
+sys.modules.setdefault("cdsw", cdsw)
+
+from src.inference import ThreadedModelRequest  # noqa: E402
+
+
+class StubSession:
+    """Answers each post with the next (status, body) and records its arguments."""
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.calls = []
+
+    def post(self, **kwargs):
+        self.calls.append(kwargs)
+        status, body = self.responses.pop(0)
+
+        response = requests.Response()
+        response.status_code = status
+        response._content = json.dumps(body).encode("utf-8")
+        return response
+
+
+def make_request(session):
+    tmr = ThreadedModelRequest(
+        {"model_access_key": "key"},
+        model_service_url="http://model.invalid",
+        backoff_factor=0,
+        timeout=5,
+    )
+    tmr.thread_local.session = session
+    return tmr
+
+
+PREDICTION = {"response": {"uuid": "uuid-1", "prediction": 1.0}}
+
+
+def test_transient_statuses_are_retried():
+    session = StubSession(
+        (503, {"success": False}), (429, {"success": False}), (200, PREDICTION)
+    )
+
+    scored, failed = make_request(session).score_chunk([{"id": 1}])
+
+    assert scored == [(1, "uuid-1", 1.0)]
+    assert failed == []
+    assert len(session.calls) == 3
+    assert all(call["timeout"] == 5 for call in session.calls)
+
+
+def test_client_errors_fail_without_retry():
+    session = StubSession((400, {"success": False}))
+
+    scored, failed = make_request(session).score_chunk([{"id": 1}])
+
+    assert scored == []
+    assert failed == [{"id": 1}]
+    assert len(session.calls) == 1
@@ -0,0 +1,118 @@
+# ###########################################################################
+#
+#  CLOUDERA APPLIED MACHINE LEARNING PROTOTYPE (AMP)
+#  (C) Cloudera, Inc. 2021
+#  All rights reserved.
+#
+#  Applicable Open Source License: Apache 2.0
+#
+#  NOTE: Cloudera open source products are modular software products
+#  made up of hundreds of individual components, each of which was
+#  individually copyrighted.  Each Cloudera open source product is a
+#  collective work under U.S. Copyright Law. Your license to use the
+#  collective work is as provided in your written agreement with
+#  Cloudera.  Used apart from the collective work, this file is
+#  licensed for your use pursuant to the open source license
+#  identified above.
+#
+#  This code is provided to you pursuant a written agreement with
+#  (i) Cloudera, Inc. or (ii) a third-party authorized to distribute
+#  this code. If you do not have a written agreement with Cloudera nor
+#  with an authorized and properly licensed third party, you do not
+#  have any rights to access nor to use this code.
+#
+#  Absent a written agreement with Cloudera, Inc. (“Cloudera”) to the
+#  contrary, A) CLOUDERA PROVIDES THIS CODE TO YOU WITHOUT WARRANTIES OF ANY
+#  KIND; (B) CLOUDERA DISCLAIMS ANY AND ALL EXPRESS AND IMPLIED
+#  WARRANTIES WITH RESPECT TO THIS CODE, INCLUDING BUT NOT LIMITED TO
+#  IMPLIED WARRANTIES OF TITLE, NON-INFRINGEMENT, MERCHANTABILITY AND
+#  FITNESS FOR A PARTICULAR PURPOSE; (C) CLOUDERA IS NOT LIABLE TO YOU,
+#  AND WILL NOT DEFEND, INDEMNIFY, NOR HOLD YOU HARMLESS FOR ANY CLAIMS
+#  ARISING FROM OR RELATED TO THE CODE; AND (D)WITH RESPECT TO YOUR EXERCISE
+#  OF ANY RIGHTS GRANTED TO YOU FOR THE CODE, CLOUDERA IS NOT LIABLE FOR ANY
+#  DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, PUNITIVE OR
+#  CONSEQUENTIAL DAMAGES INCLUDING, BUT NOT LIMITED TO, DAMAGES
+#  RELATED TO LOST REVENUE, LOST PROFITS, LOSS OF INCOME, LOSS OF
+#  BUSINESS ADVANTAGE OR UNAVAILABILITY, OR LOSS OR CORRUPTION OF
+#  DATA.
+#
+# ###########################################################################
+
+from src.emulator.metric_store import MetricStore
+from src.metrics_cache import MetricsCache, format_metrics_response
+
+CRN = "crn:cdp:ml:us-west-1:test:workspace:test/deployment"
+
+
+def make_cache(store):
+    def read_fn(**kwargs):
+        read_fn.calls.append(kwargs)
+        return format_metrics_response(store.read(CRN, **kwargs))
+
+    read_fn.calls = []
+    return MetricsCache(read_fn, slack_ms=0), read_fn
+
+
+def track(store, uuid, timestamp_ms, ground_truth):
+    store.track(uuid, CRN, timestamp_ms, timestamp_ms, {"ground_truth": ground_truth})
+
+
+def test_format_empty_response():
+    df = format_metrics_response({"metrics": []})
+
+    assert len(df) == 0
+    assert "predictionUuid" in df
+
+
+def test_query_falls_back_to_full_read_after_empty_window_read():
+    store = MetricStore()
+    cache, read_fn = make_cache(store)
+
+    # the window registered for the uuid holds no rows (e.g. an in-memory store that
+    # was reset since), but the record is found by the full read
+    cache.register(
+        {
+            "start_timestamp_ms": 1_000,
+            "end_timestamp_ms": 2_000,
+            "id_uuid_mapping": {1: "uuid-1"},
+            "id_prediction_mapping": {1: 10.0},
+        }
+    )
+    track(store, "uuid-1", 5_000, 1.0)
+
+    df = cache.query(["uuid-1"])
+
+    assert df.predictionUuid.tolist() == ["uuid-1"]
+    assert read_fn.calls == [
+        {"start_timestamp_ms": 1_000, "end_timestamp_ms": 2_000},
+        {},
+    ]
+
+
+def test_query_resumed_from_checkpoint():
+    store = MetricStore()
+    cache, read_fn = make_cache(store)
+
+    # uuid-1 was scored by an earlier run; only uuid-2 is scored in this window
+    track(store, "uuid-1", 100, 1.0)
+    track(store, "uuid-2", 1_500, 2.0)
+    cache.register(
+        {
+            "start_timestamp_ms": 1_000,
+            "end_timestamp_ms": 2_000,
+            "id_uuid_mapping": {1: "uuid-1", 2: "uuid-2"},
+            "id_prediction_mapping": {2: 20.0},
+        }
+    )
+
+    df = cache.query(["uuid-1", "uuid-2"])
+
+    assert sorted(df.predictionUuid) == ["uuid-1", "uuid-2"]
+    assert df.set_index("predictionUuid").ground_truth.to_dict() == {
+        "uuid-1": 1.0,
+        "uuid-2": 2.0,
+    }
+    assert read_fn.calls == [
+        {"start_timestamp_ms": 1_000, "end_timestamp_ms": 2_000},
+        {},
+    ]
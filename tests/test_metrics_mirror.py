@@ -0,0 +1,75 @@
+# ###########################################################################
+#
+#  CLOUDERA APPLIED MACHINE LEARNING PROTOTYPE (AMP)
+#  (C) Cloudera, Inc. 2021
+#  All rights reserved.
+#
+#  Applicable Open Source License: Apache 2.0
+#
+#  NOTE: Cloudera open source products are modular software products
+#  made up of hundreds of individual components, each of which was
+#  individually copyrighted.  Each Cloudera open source product is a
+#  collective work under U.S. Copyright Law. Your license to use the
+#  collective work is as provided in your written agreement with
+#  Cloudera.  Used apart from the collective work, this file is
+#  licensed for your use pursuant to the open source license
+#  identified above.
+#
+#  This code is provided to you pursuant a written agreement with
+#  (i) Cloudera, Inc. or (ii) a third-party authorized to distribute
+#  this code. If you do not have a written agreement with Cloudera nor
+#  with an authorized and properly licensed third party, you do not
+#  have any rights to access nor to use this code.
+#
+#  Absent a written agreement with Cloudera, Inc. (“Cloudera”) to the
+#  contrary, A) CLOUDERA PROVIDES THIS CODE TO YOU WITHOUT WARRANTIES OF ANY
+#  KIND; (B) CLOUDERA DISCLAIMS ANY AND ALL EXPRESS AND IMPLIED
+#  WARRANTIES WITH RESPECT TO THIS CODE, INCLUDING BUT NOT LIMITED TO
+#  IMPLIED WARRANTIES OF TITLE, NON-INFRINGEMENT, MERCHANTABILITY AND
+#  FITNESS FOR A PARTICULAR PURPOSE; (C) CLOUDERA IS NOT LIABLE TO YOU,
+#  AND WILL NOT DEFEND, INDEMNIFY, NOR HOLD YOU HARMLESS FOR ANY CLAIMS
+#  ARISING FROM OR RELATED TO THE CODE; AND (D)WITH RESPECT TO YOUR EXERCISE
+#  OF ANY RIGHTS GRANTED TO YOU FOR THE CODE, CLOUDERA IS NOT LIABLE FOR ANY
+#  DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, PUNITIVE OR
+#  CONSEQUENTIAL DAMAGES INCLUDING, BUT NOT LIMITED TO, DAMAGES
+#  RELATED TO LOST REVENUE, LOST PROFITS, LOSS OF INCOME, LOSS OF
+#  BUSINESS ADVANTAGE OR UNAVAILABILITY, OR LOSS OR CORRUPTION OF
+#  DATA.
+#
+# ###########################################################################
+
+from src.metrics_mirror import MetricsMirror
+
+
+def record(uuid, start_ms, **metrics):
+    return {
+        "predictionUuid": uuid,
+        "modelDeploymentCrn": "crn",
+        "startTimestampMs": start_ms,
+        "endTimestampMs": start_ms,
+        "metrics": metrics,
+    }
+
+
+def test_track_delayed_merges_into_mirrored_records(tmp_path):
+    mirror = MetricsMirror(str(tmp_path / "mirror.sqlite"))
+    mirror.upsert({"metrics": [record("uuid-1", 100, predicted_result=1.0)]})
+
+    unmirrored = mirror.track_delayed(
+        ["uuid-1", "uuid-2"],
+        [
+            {"ground_truth": 2.0, "date_sold": "2015-01-02"},
+            {"ground_truth": 3.0, "date_sold": "2015-01-03"},
+        ],
+    )
+
+    assert unmirrored == ["uuid-2"]
+    assert mirror.get(["uuid-1"])["metrics"][0]["metrics"] == {
+        "predicted_result": 1.0,
+        "ground_truth": 2.0,
+        "date_sold": "2015-01-02",
+    }
+    assert [
+        r["predictionUuid"]
+        for r in mirror.sold_between("2015-01-01", "2015-02-01")["metrics"]
+    ] == ["uuid-1"]